@@ -0,0 +1,98 @@
+# =====================================================
+# bench_wire_format.py – JSON vs Compact Payload Benchmark
+# Usage: python bench_wire_format.py [machines ...]
+# =====================================================
+
+import json
+import sys
+import time
+import zlib
+
+from wire_format import decode_compact, dumps
+
+LOCATIONS = ["Modan", "Baldeya", "Al-Khraj"]
+REPEAT = 50
+
+
+def sample_payload(machines: int) -> dict:
+    """Dashboard broadcast shaped like get_dashboard_data() + work orders."""
+    locations = {name: [] for name in LOCATIONS}
+    for i in range(1, machines + 1):
+        loc = LOCATIONS[i % len(LOCATIONS)]
+        running = i % 3 != 0
+        locations[loc].append({
+            "id": i,
+            "name": f"M{i}",
+            "status": "running" if running else "free",
+            "job": {
+                "work_order": f"MFG-WO-2026-{i:05d}",
+                "size": "110mm",
+                "total_qty": 1200,
+                "completed_qty": i * 7 % 1200,
+                "remaining_qty": 1200 - i * 7 % 1200,
+                "remaining_time": (1200 - i * 7 % 1200) * 1.5,
+                "progress_percent": (i * 7 % 1200) / 12,
+                "erp_status": "In Process",
+                "erp_comments": None,
+            } if running else None,
+            "next_job": {
+                "machine_id": i,
+                "work_order": f"MFG-WO-2026-{i + 50000:05d}",
+                "pipe_size": "160mm",
+                "total_qty": 800,
+                "produced_qty": 0,
+                "remaining_time": 1200.0,
+            },
+        })
+    work_orders = [{
+        "id": f"MFG-WO-2026-{i:05d}", "status": "In Process", "pipe_size": "110mm",
+        "qty": 1200, "produced_qty": 0, "location": LOCATIONS[i % 3], "machine_id": i,
+    } for i in range(1, machines + 1)]
+    return {
+        "locations": [{"name": n, "machines": ms} for n, ms in locations.items()],
+        "work_orders": work_orders,
+        "seq": 1,
+    }
+
+
+def timed(fn, repeat: int = REPEAT) -> float:
+    """Mean time per call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench(machines: int) -> dict:
+    data = sample_payload(machines)
+    results = {}
+    for encoding in ("json", "compact"):
+        text = dumps(data, encoding)
+        raw = text.encode("utf-8")
+        if encoding == "json":
+            decode = lambda t=text: json.loads(t)
+        else:
+            decode = lambda t=text: decode_compact(json.loads(t))
+        assert decode() == json.loads(dumps(data))  # lossless round trip
+        results[encoding] = {
+            "bytes": len(raw),
+            "deflate_bytes": len(zlib.compress(raw, 6)),  # ~ permessage-deflate
+            "encode_ms": timed(lambda: dumps(data, encoding)),
+            "decode_ms": timed(decode),
+        }
+    return results
+
+
+def main(sizes):
+    print(f"{'machines':>8} {'format':>8} {'bytes':>10} {'deflate':>9} {'encode ms':>10} {'decode ms':>10}")
+    for n in sizes:
+        results = bench(n)
+        for encoding, r in results.items():
+            print(f"{n:>8} {encoding:>8} {r['bytes']:>10} {r['deflate_bytes']:>9} "
+                  f"{r['encode_ms']:>10.3f} {r['decode_ms']:>10.3f}")
+        saved = 1 - results["compact"]["bytes"] / results["json"]["bytes"]
+        print(f"{'':>8} {'saved':>8} {saved:>10.0%}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 100, 1000])
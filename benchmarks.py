@@ -0,0 +1,318 @@
+# =====================================================
+# benchmarks.py – Hot-Path Benchmark Suite
+# Seeds synthetic plants, times each hot path (p50 / p99 /
+# peak memory), stores JSON and fails on regressions
+# Usage: python benchmarks.py [--plants 10,100,1000] [--log-rows 1000000]
+#        [--baseline bench_baseline.json] [--threshold 0.25]
+#        python benchmarks.py --save-baseline   (record a new baseline)
+#        BENCH_PLANTS=10,100 pytest tests/test_benchmarks.py   (same check under pytest)
+# =====================================================
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "dashboard-bench")
+LOCATIONS = ["Modan", "Baldeya", "Al-Khraj"]
+LOG_DAYS = 30                                   # log rows are spread over this many days
+LOG_END = datetime(2026, 1, 31, tzinfo=timezone.utc)
+REPORT_DAY = "2026-01-15"                       # one-day window for report paths
+REPORT_DAY_END = "2026-01-16"
+SEED_BATCH = 50_000
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# =====================================================
+# WORKER – one plant size per process (engines bind at import)
+# =====================================================
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_erp(work_orders: int) -> str:
+    """mock_erpnext in a background thread; returns its base URL."""
+    import uvicorn
+    import mock_erpnext
+
+    mock_erpnext.seed_work_orders(work_orders)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(mock_erpnext.app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True, name="MockERPNext").start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def seed_plant(machines: int, log_rows: int):
+    from sqlalchemy import insert
+    from database import engine, init_db
+    from models import ERPNextMetadata, Machine, ProductionLog
+    from rollups import backfill_rollups
+
+    init_db()
+    now = datetime.now(timezone.utc)
+    machine_rows, meta_rows = [], []
+    for i in range(1, machines + 1):
+        running = i % 2 == 0
+        wo = f"BENCH-WO-{i:05d}" if running else ""
+        machine_rows.append({
+            "id": i, "name": f"B{i}", "location": LOCATIONS[i % len(LOCATIONS)],
+            "status": "running" if running else "free",
+            "work_order": wo, "erpnext_work_order_id": "", "pipe_size": "110mm",
+            "target_qty": 10**9, "produced_qty": 0, "seconds_per_meter": 0.5,
+            "last_tick_time": now, "is_locked": running,
+        })
+        if running:
+            meta_rows.append({"machine_id": i, "work_order": wo, "erp_status": "In Process"})
+
+    span = LOG_DAYS * 86400
+    with engine.begin() as conn:
+        conn.execute(insert(Machine), machine_rows)
+        if meta_rows:
+            conn.execute(insert(ERPNextMetadata), meta_rows)
+        for start in range(0, log_rows, SEED_BATCH):
+            conn.execute(insert(ProductionLog), [
+                {
+                    "machine_id": n % machines + 1,
+                    "location": LOCATIONS[(n % machines + 1) % len(LOCATIONS)],
+                    "work_order": f"BENCH-WO-{n % machines + 1:05d}",
+                    "pipe_size": "110mm", "produced_qty": 1, "remaining_qty": 0,
+                    "status": "running",
+                    "timestamp": LOG_END - timedelta(seconds=span * n / log_rows),
+                }
+                for n in range(start, min(start + SEED_BATCH, log_rows))
+            ])
+        backfill_rollups(conn)  # bulk insert bypasses the write path
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Warm-up, `repeat` timed runs, then one traced run for peak memory."""
+    if setup:
+        setup()
+    fn()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_worker(args) -> Dict:
+    os.makedirs(args.workdir, exist_ok=True)
+    db_path = os.path.join(args.workdir, f"plant_{args.machines}m_{args.log_rows}r.db")
+    fresh = not os.path.exists(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["ERP_URL"] = start_mock_erp(args.machines)
+    os.environ.setdefault("ERP_API_KEY", "bench")
+    os.environ.setdefault("ERP_API_SECRET", "bench")
+    sys.path.insert(0, BASE_DIR)
+
+    if fresh:
+        started = time.perf_counter()
+        seed_plant(args.machines, args.log_rows)
+        print(f"🌱 Seeded {args.machines} machines / {args.log_rows} log rows "
+              f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    import main
+    import report
+    import erpnext_sync
+    from database import SessionLocal, write_session
+    from models import Machine
+
+    db = SessionLocal()
+    loop = asyncio.new_event_loop()
+    slow = max(1, args.repeat // 4)  # report paths scan real data – fewer runs
+
+    def reset_assignments():
+        with write_session() as s:
+            s.query(Machine).filter(Machine.status != "running").update(
+                {"erpnext_work_order_id": "", "is_locked": False, "status": "free"}
+            )
+
+    async def drain(body_iterator):
+        return [chunk async for chunk in body_iterator]
+
+    def export_csv():
+        resp = report.export_production_csv(REPORT_DAY, REPORT_DAY_END, "Modan", None, db)
+        if hasattr(resp, "body_iterator"):  # {"error": ...} when the window is empty
+            loop.run_until_complete(drain(resp.body_iterator))
+
+    def uncached():  # report paths measure the query, not a cache hit
+        db.expire_all()
+        report.report_cache.clear()
+
+    paths = {
+        "get_dashboard_data": (lambda: main.get_dashboard_data(db), args.repeat, db.expire_all),
+        "meter_tick": (lambda: loop.run_until_complete(main.meter_tick(time.monotonic())), args.repeat, None),
+        "auto_assign_work_orders": (erpnext_sync.auto_assign_work_orders, slow, reset_assignments),
+        "report_get_production_logs": (
+            lambda: report.get_production_logs(REPORT_DAY, REPORT_DAY_END, "Modan", None, db), slow, uncached
+        ),
+        "report_csv_export": (export_csv, slow, uncached),
+        "report_timeseries": (
+            lambda: report.production_timeseries(1, None, "1h", f"{LOG_END - timedelta(days=LOG_DAYS):%Y-%m-%d}",
+                                                 f"{LOG_END:%Y-%m-%d}", False, "rollup", db),
+            args.repeat, db.expire_all
+        ),
+    }
+
+    results = {}
+    for name, (fn, repeat, setup) in paths.items():
+        if args.only and name not in args.only:
+            continue
+        results[f"{name}[{args.machines}]"] = measure(fn, repeat, setup)
+        print(f"  ⏱ {name}[{args.machines}] done", file=sys.stderr)
+
+    loop.close()
+    db.close()
+    return results
+
+
+# =====================================================
+# RUNNER – spawn workers, compare against baseline
+# =====================================================
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("p50_ms", "peak_kb"):
+            if base[metric] and cur[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f"{key} {metric}: {base[metric]} → {cur[metric]} "
+                    f"(+{(cur[metric] / base[metric] - 1):.0%}, limit +{threshold:.0%})"
+                )
+    return regressions
+
+
+def collect(plants: List[int], log_rows: int, repeat: int, workdir: str = DEFAULT_WORKDIR,
+            only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """One worker process per plant size; raises RuntimeError when a worker fails."""
+    results: Dict[str, Dict] = {}
+    for machines in plants:
+        print(f"🏭 Plant: {machines} machines, {log_rows} log rows")
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--machines", str(machines), "--log-rows", str(log_rows),
+               "--repeat", str(repeat), "--workdir", workdir]
+        if only:
+            cmd += ["--only", ",".join(only)]
+        proc = subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Worker for {machines} machines failed")
+        results.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def run_suite(args) -> int:
+    try:
+        results = collect(args.plants, args.log_rows, args.repeat, args.workdir, args.only)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 2
+
+    print(f"\n{'path':<40} {'p50 ms':>10} {'p99 ms':>10} {'peak KB':>10}")
+    for key, r in results.items():
+        print(f"{key:<40} {r['p50_ms']:>10} {r['p99_ms']:>10} {r['peak_kb']:>10}")
+
+    document = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "log_rows": args.log_rows,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"ℹ️ No baseline at {args.baseline} – run with --save-baseline to create one")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"🔴 REGRESSION {line}")
+    if not regressions:
+        print(f"✅ No regressions beyond +{args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path benchmarks with regression tracking")
+    parser.add_argument("--plants", default="10,100,1000", help="comma-separated machine counts")
+    parser.add_argument("--log-rows", type=int, default=1_000_000, help="production_logs rows per plant (1M–50M)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per fast path")
+    parser.add_argument("--only", default="", help="comma-separated path names")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="seeded databases are cached here")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = +25%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--machines", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.plants = [int(p) for p in args.plants.split(",") if p]
+    args.only = [p for p in args.only.split(",") if p]
+
+    if args.worker:
+        results = run_worker(args)
+        print(json.dumps(results))  # last stdout line is read by run_suite
+        return
+    sys.exit(run_suite(args))
+
+
+if __name__ == "__main__":
+    main()
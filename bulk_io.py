@@ -0,0 +1,127 @@
+# =====================================================
+# bulk_io.py – Bulk ProductionLog Writes & CSV Export
+# SQLite: executemany in the caller's transaction
+# PostgreSQL: COPY on the caller's connection (same
+# transaction); CSV export streams COPY through asyncpg
+# =====================================================
+
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import async_engine
+from models import ProductionLog
+
+LOG_COLUMNS = [
+    "machine_id", "location", "work_order", "pipe_size",
+    "target_qty", "produced_qty", "remaining_qty", "status", "timestamp"
+]
+
+# COPY bypasses ORM column defaults
+_LOG_DEFAULTS = {"target_qty": 0, "produced_qty": 0, "remaining_qty": 0, "status": "running"}
+
+
+# =====================================================
+# LOG INSERTS
+# =====================================================
+def insert_production_logs(db: Session, rows: List[Dict]):
+    """Single executemany INSERT inside the caller's transaction."""
+    if rows:
+        db.execute(insert(ProductionLog), rows)
+
+
+def copy_production_logs(db: Session, rows: List[Dict]) -> int:
+    """
+    COPY rows into production_logs on the session's own connection
+    (PostgreSQL mode) – commits or rolls back with the caller's transaction.
+    """
+    if not rows:
+        return 0
+    now = datetime.now(timezone.utc)
+    records = [
+        tuple(row.get(col, _LOG_DEFAULTS.get(col, now if col == "timestamp" else None)) for col in LOG_COLUMNS)
+        for row in rows
+    ]
+    sql = f"COPY {ProductionLog.__tablename__} ({', '.join(LOG_COLUMNS)}) FROM STDIN"
+    driver_conn = db.connection().connection.driver_connection
+    with driver_conn.cursor() as cur:
+        if hasattr(cur, "copy"):  # psycopg 3
+            with cur.copy(sql) as copy:
+                for record in records:
+                    copy.write_row(record)
+        else:  # psycopg2
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerows(("" if v is None else v for v in record) for record in records)
+            buf.seek(0)
+            cur.copy_expert(sql + " WITH (FORMAT csv)", buf)
+    return len(records)
+
+
+# =====================================================
+# CSV EXPORT VIA COPY ... TO STDOUT
+# =====================================================
+def _export_sql(start_dt, end_dt, location):
+    clauses, args = [], []
+    if start_dt:
+        args.append(start_dt)
+        clauses.append(f"l.timestamp >= ${len(args)}")
+    if end_dt:
+        args.append(end_dt)
+        clauses.append(f"l.timestamp <= ${len(args)}")
+    if location:
+        args.append(location)
+        clauses.append(f"m.location = ${len(args)}")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    sql = f"""
+        SELECT l.machine_id, m.name AS machine_name, m.location, l.work_order,
+               l.pipe_size, l.produced_qty, l.timestamp, e.erp_status, e.erp_comments
+        FROM production_logs l
+        JOIN machines m ON m.id = l.machine_id
+        LEFT JOIN LATERAL (
+            SELECT erp_status, erp_comments FROM erpnext_metadata
+            WHERE erpnext_metadata.work_order = l.work_order
+            ORDER BY id LIMIT 1
+        ) e ON TRUE
+        {where}
+        ORDER BY l.timestamp DESC
+    """
+    return sql, args
+
+
+async def stream_export_csv(start_dt=None, end_dt=None, location=None) -> AsyncIterator[bytes]:
+    """Yield CSV chunks straight from the server-side COPY."""
+    sql, args = _export_sql(start_dt, end_dt, location)
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=64)
+
+    async def sink(chunk: bytes):
+        await chunks.put(chunk)
+
+    async def run_copy():
+        try:
+            async with async_engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(
+                    sql, *args, output=sink, format="csv", header=True
+                )
+        finally:
+            await chunks.put(None)
+
+    task = asyncio.create_task(run_copy())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        await task  # surface COPY errors
+    finally:
+        if not task.done():
+            task.cancel()
+
@@ -0,0 +1,111 @@
+# =====================================================
+# circuit_breaker.py – ERPNext Circuit Breaker
+# After ERP_BREAKER_FAILURES consecutive failed calls the
+# circuit opens and ERP calls fail at once instead of each
+# waiting out the request timeout; after ERP_BREAKER_RESET
+# seconds one probe call is let through (half-open)
+# =====================================================
+
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from metrics import ERP_REJECTED, GaugeFunc, erp_call
+
+ERP_BREAKER_FAILURES = int(os.getenv("ERP_BREAKER_FAILURES", 3))   # consecutive failures → open
+ERP_BREAKER_RESET = float(os.getenv("ERP_BREAKER_RESET", 30))      # seconds open before a probe
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling ERPNext while the circuit is open."""
+
+
+def is_outage(exc: BaseException) -> bool:
+    """Connection errors, timeouts and 5xx count; a 4xx means ERPNext answered."""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is None or exc.response.status_code >= 500
+    return isinstance(exc, requests.RequestException)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = ERP_BREAKER_FAILURES, reset_after: float = ERP_BREAKER_RESET):
+        self.name = name
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0      # monotonic
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------
+    def before_call(self, endpoint: str):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = HALF_OPEN
+                logging.info(f"🟡 {self.name} circuit half-open – probing")
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True  # this call is the probe
+                return
+        ERP_REJECTED.labels(endpoint).inc()
+        raise CircuitOpenError(f"{self.name} circuit open")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"🟢 {self.name} circuit closed – ERP reachable again")
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                logging.warning(f"🔴 {self.name} probe failed – circuit open for another {self.reset_after:.0f}s")
+            elif self.state == CLOSED and self.failures >= self.max_failures:
+                logging.warning(f"🔴 {self.name} circuit open after {self.failures} failures – "
+                                f"serving cached data for {self.reset_after:.0f}s")
+            else:
+                return  # still closed, or a call that started before the circuit opened
+            self.state, self.opened_at, self._probing = OPEN, time.monotonic(), False
+
+    def call(self, endpoint: str) -> "_GuardedCall":
+        """with breaker.call("work_order_list"): ... – erp_call metrics plus the breaker."""
+        return _GuardedCall(self, endpoint)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_after
+
+
+class _GuardedCall:
+    __slots__ = ("breaker", "metrics")
+
+    def __init__(self, breaker: CircuitBreaker, endpoint: str):
+        self.breaker = breaker
+        self.metrics = erp_call(endpoint)
+
+    def __enter__(self):
+        self.breaker.before_call(self.metrics.endpoint)
+        self.metrics.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.__exit__(exc_type, exc, tb)
+        if exc is None or not is_outage(exc):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return False
+
+
+erp_breaker = CircuitBreaker("ERPNext")
+GaugeFunc("erp_circuit_state", "ERPNext circuit (0 closed, 1 half-open, 2 open)",
+          lambda: _STATE_VALUES[erp_breaker.state])
@@ -0,0 +1,326 @@
+# =====================================================
+# cluster.py – Multi-Worker Deployment Support
+# DB-backed leader lease for the singleton loops +
+# pluggable pub/sub channel for state fan-out to all workers +
+# bounded replay log for resuming WebSocket clients
+# =====================================================
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, write_session
+from models import LeaderLease, PubSubMessage
+
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "single")          # single | multi
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "db" if CLUSTER_MODE == "multi" else "local")
+LEASE_TTL = float(os.getenv("LEASE_TTL", 15))                # seconds
+LEASE_RENEW_INTERVAL = float(os.getenv("LEASE_RENEW_INTERVAL", 5))
+PUBSUB_POLL_INTERVAL = float(os.getenv("PUBSUB_POLL_INTERVAL", 0.2))
+PUBSUB_RETENTION = int(os.getenv("PUBSUB_RETENTION", 2000))  # messages kept in the DB table
+SUBSCRIBER_QUEUE_SIZE = 256
+REPLAY_LOG_SIZE = int(os.getenv("REPLAY_LOG_SIZE", 500))     # messages kept per worker for resume
+TAIL_OVERLAP = int(os.getenv("TAIL_OVERLAP", 100))           # ids re-read below the cursor per poll
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+Message = Tuple[int, Dict]  # (sequence id, payload)
+
+
+# =====================================================
+# ID TAIL (polling an autoincrement table)
+# =====================================================
+class IdTail:
+    """
+    Cursor for tailing a table by id. On PostgreSQL an id is taken at
+    INSERT but only visible at COMMIT, so a lower id can show up after a
+    higher one was read. Each poll re-reads `overlap` ids below the
+    highest seen (`floor`) and fresh() drops the ones already delivered.
+    """
+
+    def __init__(self, last_id: int = 0, overlap: int = TAIL_OVERLAP):
+        self.last_id = last_id
+        self.overlap = overlap
+        self._base = last_id          # ids at or below this count as delivered
+        self._seen: Set[int] = set()  # delivered ids above _base
+
+    @property
+    def floor(self) -> int:
+        """Query for ids above this."""
+        return max(self._base, self.last_id - self.overlap)
+
+    def reset(self, last_id: int):
+        self.last_id = self._base = last_id
+        self._seen.clear()
+
+    def fresh(self, rows: Iterable[Any], id_of: Callable[[Any], int]) -> List[Any]:
+        """The rows not delivered yet, in the given order; advances the cursor."""
+        out = []
+        for row in rows:
+            row_id = id_of(row)
+            if row_id <= self._base or row_id in self._seen:
+                continue
+            self._seen.add(row_id)
+            self.last_id = max(self.last_id, row_id)
+            out.append(row)
+        self._base = self.floor
+        self._seen = {i for i in self._seen if i > self._base}
+        return out
+
+
+# =====================================================
+# PUB/SUB – INTERFACE
+# =====================================================
+class PubSub:
+    """Channel that delivers every published message to every worker."""
+
+    epoch = INSTANCE_ID  # sequence numbers are only comparable within one epoch
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, []).append(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(channel, [])
+        if queue in queues:
+            queues.remove(queue)
+
+    def _deliver(self, channel: str, message: Message):
+        for queue in self._subscribers.get(channel, []):
+            if queue.full():
+                queue.get_nowait()  # slow consumer – drop the oldest
+            queue.put_nowait(message)
+
+    async def publish(self, channel: str, payload: Dict) -> int:
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# =====================================================
+# PUB/SUB – LOCAL (single process / tests)
+# =====================================================
+class LocalPubSub(PubSub):
+    def __init__(self):
+        super().__init__()
+        self._seq = itertools.count(1)
+
+    async def publish(self, channel: str, payload: Dict) -> int:
+        seq = next(self._seq)
+        self._deliver(channel, (seq, payload))
+        return seq
+
+
+# =====================================================
+# PUB/SUB – DATABASE (SQLite or PostgreSQL shared by all workers)
+# =====================================================
+class DatabasePubSub(PubSub):
+    """Messages go through pubsub_messages; every worker polls for new ids."""
+
+    epoch = "db"  # ids are shared by all workers and survive restarts
+
+    def __init__(self, poll_interval: float = PUBSUB_POLL_INTERVAL, retention: int = PUBSUB_RETENTION):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._tail = IdTail()
+        self._poller: Optional[asyncio.Task] = None
+
+    def _insert(self, channel: str, text: str) -> int:
+        with write_session() as db:
+            msg_id = db.execute(
+                insert(PubSubMessage).values(channel=channel, payload=text).returning(PubSubMessage.id)
+            ).scalar_one()
+            if msg_id % 100 == 0:
+                db.execute(delete(PubSubMessage).where(PubSubMessage.id <= msg_id - self.retention))
+        return msg_id
+
+    async def publish(self, channel: str, payload: Dict) -> int:
+        text = json.dumps(payload, default=str)
+        return await asyncio.to_thread(self._insert, channel, text)
+
+    def _fetch(self, after_id: int) -> List[Tuple[int, str, str]]:
+        db = SessionLocal()
+        try:
+            return db.execute(
+                select(PubSubMessage.id, PubSubMessage.channel, PubSubMessage.payload)
+                .where(PubSubMessage.id > after_id)
+                .order_by(PubSubMessage.id)
+                .limit(500)
+            ).all()
+        finally:
+            db.close()
+
+    def _max_id(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.execute(select(func.max(PubSubMessage.id))).scalar() or 0
+        finally:
+            db.close()
+
+    async def _poll(self):
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._fetch, self._tail.floor)
+                for msg_id, channel, text in self._tail.fresh(rows, lambda r: r[0]):
+                    self._deliver(channel, (msg_id, json.loads(text)))
+                if len(rows) == 500:
+                    continue  # backlog – keep draining
+            except Exception as e:
+                logging.error(f"PUBSUB POLL ERROR: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        # Only messages published from now on – history is not replayed
+        self._tail.reset(await asyncio.to_thread(self._max_id))
+        self._poller = asyncio.create_task(self._poll(), name="PubSubPoller")
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+
+
+def create_pubsub(backend: str = PUBSUB_BACKEND) -> PubSub:
+    if backend == "db":
+        return DatabasePubSub()
+    return LocalPubSub()
+
+
+# =====================================================
+# REPLAY LOG (WebSocket resume)
+# =====================================================
+class ReplayLog:
+    """
+    Last REPLAY_LOG_SIZE messages of one channel as seen by this worker.
+    A reconnecting client gets everything after its last sequence, or
+    None when that sequence is no longer covered (→ full snapshot).
+    """
+
+    def __init__(self, size: int = REPLAY_LOG_SIZE):
+        self._messages: Deque[Message] = deque(maxlen=size)
+        self.head = 0                   # last sequence appended
+        self.floor: Optional[int] = None  # sequences above this are all in the log
+
+    def append(self, seq: int, payload: Dict):
+        if self.floor is None:
+            self.floor = seq - 1
+        elif len(self._messages) == self._messages.maxlen:
+            self.floor = self._messages[0][0]  # about to be evicted
+        self._messages.append((seq, payload))
+        self.head = max(self.head, seq)  # a late-committed id may arrive below head
+
+    def since(self, seq: int) -> Optional[List[Message]]:
+        if self.floor is None or not self.floor <= seq <= self.head:
+            return None
+        return [m for m in self._messages if m[0] > seq]
+
+    def latest(self, predicate: Callable[[Dict], bool]) -> Optional[Message]:
+        for message in reversed(self._messages):
+            if predicate(message[1]):
+                return message
+        return None
+
+
+# =====================================================
+# LEADER LEASE
+# =====================================================
+class LeaderElection:
+    """
+    Holds a row in leader_leases while this instance is the leader.
+    The lease is renewed every LEASE_RENEW_INTERVAL and expires after
+    LEASE_TTL, so a crashed leader is replaced within one TTL.
+    """
+
+    def __init__(self, name: str = "background-loops", ttl: float = LEASE_TTL,
+                 renew_interval: float = LEASE_RENEW_INTERVAL, holder: str = INSTANCE_ID):
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.holder = holder
+        self.is_leader = False
+
+    def try_acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        expires = now + timedelta(seconds=self.ttl)
+        with write_session() as db:
+            result = db.execute(
+                update(LeaderLease)
+                .where(LeaderLease.name == self.name)
+                .where((LeaderLease.holder == self.holder) | (LeaderLease.expires_at < now))
+                .values(holder=self.holder, expires_at=expires)
+            )
+            if result.rowcount == 1:
+                return True
+            exists = db.execute(
+                select(LeaderLease.name).where(LeaderLease.name == self.name)
+            ).first()
+            if exists:
+                return False
+            try:
+                with db.begin_nested():
+                    db.add(LeaderLease(name=self.name, holder=self.holder, expires_at=expires))
+                return True
+            except IntegrityError:
+                return False  # another instance inserted first
+
+    def release(self):
+        with write_session() as db:
+            db.execute(
+                delete(LeaderLease)
+                .where(LeaderLease.name == self.name, LeaderLease.holder == self.holder)
+            )
+
+    async def run(self, start_loops: Callable[[], List[asyncio.Task]]):
+        """Start the singleton loops while leader; cancel them when the lease is lost."""
+        tasks: List[asyncio.Task] = []
+        try:
+            while True:
+                try:
+                    leader = await asyncio.to_thread(self.try_acquire)
+                except Exception as e:
+                    logging.error(f"LEADER LEASE ERROR: {e}")
+                    leader = False
+
+                if leader and not self.is_leader:
+                    logging.info(f"👑 {self.holder} elected leader – starting background loops")
+                    tasks = start_loops()
+                elif not leader and self.is_leader:
+                    logging.warning(f"⚠️ {self.holder} lost leadership – stopping background loops")
+                    await _cancel(tasks)
+                    tasks = []
+                self.is_leader = leader
+
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            await _cancel(tasks)
+            if self.is_leader:
+                self.is_leader = False
+                try:
+                    await asyncio.to_thread(self.release)
+                except Exception as e:
+                    logging.error(f"LEADER LEASE RELEASE ERROR: {e}")
+
+
+async def _cancel(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,23 @@
+# =====================================================
+# config.py – Environment Settings (single .env load)
+# Every module reads its settings from here instead of
+# calling load_dotenv() on its own
+# =====================================================
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./production.db")
+
+# ERPNext
+ERP_URL = os.getenv("ERP_URL")  # e.g. http://127.0.0.1:8000
+# API_KEY / API_SECRET are the names erp_client.py used to read – still honoured
+ERP_API_KEY = os.getenv("ERP_API_KEY") or os.getenv("API_KEY")
+ERP_API_SECRET = os.getenv("ERP_API_SECRET") or os.getenv("API_SECRET")
+ERP_TIMEOUT = int(os.getenv("ERP_TIMEOUT", 20))  # seconds
+
+# PLC gateways (ingest.py) – unset → no token required
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
@@ -1,35 +1,86 @@
- # =====================================================
-# HELPER FUNCTION TO CREATE ALL TABLES
-# =====================================================
-def init_db():
-    """
-    Creates all tables including machines, production_logs,
-    ERPNext metadata, and scheduled_jobs.
-    Safe to call multiple times.
-    """
-    from models import Base  # ensure Base from models if needed
-    Base.metadata.create_all(bind=engine)
-
 # =====================================================
 # database.py – Future-Proof Version for Taco Group HDPE
 # Steps 1 → 42 + Step 43 (ScheduledJob Table)
 # =====================================================
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
-from datetime import datetime, timezone
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
 import os
 
 # =====================================================
 # DATABASE CONFIG
 # =====================================================
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./production.db")
+from config import DATABASE_URL as CONFIGURED_DATABASE_URL
+from metrics import instrument_database
+
+
+def _sync_url(url: str) -> str:
+    """postgres:// (Heroku style) and bare postgresql:// → psycopg 3 driver."""
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("postgres", "postgresql"):
+        return f"postgresql+psycopg://{rest}"
+    return url
+
+DATABASE_URL = _sync_url(CONFIGURED_DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_POSTGRES = DATABASE_URL.startswith("postgresql")
+
+# Pool sizing – 8 background loops + API handlers + to_thread workers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds, Postgres only
+
+# Async pool (PostgreSQL mode) – sized separately, shared by COPY/bulk paths
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", 10))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", 5))
+
+# SQLite performance profile (applied on every new connection)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))    # 256 MB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))  # 64 MB
+
+# In-memory SQLite uses a single-connection pool that takes no sizing
+_pool_args = {} if DATABASE_URL in ("sqlite://", "sqlite:///:memory:") else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+if IS_POSTGRES:
+    _pool_args["pool_recycle"] = DB_POOL_RECYCLE
 
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
     pool_pre_ping=True,
-    future=True
+    future=True,
+    **_pool_args
 )
+instrument_database(engine)  # db_query_seconds / db_commit_seconds
+
+# Set while a write_session() is open in the current thread/task
+_in_write_txn: ContextVar[bool] = ContextVar("in_write_txn", default=False)
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_profile(dbapi_conn, connection_record):
+        # Let SQLAlchemy issue BEGIN itself (needed for BEGIN IMMEDIATE below)
+        dbapi_conn.isolation_level = None
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        # Writers take the write lock up front; plain readers stay on a WAL snapshot
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if _in_write_txn.get() else "BEGIN")
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -38,107 +89,121 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
-Base = declarative_base()
+# =====================================================
+# POSTGRESQL MODE – ASYNC ENGINE (asyncpg)
+# =====================================================
+def _asyncpg_url(url: str) -> str:
+    """postgresql[+driver]://... → postgresql+asyncpg://..."""
+    scheme, rest = url.split("://", 1)
+    return f"postgresql+asyncpg://{rest}"
+
+async_engine = None  # COPY ... TO STDOUT export stream (bulk_io.py)
+
+if IS_POSTGRES:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _asyncpg_url(DATABASE_URL))
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=DB_ASYNC_POOL_SIZE,
+        max_overflow=DB_ASYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+    instrument_database(async_engine.sync_engine)
 
 # =====================================================
-# TABLE DEFINITIONS – FUTURE-PROOF
+# SINGLE-WRITER QUEUE
 # =====================================================
+# SQLite allows one writer at a time. Write transactions queue up here
+# (FIFO) instead of spinning on "database is locked"; readers never take
+# this lock and read from their WAL snapshot meanwhile.
+class _WriteQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(self._lock)
+        self._next_ticket = 0
+        self._serving = 0
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._turn.wait()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._serving += 1
+                self._turn.notify_all()
+
+write_queue = _WriteQueue()
+
+@contextmanager
+def write_session():
+    """
+    Session for a write transaction: waits its turn in the write queue,
+    commits on success and rolls back on error. Do not nest. The wait
+    blocks the thread – from async code run it via asyncio.to_thread.
+    """
+    with write_queue.slot():
+        token = _in_write_txn.set(True)
+        db = SessionLocal()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            _in_write_txn.reset(token)
 
-class Machine(Base):
-    __tablename__ = "machines"
-    __table_args__ = {"extend_existing": True}
-
-    id = Column(Integer, primary_key=True, index=True)
-    location = Column(String, index=True, nullable=False)
-    name = Column(String, nullable=False)
-    status = Column(String, default="free")
-    work_order = Column(String, nullable=True)
-    pipe_size = Column(String, nullable=True)
-    target_qty = Column(Integer, default=0)
-    produced_qty = Column(Integer, default=0)
-    seconds_per_meter = Column(Float, default=0)
-    last_tick_time = Column(DateTime, nullable=True)
-    erpnext_work_order_id = Column(String, nullable=True)
-
-
-class ProductionLog(Base):
-    __tablename__ = "production_logs"
-    __table_args__ = {"extend_existing": True}
-
-    id = Column(Integer, primary_key=True, index=True)
-    machine_id = Column(Integer, nullable=False)
-    location = Column(String, nullable=False)
-    work_order = Column(String, nullable=True)
-    pipe_size = Column(String, nullable=True)
-    target_qty = Column(Integer, nullable=False, default=0)
-    produced_qty = Column(Integer, default=0)
-    remaining_qty = Column(Integer, default=0)
-    status = Column(String, nullable=False, default="running")
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-
-
-class ERPNextMetadata(Base):
-    __tablename__ = "erpnext_metadata"
-    __table_args__ = {"extend_existing": True}
-
-    id = Column(Integer, primary_key=True, index=True)
-    machine_id = Column(Integer, nullable=False)
-    work_order = Column(String, nullable=False)
-    erp_status = Column(String, default="Not Started")
-    erp_comments = Column(String, nullable=True)
-    last_synced = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+Base = declarative_base()
 
+# Table definitions live in models.py (single source of truth)
 
 # =====================================================
-# STEP 43 → SCHEDULED JOBS TABLE
+# HELPER FUNCTION TO CREATE / UPGRADE ALL TABLES
 # =====================================================
-class ScheduledJob(Base):
-    __tablename__ = "scheduled_jobs"
-    __table_args__ = {"extend_existing": True}
-
-    id = Column(Integer, primary_key=True, index=True)
-    work_order = Column(String, nullable=False)
-    location = Column(String, nullable=False)
-    pipe_size = Column(String, nullable=True)
-    qty = Column(Integer, default=0)
-    produced_qty = Column(Integer, default=0)
-    priority = Column(Integer, default=0)  # Higher = urgent
-    assigned_machine_id = Column(Integer, nullable=True)  # None = not assigned
-    eta_seconds = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-
-# 🔥 PERMANENT AUTO SEED FUNCTION
+def init_db():
+    """
+    Brings the schema up to date through the versioned migrations
+    (creates missing tables, columns and indexes on existing databases).
+    Safe to call multiple times.
+    """
+    from migrations import upgrade
+    upgrade()
+
+# 🔥 PERMANENT AUTO SEED FUNCTION (called from the app startup phase)
 def seed_default_machines():
-    db = SessionLocal()
+    from models import Machine
     try:
-        # Check if any machine already exists
-        existing = db.query(Machine).first()
-        if existing:
-            print("ℹ️ Machines already exist. Skipping seed.")
-            return
-
-        default_data = {
-            "Modan": ["M1", "M2", "M3"],
-            "Baldeya": ["B1", "B2"],
-            "Al-Khraj": ["K1", "K2"]
-        }
-
-        for location, machines in default_data.items():
-            for name in machines:
-                db.add(Machine(
-                    name=name,
-                    location=location,
-                    status="idle"
-                ))
-
-        db.commit()
+        with write_session() as db:
+            # Check if any machine already exists
+            existing = db.query(Machine).first()
+            if existing:
+                print("ℹ️ Machines already exist. Skipping seed.")
+                return
+
+            default_data = {
+                "Modan": ["M1", "M2", "M3"],
+                "Baldeya": ["B1", "B2"],
+                "Al-Khraj": ["K1", "K2"]
+            }
+
+            for location, machines in default_data.items():
+                for name in machines:
+                    db.add(Machine(
+                        name=name,
+                        location=location,
+                        status="idle"
+                    ))
+
         print("✅ Default machines seeded successfully.")
 
     except Exception as e:
         print("❌ Seed error:", e)
-    finally:
-        db.close()
-
-
-# 🔥 AUTO RUN SEED ON IMPORT
-seed_default_machines()
\ No newline at end of file
@@ -2,22 +2,20 @@
 # erpclient.py – ERPNext REST Client (Production Ready)
 # =====================================================
 
-import os
+import logging
+
 import requests
-from dotenv import load_dotenv
 
 # =====================================================
-# Load .env variables
+# Settings (.env loaded once in config.py)
 # =====================================================
-load_dotenv()
+from config import ERP_URL, ERP_API_KEY, ERP_API_SECRET, ERP_TIMEOUT
 
-ERP_URL = os.getenv("ERP_URL")  # e.g. http://127.0.0.1:8000
-ERP_API_KEY = os.getenv("API_KEY")
-ERP_API_SECRET = os.getenv("API_SECRET")
-ERP_TIMEOUT = int(os.getenv("ERP_TIMEOUT", 20))
 
-if not ERP_URL:
-    raise ValueError("ERP_URL missing in .env")
+def _require_erp_url():
+    # Checked on use, not on import – importing this module must stay free
+    if not ERP_URL:
+        raise ValueError("ERP_URL missing in .env")
 
 HEADERS = {}
 if ERP_API_KEY and ERP_API_SECRET:
@@ -36,6 +34,7 @@ def fetch_work_orders(status=None):
     Fetch Work Orders from ERPNext
     Optional filter by status
     """
+    _require_erp_url()
     try:
         url = f"{ERP_URL}/api/resource/Work Order"
 
@@ -57,7 +56,7 @@ def fetch_work_orders(status=None):
         return response.json().get("data", [])
 
     except requests.RequestException as e:
-        print(f"❌ ERP Fetch Error: {e}")
+        logging.error(f"❌ ERP Fetch Error: {e}")
         return []
 
 
@@ -70,6 +69,7 @@ def update_work_order(work_order_name, updates: dict):
     Example:
     update_work_order("WO-0001", {"status": "In Process"})
     """
+    _require_erp_url()
     try:
         url = f"{ERP_URL}/api/resource/Work Order/{work_order_name}"
 
@@ -81,11 +81,11 @@ def update_work_order(work_order_name, updates: dict):
         )
 
         response.raise_for_status()
-        print(f"✅ ERP Updated: {work_order_name}")
+        logging.info(f"✅ ERP Updated: {work_order_name}")
         return response.json()
 
     except requests.RequestException as e:
-        print(f"❌ ERP Update Error: {e}")
+        logging.error(f"❌ ERP Update Error: {e}")
         return None
 
 
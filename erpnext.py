@@ -4,23 +4,20 @@
 # Includes ERP auto-update + safe dashboard sync
 # =====================================================
 
-import os
+import logging
 import requests
 from typing import List, Dict
 from database import SessionLocal
+from circuit_breaker import CircuitOpenError, erp_breaker
 from models import Machine, ERPNextMetadata
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 import asyncio
-from dotenv import load_dotenv
 
 # =====================================================
 # LOAD ERP CREDENTIALS
 # =====================================================
-load_dotenv()
-ERP_URL = os.getenv("ERP_URL")
-API_KEY = os.getenv("ERP_API_KEY")
-API_SECRET = os.getenv("ERP_API_SECRET")
+from config import ERP_URL, ERP_API_KEY as API_KEY, ERP_API_SECRET as API_SECRET
 TIMEOUT = 10  # seconds
 
 HEADERS = {}
@@ -35,9 +32,9 @@ if API_KEY and API_SECRET:
 # FETCH ACTIVE WORK ORDERS FROM ERPNext
 # =====================================================
 def get_work_orders() -> List[Dict]:
-    """Fetch active Work Orders from ERPNext with auto-fix of missing fields."""
+    """Fetch active Work Orders from ERPNext (read only – see fill_erpnext_missing_fields.py)."""
     if not ERP_URL or not HEADERS:
-        print("⚠ ERP credentials missing")
+        logging.warning("⚠ ERP credentials missing")
         return []
 
     url = f"{ERP_URL}/api/resource/Work Order"
@@ -52,44 +49,37 @@ def get_work_orders() -> List[Dict]:
     }
 
     try:
-        resp = requests.get(url, headers=HEADERS, params=params, timeout=TIMEOUT)
-        resp.raise_for_status()
+        with erp_breaker.call("work_order_list"):
+            resp = requests.get(url, headers=HEADERS, params=params, timeout=TIMEOUT)
+            resp.raise_for_status()
         data = resp.json().get("data", []) or []
 
-        # Auto-fix missing fields
-        for wo in data:
-            updates = {}
-            if not wo.get("custom_location"):
-                updates["custom_location"] = "Modan"
-            if not wo.get("custom_pipe_size"):
-                updates["custom_pipe_size"] = '2"'
-            if updates:
-                update_work_order_fields(wo["name"], updates)
-                wo.update(updates)
-
         return data
 
+    except CircuitOpenError:
+        pass  # already logged when the circuit opened
     except requests.exceptions.Timeout:
-        print("⏱ ERP request timeout")
+        logging.error("⏱ ERP request timeout")
     except requests.exceptions.RequestException as e:
-        print("❌ ERP request failed:", e)
+        logging.error(f"❌ ERP request failed: {e}")
     except Exception as e:
-        print("❌ ERP unknown error:", e)
+        logging.error(f"❌ ERP unknown error: {e}")
 
     return []
 
 # =====================================================
-# UPDATE ERP WORK ORDER FIELDS (AUTO FIX)
+# UPDATE ERP WORK ORDER FIELDS
 # =====================================================
 def update_work_order_fields(wo_name: str, updates: dict):
     if not wo_name or not updates or not ERP_URL:
         return
     try:
         url = f"{ERP_URL}/api/resource/Work Order/{wo_name}"
-        requests.put(url, json=updates, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
-        print(f"✅ ERP WO {wo_name} fields updated: {updates}")
+        with erp_breaker.call("work_order_update"):
+            requests.put(url, json=updates, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
+        logging.info(f"✅ ERP WO {wo_name} fields updated: {updates}")
     except Exception as e:
-        print(f"❌ ERP field update failed for {wo_name}: {e}")
+        logging.error(f"❌ ERP field update failed for {wo_name}: {e}")
 
 # =====================================================
 # UPDATE ERP WORK ORDER STATUS
@@ -99,10 +89,11 @@ def update_work_order_status(wo_name: str, status: str):
         return
     try:
         url = f"{ERP_URL}/api/resource/Work Order/{wo_name}"
-        requests.put(url, json={"status": status}, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
-        print(f"🔄 ERP WO {wo_name} → {status}")
+        with erp_breaker.call("work_order_status"):
+            requests.put(url, json={"status": status}, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
+        logging.info(f"🔄 ERP WO {wo_name} → {status}")
     except Exception as e:
-        print(f"❌ ERP status update failed for {wo_name}: {e}")
+        logging.error(f"❌ ERP status update failed for {wo_name}: {e}")
 
 # =====================================================
 # SMART AUTO-ASSIGN WORK ORDERS TO MACHINES
@@ -153,7 +144,7 @@ def auto_assign_work_orders(work_orders: List[Dict]):
                         meta.erp_status = "Assigned"
 
                     db.commit()
-                    print(f"🟢 Assigned WO {wo_name} → Machine {m.name} ({location})")
+                    logging.info(f"🟢 Assigned WO {wo_name} → Machine {m.name} ({location})")
                     assigned = True
                     break
 
@@ -178,11 +169,11 @@ def auto_assign_work_orders(work_orders: List[Dict]):
                     meta.erp_status = "Assigned"
 
                 db.commit()
-                print(f"🟢 Assigned WO {wo_name} → Machine {m.name} ({location}) [fallback]")
+                logging.info(f"🟢 Assigned WO {wo_name} → Machine {m.name} ({location}) [fallback]")
 
     except SQLAlchemyError as e:
         db.rollback()
-        print("❌ DB error during auto-assign:", e)
+        logging.error(f"❌ DB error during auto-assign: {e}")
     finally:
         db.close()
 
@@ -190,12 +181,12 @@ def auto_assign_work_orders(work_orders: List[Dict]):
 # ERPNext SYNC LOOP (ASYNC, BACKGROUND)
 # =====================================================
 async def erpnext_sync_loop(interval: int = 10):
-    print("🚀 ERPNext Sync Loop started")
+    logging.info("🚀 ERPNext Sync Loop started")
     while True:
         try:
             work_orders = get_work_orders()
             if work_orders:
                 auto_assign_work_orders(work_orders)
         except Exception as e:
-            print("❌ ERP Sync Loop error:", e)
+            logging.error(f"❌ ERP Sync Loop error: {e}")
         await asyncio.sleep(interval)
@@ -3,42 +3,169 @@
 # ERPNext Production Integration (Stable, Admin-Safe, Production Ready)
 # =====================================================
 
-import os
+import hashlib
+import json
 import logging
-from datetime import datetime
-from typing import List, Dict
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Dict, NamedTuple, Optional
 
 import requests
-from dotenv import load_dotenv
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
 
-from database import SessionLocal
-from models import Machine, ERPNextMetadata
+from database import SessionLocal, write_session
+from circuit_breaker import CLOSED, CircuitOpenError, erp_breaker
+from models import Machine, ERPNextMetadata, ErpSnapshot
 
 # =====================================================
-# Logging Configuration
+# Environment Settings (logging is configured by main.py)
 # =====================================================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
+from config import (
+    ERP_URL,
+    ERP_API_KEY as API_KEY,
+    ERP_API_SECRET as API_SECRET,
+    ERP_TIMEOUT as TIMEOUT
 )
 
-# =====================================================
-# Load Environment Variables
-# =====================================================
-load_dotenv()
-ERP_URL = os.getenv("ERP_URL")
-API_KEY = os.getenv("ERP_API_KEY")
-API_SECRET = os.getenv("ERP_API_SECRET")
-TIMEOUT = int(os.getenv("ERP_TIMEOUT", 20))
-
 HEADERS = {
     "Authorization": f"token {API_KEY}:{API_SECRET}",
     "Accept": "application/json",
     "Content-Type": "application/json"
 }
 
+# =====================================================
+# Work Order Snapshot (last good fetch + content version)
+# =====================================================
+WO_SNAPSHOT_MAX_AGE = float(os.getenv("WO_SNAPSHOT_MAX_AGE", 10))  # seconds
+WO_SHARED_POLL = float(os.getenv("WO_SHARED_POLL", 2))  # seconds between follower reads of erp_snapshots
+SHARED_SNAPSHOT = "work_orders"
+
+class SnapshotView(NamedTuple):
+    work_orders: List[Dict]
+    version: Optional[str]
+    stale: bool               # ERPNext could not confirm it lately
+    age: Optional[float]      # seconds since the last good fetch (None = never fetched)
+
+class WorkOrderSnapshot:
+    """
+    Last successful get_work_orders() result. The version is a digest of
+    the content, taken once per fetch – identical across workers, so it
+    works as an ETag behind a load balancer.
+
+    Multi-worker: main.py sets `owner` (→ is this worker the leader?).
+    The owner fetches from ERPNext and stores each result in
+    erp_snapshots; the other workers only read that row, so ERPNext is
+    polled once per interval however many workers run.
+    """
+
+    def __init__(self):
+        self.work_orders: List[Dict] = []
+        self.version: Optional[str] = None
+        self.fetched_at = float("-inf")  # monotonic
+        self.refresh_failed = False
+        self.owner: Optional[Callable[[], bool]] = None  # None → single worker, nothing shared
+        self._checked_at = float("-inf")                 # monotonic, last erp_snapshots read
+        self._refresh = threading.Lock()
+
+    def update(self, work_orders: List[Dict]):
+        payload = json.dumps(work_orders, sort_keys=True, default=str)
+        self.work_orders = work_orders
+        self.version = hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+        self.fetched_at = time.monotonic()
+        self.refresh_failed = False
+        if self.owner is not None:
+            self._share(payload)
+
+    def _share(self, payload: Optional[str] = None):
+        """Write this worker's snapshot (or just its failed flag) to erp_snapshots."""
+        try:
+            with write_session() as db:
+                row = db.get(ErpSnapshot, SHARED_SNAPSHOT)
+                if payload is None:
+                    if row is not None:
+                        row.refresh_failed = self.refresh_failed
+                    return
+                if row is None:
+                    row = ErpSnapshot(name=SHARED_SNAPSHOT)
+                    db.add(row)
+                row.version, row.payload = self.version, payload
+                row.fetched_at, row.refresh_failed = datetime.now(timezone.utc), False
+        except Exception as e:
+            logging.error(f"❌ Work order snapshot share failed: {e}")
+
+    def _follow(self, max_age: float):
+        """Non-owner: pick up the owner's snapshot; the payload only when its version moved."""
+        now = time.monotonic()
+        if now - self._checked_at < WO_SHARED_POLL:
+            return
+        self._checked_at = now
+        db = SessionLocal()
+        try:
+            head = db.query(ErpSnapshot.version, ErpSnapshot.fetched_at, ErpSnapshot.refresh_failed).filter(
+                ErpSnapshot.name == SHARED_SNAPSHOT
+            ).first()
+            if head is None:
+                return
+            if head.version != self.version:
+                payload = db.query(ErpSnapshot.payload).filter(ErpSnapshot.name == SHARED_SNAPSHOT).scalar()
+                self.work_orders, self.version = json.loads(payload), head.version
+        except Exception as e:
+            logging.error(f"❌ Work order snapshot read failed: {e}")
+            return
+        finally:
+            db.close()
+        fetched_at = head.fetched_at if head.fetched_at.tzinfo else head.fetched_at.replace(tzinfo=timezone.utc)
+        age = max(0.0, (datetime.now(timezone.utc) - fetched_at).total_seconds())
+        self.fetched_at = now - age
+        # A leader that went quiet counts as failing too
+        self.refresh_failed = head.refresh_failed or age > 3 * max_age
+
+    def age(self) -> Optional[float]:
+        return None if self.version is None else time.monotonic() - self.fetched_at
+
+    def view(self, max_age: float = WO_SNAPSHOT_MAX_AGE) -> SnapshotView:
+        age = self.age()
+        stale = age is None or (age > max_age and (self.refresh_failed or erp_breaker.state != CLOSED))
+        return SnapshotView(self.work_orders, self.version, stale, age)
+
+    def get(self, max_age: float = WO_SNAPSHOT_MAX_AGE) -> SnapshotView:
+        """
+        Stale-while-revalidate: an old snapshot is returned at once while one
+        background thread refreshes it. Only a worker that has never fetched
+        waits for ERPNext – and not even then while the circuit is open.
+        Non-owners never call ERPNext (see _follow).
+        """
+        if self.owner is not None and not self.owner():
+            self._follow(max_age)
+            return self.view(max_age)
+        age = self.age()
+        if (age is not None and age <= max_age) or erp_breaker.is_open:
+            return self.view(max_age)
+        if age is None:
+            with self._refresh:
+                if self.age() is None:
+                    self._fetch()
+        elif self._refresh.acquire(blocking=False):
+            threading.Thread(target=self._revalidate, name="WorkOrderRevalidate", daemon=True).start()
+        return self.view(max_age)
+
+    def _fetch(self):
+        fetched_at = self.fetched_at
+        get_work_orders()
+        self.refresh_failed = self.fetched_at == fetched_at
+        if self.refresh_failed and self.owner is not None:
+            self._share()
+
+    def _revalidate(self):
+        try:
+            self._fetch()
+        finally:
+            self._refresh.release()
+
+work_order_snapshot = WorkOrderSnapshot()
+
 # =====================================================
 # Fetch Active Work Orders from ERPNext
 # =====================================================
@@ -57,24 +184,17 @@ def get_work_orders() -> List[Dict]:
     }
 
     try:
-        resp = requests.get(url, headers=HEADERS, params=params, timeout=TIMEOUT)
-        resp.raise_for_status()
+        with erp_breaker.call("work_order_list"):
+            resp = requests.get(url, headers=HEADERS, params=params, timeout=TIMEOUT)
+            resp.raise_for_status()
         work_orders = resp.json().get("data", []) or []
 
-        # Auto-fix missing fields
-        for wo in work_orders:
-            updates = {}
-            if not wo.get("custom_location"):
-                updates["custom_location"] = "Modan"
-            if not wo.get("custom_pipe_size"):
-                updates["custom_pipe_size"] = "2\""
-            if updates:
-                update_work_order_fields(wo["name"], updates)
-                wo.update(updates)
-
         logging.info(f"📥 ERPNext → {len(work_orders)} work orders fetched")
+        work_order_snapshot.update(work_orders)
         return work_orders
 
+    except CircuitOpenError:
+        return []  # already logged when the circuit opened
     except Exception as e:
         logging.error(f"❌ ERP fetch error: {e}")
         return []
@@ -87,7 +207,8 @@ def update_work_order_fields(wo_name: str, updates: dict):
         return
     try:
         url = f"{ERP_URL}/api/resource/Work Order/{wo_name}"
-        requests.put(url, json=updates, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
+        with erp_breaker.call("work_order_update"):
+            requests.put(url, json=updates, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
         logging.info(f"🔄 ERP WO {wo_name} fields updated → {updates}")
     except Exception as e:
         logging.error(f"❌ Failed to update ERP WO fields: {e}")
@@ -100,7 +221,8 @@ def update_work_order_status(erp_work_order_id: str, status: str):
         return
     try:
         url = f"{ERP_URL}/api/resource/Work Order/{erp_work_order_id}"
-        requests.put(url, json={"status": status}, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
+        with erp_breaker.call("work_order_status"):
+            requests.put(url, json={"status": status}, headers=HEADERS, timeout=TIMEOUT).raise_for_status()
         logging.info(f"🔄 ERP WO {erp_work_order_id} → {status}")
     except Exception as e:
         logging.error(f"❌ ERP status update failed: {e}")
@@ -109,13 +231,39 @@ def update_work_order_status(erp_work_order_id: str, status: str):
 # Auto-Assign ERP Work Orders to Machines (Final Fixed)
 # =====================================================
 def auto_assign_work_orders() -> None:
-    db: Session = SessionLocal()
     try:
-        work_orders = get_work_orders()
+        work_orders = get_work_orders()  # before the write slot – ERP latency must not hold it
         if not work_orders:
             logging.info("ℹ️ No ERP work orders to assign")
             return
+        assigned = assign_work_orders(work_orders)
+    except SQLAlchemyError as e:
+        logging.error(f"❌ DB error: {e}")
+        return
+    except Exception as e:
+        logging.error(f"❌ Auto-assign error: {e}")
+        return
+
+    # ERP is told only after the local assignments are committed
+    for wo_name, machine_id, machine_name in assigned:
+        # 🔥 Safe Fix → Assign numeric machine ID to ERP, prevent 'invalid literal' error
+        try:
+            numeric_machine_id = int(machine_id)
+        except ValueError:
+            numeric_machine_id = 0  # fallback if ID invalid
 
+        update_work_order_fields(wo_name, {
+            "custom_machine_id": numeric_machine_id
+        })
+
+        logging.info(
+            f"✅ Assigned ERP WO {wo_name} → Machine {machine_name}"
+        )
+
+def assign_work_orders(work_orders: List[Dict]) -> List[tuple]:
+    """One write transaction; returns (work order, machine id, machine name) per assignment."""
+    assigned = []
+    with write_session() as db:
         for wo in work_orders:
             wo_name = wo.get("name")
             wo_status = wo.get("status")
@@ -182,30 +330,9 @@ def auto_assign_work_orders() -> None:
                 meta.erp_status = "Assigned"
                 meta.last_synced = datetime.now()
 
-            db.commit()
-
-            # 🔥 Safe Fix → Assign numeric machine ID to ERP, prevent 'invalid literal' error
-            try:
-                numeric_machine_id = int(selected_machine.id)
-            except ValueError:
-                numeric_machine_id = 0  # fallback if ID invalid
-
-            update_work_order_fields(wo_name, {
-                "custom_machine_id": numeric_machine_id
-            })
-
-            logging.info(
-                f"✅ Assigned ERP WO {wo_name} → Machine {selected_machine.name}"
-            )
-
-    except SQLAlchemyError as e:
-        db.rollback()
-        logging.error(f"❌ DB error: {e}")
-    except Exception as e:
-        db.rollback()
-        logging.error(f"❌ Auto-assign error: {e}")
-    finally:
-        db.close()
+            db.flush()  # later work orders in this pass see the machine as taken
+            assigned.append((wo_name, selected_machine.id, selected_machine.name))
+    return assigned
 
 # =====================================================
 # Get Work Orders for Admin Dashboard Only
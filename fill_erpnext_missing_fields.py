@@ -1,20 +1,34 @@
 # =====================================================
-# fill_erpnext_missing_fields.py – Safe ERPNext Work Order Fix
+# fill_erpnext_missing_fields.py – Work Order Remediation Job
+# Finds Work Orders without custom_location / custom_pipe_size
+# (server-side filters, keyset paging by name) and patches
+# them with bounded concurrency. The backend only reads
+# Work Orders – run this after imports or on a schedule
+# Usage: python fill_erpnext_missing_fields.py --dry-run
+#        python fill_erpnext_missing_fields.py --concurrency 8 --state fill_state.json
 # =====================================================
 
+import argparse
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import requests
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # =====================================================
-# Load .env variables
+# Load .env variables (via config.py)
 # =====================================================
-load_dotenv()
-
-ERP_URL = os.getenv("ERP_URL")
-API_KEY = os.getenv("ERP_API_KEY")
-API_SECRET = os.getenv("ERP_API_SECRET")
-TIMEOUT = int(os.getenv("ERP_TIMEOUT", 20))  # default 20s
+from config import (
+    ERP_URL,
+    ERP_API_KEY as API_KEY,
+    ERP_API_SECRET as API_SECRET,
+    ERP_TIMEOUT as TIMEOUT  # default 20s
+)
 
 HEADERS = {
     "Authorization": f"token {API_KEY}:{API_SECRET}",
@@ -22,51 +36,189 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+DEFAULT_LOCATION = "Modan"     # <-- your real machine location
+DEFAULT_PIPE_SIZE = "2\""      # <-- default size, adjust if needed
+ACTIVE_STATUSES = ["Not Started", "In Process"]
+FIELDS = '["name","status","custom_pipe_size","custom_location"]'
+
 # =====================================================
-# Fetch all work orders
+# Fetch one page of incomplete work orders
 # =====================================================
-def fetch_work_orders():
-    url = f"{ERP_URL}/api/resource/Work Order"
+def fetch_incomplete_page(session: requests.Session, after: Optional[str], page_size: int,
+                          statuses: List[str]) -> List[Dict]:
+    """
+    Work Orders missing a location or pipe size, ordered by name, after
+    `after`. Keyset paging: patched orders drop out of the filter, so an
+    offset would skip rows – a name cursor never does.
+    """
+    filters = [["status", "in", statuses]] if statuses else []
+    if after:
+        filters.append(["name", ">", after])
     params = {
-        "fields": '["name","custom_pipe_size","custom_location","custom_machine_id","status"]'
+        "fields": FIELDS,
+        "filters": json.dumps(filters),
+        "or_filters": json.dumps([["custom_location", "is", "not set"], ["custom_pipe_size", "is", "not set"]]),
+        "order_by": "name asc",
+        "limit_page_length": page_size,
     }
-    resp = requests.get(url, headers=HEADERS, params=params, timeout=TIMEOUT)
+    resp = session.get(f"{ERP_URL}/api/resource/Work Order", params=params, timeout=TIMEOUT)
     resp.raise_for_status()
-    return resp.json().get("data", [])
+    return resp.json().get("data", []) or []
+
+
+def missing_fields(wo: Dict, location: str, pipe_size: str) -> Dict:
+    updates = {}
+    if not wo.get("custom_location"):
+        updates["custom_location"] = location
+    if not wo.get("custom_pipe_size"):
+        updates["custom_pipe_size"] = pipe_size
+    return updates
 
 # =====================================================
 # Update a single work order
 # =====================================================
-def update_work_order(wo_name, updates: dict):
+def update_work_order(session: requests.Session, wo_name: str, updates: Dict, retries: int = 2):
     url = f"{ERP_URL}/api/resource/Work Order/{wo_name}"
-    resp = requests.put(url, json=updates, headers=HEADERS, timeout=TIMEOUT)
-    resp.raise_for_status()
-    print(f"✅ Updated {wo_name}: {updates}")
+    for attempt in range(retries + 1):
+        try:
+            resp = session.put(url, json=updates, timeout=TIMEOUT)
+            resp.raise_for_status()
+            return
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+# =====================================================
+# Progress (optional state file → resumable runs)
+# =====================================================
+class Progress:
+    def __init__(self, path: Optional[str], dry_run: bool):
+        self.path = path
+        self.dry_run = dry_run
+        self.cursor: Optional[str] = None
+        self.found = self.patched = self.failed = 0
+        self.failures: Dict[str, str] = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            self.cursor = state.get("cursor")
+            print(f"↩️ Resuming after {self.cursor}")
+
+    def save(self):
+        if self.path and not self.dry_run:
+            with open(self.path, "w") as f:
+                json.dump({"cursor": self.cursor, "patched": self.patched, "failed": self.failed,
+                           "failures": self.failures}, f, indent=2)
+
+    def record(self, wo_name: str, error: Optional[str]):
+        with self._lock:
+            if error:
+                self.failed += 1
+                self.failures[wo_name] = error
+            else:
+                self.patched += 1
+
+    def report(self, page: int):
+        rate = self.found / max(time.monotonic() - self.started, 1e-9)
+        verb = "would patch" if self.dry_run else "patched"
+        print(f"📄 Page {page}: {self.found} found, {verb} {self.patched}, failed {self.failed} "
+              f"({rate:,.0f} WO/s, cursor {self.cursor})")
 
 # =====================================================
 # Main script – fill missing fields
 # =====================================================
-def fix_missing_fields():
-    work_orders = fetch_work_orders()
-    for wo in work_orders:
-        updates = {}
+def fix_missing_fields(dry_run: bool = False, page_size: int = 200, concurrency: int = 8,
+                       statuses: Optional[List[str]] = None, location: str = DEFAULT_LOCATION,
+                       pipe_size: str = DEFAULT_PIPE_SIZE, state_path: Optional[str] = None,
+                       limit: int = 0) -> Progress:
+    progress = Progress(state_path, dry_run)
+    progress.load()
+    statuses = ACTIVE_STATUSES if statuses is None else statuses
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+    session.mount("https://", HTTPAdapter(pool_maxsize=concurrency))
+
+    def patch(wo_name: str, updates: Dict):
+        try:
+            update_work_order(session, wo_name, updates)
+            progress.record(wo_name, None)
+        except requests.RequestException as e:
+            progress.record(wo_name, str(e))
+            print(f"❌ {wo_name}: {e}", file=sys.stderr)
+
+    page, finished = 0, False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            rows = fetch_incomplete_page(session, progress.cursor, page_size, statuses)
+            if not rows:
+                finished = True
+                break
+            page += 1
+            if limit:
+                rows = rows[:limit - progress.found]
+            todo = [(wo["name"], missing_fields(wo, location, pipe_size)) for wo in rows]
+            todo = [(name, updates) for name, updates in todo if updates]
+            progress.found += len(todo)
+            if dry_run:
+                for name, updates in todo:
+                    print(f"🔎 {name}: {updates}")
+                progress.patched += len(todo)
+            else:
+                # At most `concurrency` PUTs in flight; the page finishes before the cursor moves
+                list(pool.map(lambda item: patch(*item), todo))
+            progress.cursor = rows[-1]["name"]
+            progress.save()
+            progress.report(page)
+            if limit and progress.found >= limit:
+                break
+            if len(rows) < page_size:
+                finished = True
+                break
+
+    if finished:
+        # Full pass done – the next run starts over and only sees what is still incomplete
+        progress.cursor = None
+        progress.save()
+    return progress
+
 
-        # Assign default location if missing
-        if not wo.get("custom_location"):
-            updates["custom_location"] = "Modan"  # <-- your real machine location
+def main():
+    parser = argparse.ArgumentParser(description="Fill missing location / pipe size on ERPNext Work Orders")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be patched, change nothing")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="PUTs in flight at once")
+    parser.add_argument("--status", action="append", dest="statuses",
+                        help=f"only these statuses (repeatable, default: {', '.join(ACTIVE_STATUSES)})")
+    parser.add_argument("--all-statuses", action="store_true", help="include Completed / Cancelled orders")
+    parser.add_argument("--location", default=DEFAULT_LOCATION)
+    parser.add_argument("--pipe-size", default=DEFAULT_PIPE_SIZE)
+    parser.add_argument("--state", metavar="PATH", help="save the cursor + failures here; rerun to resume")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many work orders (0 = all)")
+    args = parser.parse_args()
 
-        # Assign default pipe_size if missing
-        if not wo.get("custom_pipe_size"):
-            updates["custom_pipe_size"] = "2\""  # <-- default size, adjust if needed
+    if not ERP_URL or not API_KEY or not API_SECRET:
+        sys.exit("❌ ERPNext credentials missing")
 
-        # Optional: assign machine if not assigned
-        if not wo.get("custom_machine_id"):
-            updates["custom_machine_id"] = None  # Let auto-assign handle it
+    progress = fix_missing_fields(
+        dry_run=args.dry_run, page_size=args.page_size, concurrency=max(1, args.concurrency),
+        statuses=[] if args.all_statuses else args.statuses, location=args.location,
+        pipe_size=args.pipe_size, state_path=args.state, limit=args.limit,
+    )
+    if args.dry_run:
+        print(f"🔎 Dry run: {progress.found} work orders would be patched")
+    elif progress.failed:
+        print(f"⚠️ Patched {progress.patched}, {progress.failed} failed – rerun to retry them")
+        sys.exit(1)
+    else:
+        print(f"✅ Patched {progress.patched} work orders – auto-assign picks them up on the next sync")
 
-        # Push updates if needed
-        if updates:
-            update_work_order(wo["name"], updates)
 
 if __name__ == "__main__":
-    fix_missing_fields()
-    print("✅ All missing fields fixed! Now restart backend for auto-assign to work.")
+    main()
@@ -0,0 +1,226 @@
+# =====================================================
+# ingest.py – Batch Telemetry Ingest (real meter counters)
+# PLC gateways POST cumulative meter counters for many
+# machines at once; readings are deduplicated by a
+# per-machine sequence and applied in one transaction
+# (line_listener.py feeds the same path over TCP/UDP)
+# A machine's first reading hands its meter to the gateway;
+# it goes back to the simulated meter when the gateway has
+# been silent for GATEWAY_STALE_AFTER seconds while running,
+# or on POST /api/ingest/release
+# =====================================================
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from fastapi import APIRouter, Header
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from config import INGEST_TOKEN
+from database import write_session
+from metrics import INGEST_LAG, INGEST_READINGS
+from models import Machine
+from production import load_metadata, publish_production_logs, push_erp_status, record_production, stage_production_logs
+
+INGEST_MAX_READINGS = int(os.getenv("INGEST_MAX_READINGS", 10000))  # per request
+GATEWAY_STALE_AFTER = float(os.getenv("GATEWAY_STALE_AFTER", 300))  # seconds, 0 = never fall back
+
+router = APIRouter(prefix="/api/ingest", tags=["Telemetry Ingest"])
+
+
+# =====================================================
+# PAYLOAD
+# =====================================================
+class CounterReading(BaseModel):
+    machine_id: int
+    seq: int                          # strictly increasing per machine (e.g. gateway epoch ms)
+    counter: int                      # cumulative meters reported by the PLC
+    ts: Optional[datetime] = None     # when the PLC sampled it (default: arrival)
+
+
+class IngestBatch(BaseModel):
+    gateway: Optional[str] = None
+    readings: List[CounterReading]
+
+
+class GatewayRelease(BaseModel):
+    machine_ids: List[int]
+
+
+class Reading(NamedTuple):
+    """Allocation-light CounterReading for the socket listener (ts in epoch seconds)."""
+    machine_id: int
+    seq: int
+    counter: int
+    ts: Optional[float] = None
+
+
+def _aware(ts: Union[datetime, float, None], default: datetime) -> datetime:
+    if ts is None:
+        return default
+    if not isinstance(ts, datetime):
+        return datetime.fromtimestamp(ts, timezone.utc)
+    # Offsets (+03:00) are converted, not kept – rollups bucket on UTC epochs
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _epoch(ts: Union[datetime, float, None]) -> Optional[float]:
+    if ts is None or not isinstance(ts, datetime):
+        return ts
+    return _aware(ts, ts).timestamp()
+
+
+# =====================================================
+# APPLY
+# =====================================================
+def apply_readings(readings: Sequence[Union[CounterReading, Reading]]) -> Tuple[Dict, List[Dict], List[Tuple[str, str]]]:
+    """
+    Apply a batch in one write transaction.
+
+    Readings at or below the machine's stored sequence are duplicates
+    (gateway retries) or arrived too late; since the counter is
+    cumulative, the meters they carried are already in a later
+    reading, so dropping them loses nothing. A machine's first
+    reading only sets the baseline, and a counter that goes backwards
+    is taken as a PLC reset (the new value counts from zero).
+
+    Returns (summary, production log rows, ERP updates to push).
+    """
+    by_machine: Dict[int, List[CounterReading]] = {}
+    for r in readings:
+        by_machine.setdefault(r.machine_id, []).append(r)
+
+    summary = {"accepted": 0, "duplicates": 0, "meters": 0, "unknown_machines": []}
+    log_rows, erp_updates = [], []
+    now = datetime.now(timezone.utc)
+
+    with write_session() as db:
+        machines = {m.id: m for m in db.query(Machine).filter(Machine.id.in_(by_machine)).all()}
+        meta = load_metadata(db, (m.work_order for m in machines.values()))
+
+        for machine_id, batch in by_machine.items():
+            m = machines.get(machine_id)
+            if m is None:
+                summary["unknown_machines"].append(machine_id)
+                continue
+
+            meters, latest = 0, None
+            for r in sorted(batch, key=lambda r: r.seq):
+                if m.counter_seq is not None and r.seq <= m.counter_seq:
+                    summary["duplicates"] += 1
+                    continue
+                if m.counter_value is not None:
+                    meters += r.counter - m.counter_value if r.counter >= m.counter_value else r.counter
+                m.counter_seq, m.counter_value = r.seq, r.counter
+                summary["accepted"] += 1
+                latest = r
+            if latest is None:
+                continue
+
+            m.counter_source = "gateway"
+            m.last_tick_time = now
+            log_row, erp_update = record_production(m, meters, _aware(latest.ts, now), meta.get(m.work_order))
+            if log_row:
+                log_rows.append(log_row)
+                summary["meters"] += log_row["produced_qty"]
+            if erp_update:
+                erp_updates.append(erp_update)
+
+        stage_production_logs(db, log_rows)
+
+    return summary, log_rows, erp_updates
+
+
+# =====================================================
+# GATEWAY → SIMULATED FALLBACK
+# =====================================================
+def release_to_simulated(db: Session, *conditions) -> int:
+    """
+    Hand machines back to the simulated meter. The stored counter is
+    cleared, so a gateway that comes back only sets a new baseline and
+    never re-counts meters the simulator already produced.
+    """
+    result = db.execute(
+        update(Machine)
+        .where(Machine.counter_source == "gateway", *conditions)
+        .values(counter_source="simulated", counter_value=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def release_stale_gateways(db: Session, now: datetime) -> int:
+    """Meter tick: running machines whose gateway has gone quiet."""
+    if GATEWAY_STALE_AFTER <= 0:
+        return 0
+    released = release_to_simulated(
+        db, Machine.status == "running", Machine.last_tick_time < now - timedelta(seconds=GATEWAY_STALE_AFTER)
+    )
+    if released:
+        logging.warning(f"⚠️ {released} machine(s) silent for {GATEWAY_STALE_AFTER:.0f}s – back on the simulated meter")
+    return released
+
+
+async def ingest_readings(readings: Sequence[Union[CounterReading, Reading]], source: str) -> Dict:
+    """Apply, publish the log rows, record metrics and push completed work orders."""
+    # Off the event loop – the transaction may wait for the writer slot
+    summary, log_rows, erp_updates = await asyncio.to_thread(apply_readings, readings)
+    await publish_production_logs(log_rows)
+
+    sampled = sorted(t for t in (_epoch(r.ts) for r in readings) if t is not None)
+    if sampled:  # median – one bad gateway clock must not swamp the batch
+        INGEST_LAG.observe(max(0.0, datetime.now(timezone.utc).timestamp() - sampled[len(sampled) // 2]))
+    INGEST_READINGS.labels("accepted").inc(summary["accepted"])
+    INGEST_READINGS.labels("duplicate").inc(summary["duplicates"])
+    unknown_ids = set(summary["unknown_machines"])
+    unknown = sum(1 for r in readings if r.machine_id in unknown_ids)
+    if unknown:
+        INGEST_READINGS.labels("unknown_machine").inc(unknown)
+        logging.warning(f"⚠️ Ingest from {source}: unknown machines {summary['unknown_machines']}")
+
+    # Work orders completed by this batch
+    if erp_updates:
+        await asyncio.gather(*(asyncio.to_thread(push_erp_status, wo, status) for wo, status in erp_updates))
+    return summary
+
+
+# =====================================================
+# ENDPOINT
+# =====================================================
+@router.post("/batch")
+async def ingest_batch(batch: IngestBatch, x_ingest_token: Optional[str] = Header(None)):
+    """
+    Counter readings for many machines. Safe to retry: a failed or
+    timed-out batch can be sent again as-is.
+    """
+    if INGEST_TOKEN and x_ingest_token != INGEST_TOKEN:
+        return JSONResponse(status_code=401, content={"ok": False, "error": "Invalid ingest token"})
+    if len(batch.readings) > INGEST_MAX_READINGS:
+        return JSONResponse(
+            status_code=413,
+            content={"ok": False, "error": f"At most {INGEST_MAX_READINGS} readings per batch"}
+        )
+
+    source = batch.gateway or "unknown gateway"
+    try:
+        summary = await ingest_readings(batch.readings, source)
+    except Exception as e:
+        logging.error(f"INGEST ERROR ({source}): {e}")
+        return JSONResponse(status_code=503, content={"ok": False, "error": "Batch not applied, retry"})
+    return {"ok": True, **summary}
+
+
+@router.post("/release")
+def release_gateway(data: GatewayRelease, x_ingest_token: Optional[str] = Header(None)):
+    """Admin: put machines back on the simulated meter now (e.g. gateway removed)."""
+    if INGEST_TOKEN and x_ingest_token != INGEST_TOKEN:
+        return JSONResponse(status_code=401, content={"ok": False, "error": "Invalid ingest token"})
+    with write_session() as db:
+        released = release_to_simulated(db, Machine.id.in_(data.machine_ids)) if data.machine_ids else 0
+    return {"ok": True, "released": released}
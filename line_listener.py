@@ -0,0 +1,207 @@
+# =====================================================
+# line_listener.py – TCP/UDP Line-Protocol Listener
+# For gateways too old for HTTP: one reading per line
+#     <machine_id> <counter> [timestamp]
+# timestamp in epoch seconds or milliseconds (default:
+# arrival). Readings are buffered and applied in batches
+# through ingest.py – same dedupe / accounting path.
+# Enabled by LINE_TCP_PORT and/or LINE_UDP_PORT.
+# =====================================================
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import List, Optional, Set
+
+from ingest import Reading, ingest_readings
+from metrics import LINE_DROPPED, LINE_PARSE_ERRORS, LoopMonitor
+
+LINE_HOST = os.getenv("LINE_HOST", "0.0.0.0")
+LINE_TCP_PORT = int(os.getenv("LINE_TCP_PORT", 0))              # 0 → TCP off
+LINE_UDP_PORT = int(os.getenv("LINE_UDP_PORT", 0))              # 0 → UDP off
+LINE_FLUSH_INTERVAL = float(os.getenv("LINE_FLUSH_INTERVAL", 0.25))  # seconds
+LINE_BATCH_SIZE = int(os.getenv("LINE_BATCH_SIZE", 5000))       # flush early at this many
+LINE_BUFFER_MAX = int(os.getenv("LINE_BUFFER_MAX", 100000))     # then TCP pauses / UDP drops
+LINE_MAX_LENGTH = 256                                           # bytes, longer = garbage
+MAX_CLOCK_SKEW = 300                                            # seconds a timestamp may be ahead
+UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+
+LISTENER_ENABLED = bool(LINE_TCP_PORT or LINE_UDP_PORT)
+_MS_THRESHOLD = 1e11  # larger timestamps are milliseconds
+
+
+# =====================================================
+# BUFFER + FLUSHER
+# =====================================================
+class LineIngest:
+    """Parses lines into a shared buffer; one task flushes it in batches."""
+
+    def __init__(self, batch_size: int = LINE_BATCH_SIZE, buffer_max: int = LINE_BUFFER_MAX,
+                 flush_interval: float = LINE_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.buffer_max = buffer_max
+        self.flush_interval = flush_interval
+        self.buffer: List[Reading] = []
+        self.ready = asyncio.Event()
+        self.paused: Set[asyncio.Transport] = set()
+        self._errors = {t: LINE_PARSE_ERRORS.labels(t) for t in ("tcp", "udp")}
+
+    @property
+    def full(self) -> bool:
+        return len(self.buffer) >= self.buffer_max
+
+    def feed(self, lines: List[bytes], transport: str):
+        """
+        Parse straight from bytes (int()/float() accept them) – no decode,
+        one tuple per reading. seq is the sample time in microseconds.
+        """
+        now = time.time()
+        append = self.buffer.append
+        errors = 0
+        for line in lines:
+            parts = line.split()
+            n = len(parts)
+            if n == 0 or parts[0][:1] == b"#":
+                continue
+            try:
+                if n == 2:
+                    ts = now
+                elif n == 3:
+                    ts = float(parts[2])
+                    if ts > _MS_THRESHOLD:
+                        ts /= 1000
+                    if ts > now + MAX_CLOCK_SKEW:  # would pin the machine's seq in the future
+                        raise ValueError
+                else:
+                    raise ValueError
+                append(Reading(int(parts[0]), int(ts * 1_000_000), int(parts[1]), ts))
+            except ValueError:
+                errors += 1
+        if errors:
+            self._errors[transport].inc(errors)
+        if len(self.buffer) >= self.batch_size:
+            self.ready.set()
+
+    def parse_error(self, transport: str):
+        self._errors[transport].inc()
+
+    def pause(self, transport: asyncio.Transport):
+        """TCP backpressure: stop reading until the next flush drains the buffer."""
+        if transport not in self.paused and not transport.is_closing():
+            transport.pause_reading()
+            self.paused.add(transport)
+        self.ready.set()
+
+    def _resume(self):
+        for transport in self.paused:
+            if not transport.is_closing():
+                transport.resume_reading()
+        self.paused.clear()
+
+    async def run(self):
+        monitor = LoopMonitor("line_ingest_flush", self.flush_interval)
+        while True:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.ready.clear()
+            if not self.buffer:
+                continue
+
+            batch, self.buffer = self.buffer, []
+            monitor.begin()
+            try:
+                await ingest_readings(batch, "line protocol")
+            except Exception as e:
+                logging.error(f"LINE INGEST ERROR: {e}")
+                # Re-applying is safe (dedupe by seq) – keep the batch if there is room
+                if len(self.buffer) + len(batch) <= self.buffer_max:
+                    self.buffer[:0] = batch
+                else:
+                    LINE_DROPPED.labels("flush").inc(len(batch))
+            monitor.end()
+            self._resume()
+
+
+# =====================================================
+# PROTOCOLS
+# =====================================================
+class _TCPLineProtocol(asyncio.Protocol):
+    def __init__(self, ingest: LineIngest):
+        self.ingest = ingest
+        self.transport: Optional[asyncio.Transport] = None
+        self._tail = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        if self._tail:
+            data = self._tail + data
+        lines = data.split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > LINE_MAX_LENGTH:  # no newline in sight – not our protocol
+            self.ingest.parse_error("tcp")
+            self._tail = b""
+        self.ingest.feed(lines, "tcp")
+        if self.ingest.full:
+            self.ingest.pause(self.transport)
+
+    def eof_received(self):
+        if self._tail:
+            self.ingest.feed([self._tail], "tcp")
+            self._tail = b""
+        return False
+
+    def connection_lost(self, exc):
+        self.ingest.paused.discard(self.transport)
+
+
+class _UDPLineProtocol(asyncio.DatagramProtocol):
+    def __init__(self, ingest: LineIngest):
+        self.ingest = ingest
+
+    def datagram_received(self, data: bytes, addr):
+        if self.ingest.full:
+            LINE_DROPPED.labels("udp").inc(data.count(b"\n") + 1)
+            return
+        self.ingest.feed(data.split(b"\n"), "udp")
+
+
+# =====================================================
+# SERVE (background task, one per worker)
+# =====================================================
+async def serve(host: str = LINE_HOST, tcp_port: int = LINE_TCP_PORT, udp_port: int = LINE_UDP_PORT):
+    """
+    Bind the listeners and run the flusher until cancelled. With
+    SO_REUSEPORT every worker binds the same ports and the kernel
+    spreads gateway connections / datagrams across them.
+    """
+    loop = asyncio.get_running_loop()
+    ingest = LineIngest()
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    server = udp_transport = None
+
+    if tcp_port:
+        server = await loop.create_server(lambda: _TCPLineProtocol(ingest), host, tcp_port, reuse_port=reuse_port)
+        logging.info(f"📡 Line listener on tcp://{host}:{tcp_port}")
+    if udp_port:
+        udp_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPLineProtocol(ingest), local_addr=(host, udp_port), reuse_port=reuse_port
+        )
+        try:
+            udp_transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+        except OSError:
+            pass
+        logging.info(f"📡 Line listener on udp://{host}:{udp_port}")
+
+    try:
+        await ingest.run()
+    finally:
+        if server is not None:
+            server.close()
+        if udp_transport is not None:
+            udp_transport.close()
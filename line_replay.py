@@ -0,0 +1,157 @@
+# =====================================================
+# line_replay.py – Line-Protocol Test Client
+# Replays a recorded gateway stream against line_listener.py
+# (or generates a synthetic one) at a controlled rate
+# Usage: python line_replay.py generate --machines 200 --seconds 600 > stream.txt
+#        python line_replay.py replay stream.txt --port 9100 [--udp] [--rate 50000]
+#        python line_replay.py replay stream.txt --port 9100 --loop 10 --retime
+#        (--retime stamps lines with the send time – replays are not duplicates)
+# =====================================================
+
+import argparse
+import random
+import socket
+import sys
+import time
+from typing import Dict, List, Tuple
+
+UDP_DATAGRAM = 1400  # bytes – stays under a typical MTU
+
+Line = Tuple[int, int, float]  # machine_id, counter, timestamp (epoch seconds)
+
+
+# =====================================================
+# STREAMS
+# =====================================================
+def generate(machines: int, seconds: float, interval: float, seed: int) -> List[Line]:
+    """Every machine reports its counter every `interval` seconds."""
+    rng = random.Random(seed)
+    start = time.time() - seconds
+    counters = [rng.randint(0, 10000) for _ in range(machines)]
+    lines = []
+    steps = int(seconds / interval)
+    for step in range(steps):
+        ts = start + step * interval
+        for i in range(machines):
+            counters[i] += rng.randint(0, 3)
+            lines.append((i + 1, counters[i], ts + rng.uniform(0, interval / 2)))
+    return lines
+
+
+def load(path: str) -> List[Line]:
+    """Recorded stream; lines without a timestamp get one 1 ms apart."""
+    handle = sys.stdin if path == "-" else open(path)
+    lines, now, skipped = [], time.time(), 0
+    with handle:
+        for n, raw in enumerate(handle):
+            parts = raw.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            try:
+                ts = float(parts[2]) if len(parts) > 2 else now + n / 1000
+                lines.append((int(parts[0]), int(parts[1]), ts / 1000 if ts > 1e11 else ts))
+            except (ValueError, IndexError):
+                skipped += 1
+    if skipped:
+        print(f"⚠️ Skipped {skipped} malformed lines in {path}", file=sys.stderr)
+    return lines
+
+
+def passes(lines: List[Line], count: int, retime: bool):
+    """
+    Yield the stream `count` times. With retime, each line is stamped with
+    its send time (strictly increasing) and counters keep rising per machine
+    across passes – otherwise the listener drops repeats as duplicates.
+    """
+    first: Dict[int, int] = {}
+    last: Dict[int, int] = {}
+    for machine_id, counter, _ in lines:
+        first.setdefault(machine_id, counter)
+        last[machine_id] = counter
+
+    stamp = 0.0
+    for p in range(count):
+        if not retime:
+            yield from lines
+            continue
+        for machine_id, counter, _ in lines:
+            stamp = max(time.time(), stamp + 0.000001)
+            yield machine_id, counter + p * (last[machine_id] - first[machine_id]), stamp
+
+
+# =====================================================
+# SENDERS
+# =====================================================
+def replay(args) -> None:
+    lines = generate(args.machines, args.seconds, args.interval, args.seed) if args.generate else load(args.path)
+    if not lines:
+        sys.exit("❌ Empty stream")
+    total = len(lines) * args.loop
+
+    if args.udp:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda chunk: sock.sendto(chunk, (args.host, args.port))
+        chunk_limit = UDP_DATAGRAM
+    else:
+        sock = socket.create_connection((args.host, args.port))
+        send = sock.sendall
+        chunk_limit = 64 * 1024
+
+    sent = 0
+    started = time.perf_counter()
+    buf: List[bytes] = []
+    size = 0
+    try:
+        for machine_id, counter, ts in passes(lines, args.loop, args.retime):
+            line = f"{machine_id} {counter} {ts:.6f}\n".encode()
+            if size + len(line) > chunk_limit:
+                send(b"".join(buf))
+                buf, size = [], 0
+            buf.append(line)
+            size += len(line)
+            sent += 1
+            if args.rate and sent % 100 == 0:
+                ahead = sent / args.rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        if buf:
+            send(b"".join(buf))
+    finally:
+        sock.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"📤 {sent}/{total} lines over {'udp' if args.udp else 'tcp'} in {elapsed:.2f}s "
+          f"({sent / elapsed:,.0f} lines/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Line-protocol replay client for line_listener.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="write a synthetic stream to stdout")
+    rep = sub.add_parser("replay", help="send a stream to the listener")
+    rep.add_argument("path", nargs="?", default="-", help="recorded stream file ('-' = stdin)")
+    rep.add_argument("--generate", action="store_true", help="replay a synthetic stream instead of a file")
+    rep.add_argument("--host", default="127.0.0.1")
+    rep.add_argument("--port", type=int, default=9100)
+    rep.add_argument("--udp", action="store_true")
+    rep.add_argument("--rate", type=float, default=0, help="lines per second (0 = as fast as possible)")
+    rep.add_argument("--loop", type=int, default=1, help="send the stream this many times")
+    rep.add_argument("--retime", action="store_true", help="stamp lines with send time, keep counters rising across passes")
+    for p in (gen, rep):
+        p.add_argument("--machines", type=int, default=50)
+        p.add_argument("--seconds", type=float, default=300, help="stream duration")
+        p.add_argument("--interval", type=float, default=1.0, help="seconds between a machine's readings")
+        p.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        out = sys.stdout
+        for machine_id, counter, ts in generate(args.machines, args.seconds, args.interval, args.seed):
+            out.write(f"{machine_id} {counter} {ts:.6f}\n")
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# =====================================================
+# loadtest.py – WebSocket Fan-Out & REST Load Test
+# Starts mock ERPNext + main.py on a scratch SQLite DB,
+# then runs N dashboard clients and M simulated machines
+# Usage: python loadtest.py --clients 200 --machines 50 --duration 60
+#        python loadtest.py --transport sse --clients 2000 --location Kuwait
+#        python loadtest.py --url http://host:8000 --clients 100
+# =====================================================
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlsplit
+
+import requests
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ACTIONS = ["start", "start", "pause", "stop"]  # weighted towards running machines
+TS_PATTERN = re.compile(r'"ts":\s*([0-9.]+)')
+
+
+# =====================================================
+# STATS
+# =====================================================
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        "count": len(values),
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+        "max_ms": _ms(max(values) if values else None),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Results:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.dropped = 0
+        self.messages = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+        self.rest: Dict[str, List[float]] = {}
+        self.rest_errors: Dict[str, int] = {}
+        self.cpu: List[float] = []
+        self.rss_mb: List[float] = []
+        self.rss_before_mb: Optional[float] = None  # before any client connected
+
+
+# =====================================================
+# SERVER PROCESS RESOURCES (/proc – Linux only)
+# =====================================================
+def read_proc(pid: int):
+    """(cpu seconds, rss MB) for pid, or None when /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return cpu, rss_kb / 1024
+    except (OSError, StopIteration, ValueError):
+        return None
+
+
+async def sample_resources(pid: int, results: Results, stop: asyncio.Event):
+    prev = read_proc(pid)
+    prev_time = time.monotonic()
+    while not stop.is_set():
+        await asyncio.sleep(1)
+        cur = read_proc(pid)
+        now = time.monotonic()
+        if cur is None or prev is None:
+            return
+        results.cpu.append((cur[0] - prev[0]) / (now - prev_time) * 100)
+        results.rss_mb.append(cur[1])
+        prev, prev_time = cur, now
+
+
+# =====================================================
+# DASHBOARD CLIENTS
+# =====================================================
+async def dashboard_client(ws_url: str, encoding: str, results: Results, stop: asyncio.Event):
+    try:
+        ws = await websockets.connect(ws_url, max_size=None, open_timeout=30)
+    except Exception:
+        results.failed += 1
+        return
+    results.connected += 1
+    connected_at = time.time()
+    try:
+        await ws.send(json.dumps({"resume": 0, "epoch": None, "encoding": encoding}))
+        while not stop.is_set():
+            try:
+                text = await asyncio.wait_for(ws.recv(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            received = time.time()
+            results.messages += 1
+            results.bytes += len(text)
+            match = TS_PATTERN.search(text)  # cheaper than json.loads on every client
+            if match and float(match.group(1)) >= connected_at:  # replayed snapshots are not fan-out
+                results.latencies.append(max(0.0, received - float(match.group(1))))
+    except websockets.ConnectionClosed:
+        if not stop.is_set():
+            results.dropped += 1
+    finally:
+        await ws.close()
+
+
+async def sse_client(url: str, results: Results, stop: asyncio.Event):
+    """Plain HTTP/1.1 EventSource – no client library, so thousands fit in one process."""
+    parts = urlsplit(url)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port), 30)
+        writer.write(
+            f"GET {parts.path}?{parts.query} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode()
+        )
+        status = await asyncio.wait_for(reader.readline(), 30)
+    except Exception:
+        results.failed += 1
+        return
+    if b" 200 " not in status:
+        results.failed += 1
+        writer.close()
+        return
+    results.connected += 1
+    connected_at = time.time()
+    try:
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                if not stop.is_set():
+                    results.dropped += 1
+                return
+            if not line.startswith(b"data:"):
+                continue  # headers, chunk sizes, ids, keepalives
+            received = time.time()
+            results.messages += 1
+            results.bytes += len(line)
+            match = TS_PATTERN.search(line.decode(errors="replace"))
+            if match and float(match.group(1)) >= connected_at:
+                results.latencies.append(max(0.0, received - float(match.group(1))))
+    except (ConnectionError, OSError):
+        if not stop.is_set():
+            results.dropped += 1
+    finally:
+        writer.close()
+
+
+# =====================================================
+# MACHINE DRIVER (REST)
+# =====================================================
+def list_machines(base_url: str) -> List[Dict]:
+    data = requests.get(f"{base_url}/api/dashboard", timeout=30).json()
+    return [
+        {"location": loc["name"], "machine_id": str(m["id"])}
+        for loc in data["locations"] for m in loc["machines"] if m.get("job")
+    ]
+
+
+def post_action(session: requests.Session, base_url: str, action: str, machine: Dict) -> bool:
+    resp = session.post(f"{base_url}/api/machine/{action}", json=machine, timeout=30)
+    return resp.ok and resp.json().get("ok", False)
+
+
+async def drive_machines(base_url: str, rate: float, results: Results, stop: asyncio.Event):
+    machines = await asyncio.to_thread(list_machines, base_url)
+    if not machines:
+        print("⚠️ No machines with a work order – REST actions skipped")
+        return
+    session = requests.Session()
+    while not stop.is_set():
+        action = random.choice(ACTIONS)
+        started = time.perf_counter()
+        try:
+            ok = await asyncio.to_thread(post_action, session, base_url, action, random.choice(machines))
+        except requests.RequestException:
+            ok = False
+        results.rest.setdefault(action, []).append(time.perf_counter() - started)
+        if not ok:
+            results.rest_errors[action] = results.rest_errors.get(action, 0) + 1
+        await asyncio.sleep(1 / rate)
+
+
+# =====================================================
+# LOCAL STACK (mock ERPNext + main.py on a scratch DB)
+# =====================================================
+def seed_machines(database_url: str, machines: int, seconds_per_meter: float):
+    """Machine i gets mock work order MFG-WO-<i> (see mock_erpnext.seed_work_orders)."""
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, BASE_DIR)
+    from database import SessionLocal, engine, init_db
+    from models import Machine
+    from mock_erpnext import seed_work_orders
+
+    init_db()
+    db = SessionLocal()
+    try:
+        for i, wo in enumerate(seed_work_orders(machines, assign_machines=True), start=1):
+            db.add(Machine(
+                id=i,
+                name=f"LT{i}",
+                location=wo["custom_location"],
+                status="paused",
+                work_order=wo["name"],
+                erpnext_work_order_id=wo["name"],
+                pipe_size=wo["custom_pipe_size"],
+                target_qty=wo["qty"],
+                produced_qty=0,
+                seconds_per_meter=seconds_per_meter,
+                is_locked=True,
+            ))
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def wait_for(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_stack(args, workdir: str) -> List[subprocess.Popen]:
+    database_url = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    erp_url = f"http://127.0.0.1:{args.erp_port}"
+    seed_machines(database_url, args.machines, args.seconds_per_meter)
+
+    env = dict(os.environ, DATABASE_URL=database_url, ERP_URL=erp_url,
+               ERP_API_KEY="loadtest", ERP_API_SECRET="loadtest", CLUSTER_MODE="single")
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL} if not args.verbose else {}
+    erp = subprocess.Popen(
+        [sys.executable, "mock_erpnext.py", "--port", str(args.erp_port), "--work-orders", str(args.machines),
+         "--assign-machines"],
+        cwd=BASE_DIR, env=env, **quiet,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env, **quiet,
+    )
+    wait_for(f"{erp_url}/api/resource/Work Order")
+    wait_for(f"http://127.0.0.1:{args.port}/api/dashboard")
+    return [server, erp]
+
+
+# =====================================================
+# RUN + REPORT
+# =====================================================
+async def run(args, base_url: str, server_pid: Optional[int]) -> Results:
+    results = Results()
+    stop = asyncio.Event()
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/dashboard"
+    sse_url = base_url + "/api/stream/dashboard?location=" + quote(args.location or "")
+    if server_pid and read_proc(server_pid):
+        results.rss_before_mb = read_proc(server_pid)[1]
+
+    clients = []
+    for _ in range(args.clients):
+        if args.transport == "sse":
+            client = sse_client(sse_url, results, stop)
+        else:
+            client = dashboard_client(ws_url, args.encoding, results, stop)
+        clients.append(asyncio.create_task(client))
+        await asyncio.sleep(args.ramp / max(args.clients, 1))  # spread the connect storm
+    tasks = clients + [asyncio.create_task(drive_machines(base_url, args.action_rate, results, stop))]
+    if server_pid:
+        tasks.append(asyncio.create_task(sample_resources(server_pid, results, stop)))
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+def rss_per_client_kb(results: Results) -> Optional[float]:
+    """Server memory growth per connected client (peak RSS vs. before connecting)."""
+    if results.rss_before_mb is None or not results.rss_mb or not results.connected:
+        return None
+    return round((max(results.rss_mb) - results.rss_before_mb) * 1024 / results.connected, 1)
+
+
+def report(args, results: Results) -> Dict:
+    return {
+        "config": {
+            "clients": args.clients, "machines": args.machines, "duration": args.duration,
+            "seconds_per_meter": args.seconds_per_meter, "action_rate": args.action_rate,
+            "encoding": args.encoding, "transport": args.transport, "location": args.location,
+        },
+        "websocket" if args.transport == "ws" else "sse": {
+            "connected": results.connected,
+            "failed": results.failed,
+            "dropped": results.dropped,
+            "messages": results.messages,
+            "megabytes": round(results.bytes / 1e6, 2),
+            "broadcast_latency": summarize(results.latencies),
+        },
+        "rest": {
+            action: dict(summarize(values), errors=results.rest_errors.get(action, 0))
+            for action, values in results.rest.items()
+        },
+        "server": {
+            "cpu_avg_percent": round(sum(results.cpu) / len(results.cpu), 1) if results.cpu else None,
+            "cpu_max_percent": round(max(results.cpu), 1) if results.cpu else None,
+            "rss_peak_mb": round(max(results.rss_mb), 1) if results.rss_mb else None,
+            "rss_per_client_kb": rss_per_client_kb(results),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard WebSocket + REST load test")
+    parser.add_argument("--clients", type=int, default=100, help="simulated dashboard clients")
+    parser.add_argument("--transport", choices=["ws", "sse"], default="ws",
+                        help="WebSocket or read-only Server-Sent Events clients")
+    parser.add_argument("--location", help="SSE clients subscribe to this location only")
+    parser.add_argument("--machines", type=int, default=20, help="simulated machines (local stack only)")
+    parser.add_argument("--seconds-per-meter", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of steady load")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds to connect all clients")
+    parser.add_argument("--action-rate", type=float, default=5, help="start/pause/stop calls per second")
+    parser.add_argument("--encoding", choices=["json", "compact"], default="json")
+    parser.add_argument("--url", help="target an already running server instead of a local stack")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--erp-port", type=int, default=8766)
+    parser.add_argument("--json", metavar="PATH", help="also write the report to PATH")
+    parser.add_argument("--verbose", action="store_true", help="show server output")
+    args = parser.parse_args()
+
+    if websockets is None and args.transport == "ws":
+        sys.exit("❌ loadtest.py needs the 'websockets' package (pip install websockets)")
+
+    procs: List[subprocess.Popen] = []
+    workdir = None
+    try:
+        if args.url:
+            base_url, server_pid = args.url.rstrip("/"), None
+        else:
+            workdir = tempfile.mkdtemp(prefix="loadtest-")
+            procs = start_stack(args, workdir)
+            base_url, server_pid = f"http://127.0.0.1:{args.port}", procs[0].pid
+
+        print(f"🚦 {args.clients} clients → {base_url} for {args.duration:.0f}s")
+        results = asyncio.run(run(args, base_url, server_pid))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = report(args, results)
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
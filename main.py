@@ -3,59 +3,158 @@
 # Updates: ERPNext safe sync + Scheduler + Auto Meter + Alerts + Admin ERP Orders
 # =====================================================
 
+import time
+_BOOT_STARTED = time.perf_counter()  # cold start reference point
+
 import os
 import asyncio
+import json
 import logging
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Header, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
 # =====================================================
-# Load environment variables
+# Environment variables (.env loaded once in config.py)
 # =====================================================
-load_dotenv()
-ERP_URL = os.getenv("ERP_URL")
-ERP_API_KEY = os.getenv("ERP_API_KEY")
-ERP_API_SECRET = os.getenv("ERP_API_SECRET")
-DATABASE_URL = os.getenv("DATABASE_URL")
+from config import ERP_URL, ERP_API_KEY, ERP_API_SECRET, DATABASE_URL
 
 # =====================================================
 # Import project modules
 # =====================================================
-from database import engine, SessionLocal, init_db
+from database import engine, SessionLocal, init_db, seed_default_machines, write_session
 from models import Machine, ProductionLog, ERPNextMetadata
 from erpnext_sync import (
     update_work_order_status, 
-    get_work_orders, 
     auto_assign_work_orders, 
-    get_admin_work_orders
+    work_order_snapshot
 )
+from state_versions import dashboard_version
+from report_cache import etag_matches
 from report import router as report_router
 from scheduler import start_scheduler  # Scheduler with WebSocket manager
+from meter_engine import MeterTickEngine
+from cluster import CLUSTER_MODE, IdTail, LeaderElection, ReplayLog, create_pubsub
+from static_assets import FRONTEND_FILES, AssetCache
+from wire_format import ENCODINGS, SCHEMA, dumps
+from sse import SSEClient, SSEHub, parse_event_id
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, GaugeFunc, LoopMonitor,
+    WS_FANOUT, WS_PAYLOAD, render as render_metrics
+)
+from production import (
+    apply_machine_status, push_erp_status, record_production, load_metadata,
+    stage_production_logs, publish_production_logs, log_feed_wakeup
+)
+from ingest import release_stale_gateways, router as ingest_router
+from line_listener import LISTENER_ENABLED, serve as serve_line_listener
 
 # =====================================================
 # Logging
 # =====================================================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("production_system.log"),
-        logging.StreamHandler()
-    ]
-)
+LOG_FILE = "production_system.log"
+
+def configure_logging():
+    """Called from lifespan – importing main (tests, scripts) opens no log file."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
+
+# =====================================================
+# Startup Phases (lifespan) – nothing heavy runs at import
+# =====================================================
+startup_timings: dict[str, float] = {}  # phase -> milliseconds
+background_tasks: list[asyncio.Task] = []
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = (time.perf_counter() - started) * 1000
+        logging.info(f"⏱ Startup phase '{name}' took {startup_timings[name]:.1f} ms")
+
+def warm_caches():
+    # Opens the pool's first connection and pulls the hot tables into the page cache
+    db = SessionLocal()
+    try:
+        get_dashboard_data(db)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_phase("logging"):
+        configure_logging()
+    with startup_phase("schema"):
+        await asyncio.to_thread(init_db)
+    with startup_phase("seed"):
+        await asyncio.to_thread(seed_default_machines)
+    with startup_phase("assets"):
+        await asyncio.to_thread(asset_cache.load, FRONTEND_DIR, FRONTEND_ONLY)
+    with startup_phase("warmup"):
+        await asyncio.to_thread(warm_caches)
+    with startup_phase("background_loops"):
+        await pubsub.start()
+        start_background_loops()
+    startup_timings["total"] = (time.perf_counter() - _BOOT_STARTED) * 1000
+    logging.info(f"✅ Startup complete in {startup_timings['total']:.1f} ms since import")
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await pubsub.stop()
 
 # =====================================================
 # FastAPI App
 # =====================================================
-app = FastAPI(title="Taco Group Live Production")
+app = FastAPI(title="Taco Group Live Production", lifespan=lifespan)
+
+class FirstRequestTimer:
+    """
+    Plain ASGI middleware (not @app.middleware): streaming responses such
+    as the SSE dashboard pass straight through instead of being relayed
+    frame by frame through an extra task and memory stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "first_request" in startup_timings:
+            return await self.app(scope, receive, send)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start" and "first_request" not in startup_timings:
+                startup_timings["first_request"] = (time.perf_counter() - _BOOT_STARTED) * 1000
+                logging.info(f"🚀 Cold start → first request served in {startup_timings['first_request']:.1f} ms")
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+app.add_middleware(FirstRequestTimer)
+
+@app.get("/api/startup_timings")
+def get_startup_timings():
+    return {"timings_ms": startup_timings}
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://127.0.0.1:8000").split(",")
 
@@ -67,13 +166,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Large JSON responses (dashboard, reports, work orders) – static assets are precompressed
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1024))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
 app.include_router(report_router)
+app.include_router(ingest_router)
 
 # =====================================================
-# Database setup
+# Database session dependency
 # =====================================================
-init_db()
-
 def get_db():
     db = SessionLocal()
     try:
@@ -85,53 +187,171 @@ def get_db():
 # Frontend folder
 # =====================================================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FRONTEND_DIR = os.path.join(BASE_DIR, "..", "Frontend")
-app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", os.path.join(BASE_DIR, "..", "Frontend"))
+FRONTEND_ONLY = None  # every file in a dedicated frontend folder
+if not os.path.exists(os.path.join(FRONTEND_DIR, "index.html")) and os.path.exists(os.path.join(BASE_DIR, "index.html")):
+    # Assets shipped next to main.py – the app folder also holds .env and the DB,
+    # so only the known frontend files are served and nothing is mounted
+    FRONTEND_DIR, FRONTEND_ONLY = BASE_DIR, FRONTEND_FILES
+
+# Loaded into memory during the startup "assets" phase
+asset_cache = AssetCache()
 
 @app.get("/")
-async def get_dashboard():
-    html_path = os.path.join(FRONTEND_DIR, "index.html")
-    if not os.path.exists(html_path):
+async def get_dashboard(request: Request):
+    if asset_cache.index is None:
         return HTMLResponse("<h1>Dashboard HTML not found!</h1>", status_code=404)
-    with open(html_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+    return asset_cache.serve_index(request)
+
+@app.get("/static/{name}")
+async def get_static_asset(name: str, request: Request):
+    return asset_cache.serve(name, request)
+
+# Anything deeper than /static/<file> still comes from disk (dedicated frontend folder only)
+if FRONTEND_ONLY is None:
+    app.mount("/static", StaticFiles(directory=FRONTEND_DIR, check_dir=False), name="static")
 
 # =====================================================
 # WebSocket Manager
 # =====================================================
+# broadcast() publishes to the shared channel; every worker's relay
+# delivers to its own sockets via send_local() and keeps a replay log
+# so reconnecting clients resume from their last sequence
+DASHBOARD_CHANNEL = "dashboard"
+RESUME_WAIT = 5  # seconds to wait for the client's resume frame
+pubsub = create_pubsub()
+replay_log = ReplayLog()
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: list[WebSocket] = []
+        self.encodings: dict[WebSocket, str] = {}  # negotiated wire format per socket
 
     async def connect(self, ws: WebSocket):
         await ws.accept()
+        await resume_stream(ws)
+        # No await between the last replay check and registering – nothing slips through
         self.active_connections.append(ws)
 
     def disconnect(self, ws: WebSocket):
         if ws in self.active_connections:
             self.active_connections.remove(ws)
+        self.encodings.pop(ws, None)
 
     async def broadcast(self, data: dict):
+        # ts = publish time, lets clients / loadtest.py measure fan-out latency
+        await pubsub.publish(DASHBOARD_CHANNEL, dict(data, ts=round(time.time(), 3)))
+
+    async def send_local(self, data: dict):
+        started = time.perf_counter()
         dead_connections = []
+        frames = {}  # serialized once per encoding, not once per socket
         for ws in self.active_connections:
+            encoding = self.encodings.get(ws, "json")
+            if encoding not in frames:
+                frames[encoding] = dumps(data, encoding)
+                WS_PAYLOAD.labels(encoding).observe(len(frames[encoding]))
             try:
-                await asyncio.wait_for(ws.send_json(data), timeout=2)
+                await asyncio.wait_for(ws.send_text(frames[encoding]), timeout=2)
             except Exception:
                 dead_connections.append(ws)
 
         for ws in dead_connections:
             self.disconnect(ws)
+        WS_FANOUT.observe(time.perf_counter() - started)
 manager = ConnectionManager()
+GaugeFunc("ws_clients", "Dashboard WebSocket clients on this worker", lambda: len(manager.active_connections))
+sse_hub = SSEHub()
+GaugeFunc("sse_clients", "Dashboard SSE streams on this worker", lambda: len(sse_hub.clients))
+GaugeFunc("sse_queued_bytes", "Frames waiting in SSE stream queues", sse_hub.queued_bytes)
+GaugeFunc("sse_overflows_total", "SSE streams closed for falling behind", lambda: sse_hub.overflows, "counter")
+
+async def relay_broadcasts():
+    queue = pubsub.subscribe(DASHBOARD_CHANNEL)
+    try:
+        while True:
+            seq, data = await queue.get()
+            message = dict(data, seq=seq)
+            replay_log.append(seq, message)
+            sse_hub.send_local(pubsub.epoch, seq, message)
+            await manager.send_local(message)
+    finally:
+        pubsub.unsubscribe(DASHBOARD_CHANNEL, queue)
+
+def is_snapshot(data: dict) -> bool:
+    return "locations" in data
+
+def collapse_snapshots(messages: list) -> list:
+    """Only the newest dashboard snapshot matters; keep every other event."""
+    newest = max((i for i, (_, d) in enumerate(messages) if is_snapshot(d)), default=-1)
+    return [m for i, m in enumerate(messages) if i == newest or not is_snapshot(m[1])]
+
+async def resume_stream(ws: WebSocket):
+    """
+    Client opens with {"resume": <last seq>, "epoch": <epoch>, "encoding": ...}.
+    Send what it missed from the replay log, or the latest snapshot when it
+    is too far behind, and return once it is caught up with the live stream.
+    """
+    try:
+        hello = json.loads(await asyncio.wait_for(ws.receive_text(), RESUME_WAIT))
+    except (asyncio.TimeoutError, ValueError):
+        hello = {}  # old client ("ready") or silent one – treat as fresh
+    if not isinstance(hello, dict):
+        hello = {}
+
+    last = hello.get("resume")
+    missed = None
+    if hello.get("epoch") == pubsub.epoch and isinstance(last, int):
+        missed = replay_log.since(last)
+    resumed = missed is not None
+
+    encoding = hello.get("encoding") if hello.get("encoding") in ENCODINGS else "json"
+    manager.encodings[ws] = encoding
+    ack = {"type": "hello", "epoch": pubsub.epoch, "resumed": resumed, "encoding": encoding}
+    if encoding == "compact":
+        ack["schema"] = SCHEMA
+    await ws.send_json(ack)
+    if not resumed:
+        snapshot = replay_log.latest(is_snapshot)
+        missed = [snapshot] if snapshot else []
+
+    while missed:
+        for seq, data in collapse_snapshots(missed):
+            await ws.send_text(dumps(data, encoding))
+            last = seq
+        missed = replay_log.since(last)  # anything published while we were sending
 
 @app.websocket("/ws/dashboard")
 async def ws_dashboard(ws: WebSocket):
-    await manager.connect(ws)
     try:
+        await manager.connect(ws)
         while True:
             await ws.receive_text()
     except WebSocketDisconnect:
         manager.disconnect(ws)
 
+@app.get("/api/stream/dashboard")
+async def stream_dashboard(location: str | None = None, last_event_id: str | None = Header(None)):
+    """
+    Read-only dashboard over Server-Sent Events. EventSource resends
+    Last-Event-ID on reconnect: the missed events come from the replay
+    log, or the latest snapshot when it no longer covers them.
+    """
+    epoch, last = parse_event_id(last_event_id)
+    missed = replay_log.since(last) if epoch == pubsub.epoch and last is not None else None
+    if missed is None:
+        snapshot = replay_log.latest(is_snapshot)
+        missed = [snapshot] if snapshot else []
+    client = SSEClient(location)
+    # No await between reading the replay log and registering – nothing slips through
+    backlog = sse_hub.frames_for(pubsub.epoch, collapse_snapshots(missed), location)
+    sse_hub.register(client)
+    return StreamingResponse(
+        sse_hub.stream(client, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # =====================================================
 # Dashboard Helpers
 # =====================================================
@@ -185,16 +405,42 @@ def get_dashboard_data(db: Session):
 # =====================================================
 # API Endpoints
 # =====================================================
+def conditional_json(etag: str, if_none_match: str | None, build):
+    """304 when the client already has `etag`, else build() as JSON with the ETag."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+def dashboard_payload() -> dict:
+    db = SessionLocal()
+    try:
+        return {"locations": get_dashboard_data(db)}
+    finally:
+        db.close()
+
 @app.get("/api/dashboard")
-def dashboard(db: Session = Depends(get_db)):
-    return {"locations": get_dashboard_data(db)}
+def dashboard(if_none_match: str = Header(None)):
+    # Version is read before the data – a write in between only costs one extra 200.
+    # It is cached in process, so a 304 never opens a session
+    etag = f'W/"dashboard-{dashboard_version.current()}"'
+    return conditional_json(etag, if_none_match, dashboard_payload)
+
+def snapshot_etag(prefix: str, snapshot) -> str:
+    # Stale flag is part of the tag – pollers see an outage start and end
+    return f'W/"{prefix}-{snapshot.version}{"-stale" if snapshot.stale else ""}"'
+
+def erp_freshness(snapshot) -> dict:
+    return {"stale": snapshot.stale, "age_seconds": round(snapshot.age, 1) if snapshot.age is not None else None}
 
 @app.get("/api/job_queue")
-def job_queue():
-    try:
-        work_orders = get_work_orders()
-    except Exception:
-        work_orders = []
+def job_queue(if_none_match: str = Header(None)):
+    # Never waits on ERPNext once a snapshot exists (stale-while-revalidate)
+    snapshot = work_order_snapshot.get()
+    return conditional_json(snapshot_etag("queue", snapshot), if_none_match,
+                            lambda: dict(build_job_queue(snapshot.work_orders), **erp_freshness(snapshot)))
+
+def build_job_queue(work_orders: list) -> dict:
     queue = [({
         "id": wo.get("name"),
         "pipe_size": wo.get("custom_pipe_size"),
@@ -209,11 +455,14 @@ def job_queue():
 # Admin-Only ERP Orders Endpoint
 # =====================================================
 @app.get("/api/admin/work_orders")
-def admin_work_orders():
-    try:
-        work_orders = get_admin_work_orders()
-    except Exception:
-        work_orders = []
+def admin_work_orders(if_none_match: str = Header(None)):
+    snapshot = work_order_snapshot.get()
+    return conditional_json(snapshot_etag("admin-wo", snapshot), if_none_match,
+                            lambda: dict(build_admin_work_orders(snapshot.work_orders), **erp_freshness(snapshot)))
+
+def build_admin_work_orders(work_orders: list) -> dict:
+    # Same filter as get_admin_work_orders(), applied to the snapshot
+    work_orders = [wo for wo in work_orders if wo.get("status") != "Completed"]
     return {"work_orders": [{
         "id": wo.get("name"),
         "status": wo.get("status"),
@@ -234,48 +483,12 @@ class MachineAction(BaseModel):
 class MachineRename(MachineAction):
     new_name: str
 
-# =====================================================
-async def update_machine_status(db: Session, m: Machine, new_status: str):
-    m.status = new_status
-
-    try:
-        if new_status == "running":
-            m.is_locked = True
-            m.last_tick_time = datetime.now(timezone.utc)
-
-            # Safe ERP update
-            if (
-                ERP_URL 
-                and ERP_API_KEY 
-                and ERP_API_SECRET 
-                and m.erpnext_work_order_id
-            ):
-                update_work_order_status(
-                    m.erpnext_work_order_id, 
-                    "In Process"
-                )
-
-        elif new_status == "completed":
-            m.is_locked = False
-
-            # Safe ERP update
-            if (
-                ERP_URL 
-                and ERP_API_KEY 
-                and ERP_API_SECRET 
-                and m.erpnext_work_order_id
-            ):
-                update_work_order_status(
-                    m.erpnext_work_order_id, 
-                    "Completed"
-                )
-
-    except Exception as e:
-        logging.error(f"ERPNext status update failed: {e}")
+class MachineBatchAction(MachineAction):
+    action: str  # start | pause | stop
 
-    db.commit()
+class MachineBatch(BaseModel):
+    actions: list[MachineBatchAction]
 
-# =====================================================
 # =====================================================
 # Helper – Get Machine by location and ID
 # =====================================================
@@ -286,119 +499,193 @@ def get_machine(db: Session, location: str, machine_id: str) -> Machine | None:
         Machine.location == location
     ).first()
 
+def set_machine_status(data: MachineAction, new_status: str, need_work_order: bool = False) -> Machine | None:
+    """One write transaction; the ERP push runs after the commit, outside the writer slot."""
+    with write_session() as db:
+        m = get_machine(db, data.location, data.machine_id)
+        if not m or (need_work_order and not m.work_order):
+            return None
+        erp_status = apply_machine_status(m, new_status)
+        erp_work_order_id = m.erpnext_work_order_id
+    if erp_status:
+        push_erp_status(erp_work_order_id, erp_status)
+    return m
+
 # =====================================================
 # API – Machine Controls (Updated)
 # =====================================================
+# Plain def – FastAPI runs these in its threadpool, so the write queue
+# wait and the ERP push never block the event loop
 @app.post("/api/machine/start")
-async def start_machine(data: MachineAction, db: Session = Depends(get_db)):
-    m = get_machine(db, data.location, data.machine_id)
-    if not m or not m.work_order:
+def start_machine(data: MachineAction):
+    m = set_machine_status(data, "running", need_work_order=True)
+    if not m:
         return {"ok": False, "error": "Machine not found or no active work order"}
-    await update_machine_status(db, m, "running")
     return {"ok": True, "machine": {"id": m.id, "status": m.status}}
 
 @app.post("/api/machine/pause")
-async def pause_machine(data: MachineAction, db: Session = Depends(get_db)):
-    m = get_machine(db, data.location, data.machine_id)
+def pause_machine(data: MachineAction):
+    m = set_machine_status(data, "paused")
     if not m:
         return {"ok": False, "error": "Machine not found"}
-    m.status = "paused"
-    db.commit()
     return {"ok": True, "machine": {"id": m.id, "status": m.status}}
 
 @app.post("/api/machine/stop")
-async def stop_machine(data: MachineAction, db: Session = Depends(get_db)):
-    m = get_machine(db, data.location, data.machine_id)
+def stop_machine(data: MachineAction):
+    m = set_machine_status(data, "stopped")
     if not m:
         return {"ok": False, "error": "Machine not found"}
-    await update_machine_status(db, m, "stopped")
     return {"ok": True, "machine": {"id": m.id, "status": m.status}}
 
 @app.post("/api/machine/rename")
-async def rename_machine(data: MachineRename, db: Session = Depends(get_db)):
-    m = get_machine(db, data.location, data.machine_id)
-    if not m:
-        return {"ok": False, "error": "Machine not found"}
-    old_name = m.name
-    m.name = data.new_name
-    db.commit()
+def rename_machine(data: MachineRename):
+    with write_session() as db:
+        m = get_machine(db, data.location, data.machine_id)
+        if not m:
+            return {"ok": False, "error": "Machine not found"}
+        old_name = m.name
+        m.name = data.new_name
     return {
         "ok": True,
         "machine": {"id": m.id, "old_name": old_name, "new_name": m.name}
     }
+
 # =====================================================
-# Automatic Meter Counter
-# =====================================================
-from datetime import datetime, timezone
+# API – Batch Machine Controls (shift change)
+# =====================================================
+BATCH_STATUSES = {"start": "running", "pause": "paused", "stop": "stopped"}
+MACHINE_BATCH_MAX = int(os.getenv("MACHINE_BATCH_MAX", 500))  # actions per request
+
+def validate_batch(actions: list[MachineBatchAction], machines: dict[int, Machine]) -> list[dict]:
+    """Same rules as the single endpoints; one error per rejected action."""
+    errors, seen = [], set()
+    for i, a in enumerate(actions):
+        m = machines.get(int(a.machine_id)) if a.machine_id.isdigit() else None
+        if a.action not in BATCH_STATUSES:
+            error = f"Unknown action '{a.action}'"
+        elif m is None or m.location != a.location:
+            error = "Machine not found"
+        elif m.id in seen:
+            error = "Machine appears more than once"
+        elif a.action == "start" and not m.work_order:
+            error = "Machine not found or no active work order"
+        else:
+            seen.add(m.id)
+            continue
+        errors.append({"index": i, "machine_id": a.machine_id, "error": error})
+    return errors
+
+def apply_machine_batch(actions: list[MachineBatchAction]):
+    """
+    All-or-nothing: one query loads every machine, one transaction applies
+    every action. Returns (errors, changed machines, ERP updates to push).
+    """
+    ids = {int(a.machine_id) for a in actions if a.machine_id.isdigit()}
+    with write_session() as db:
+        machines = {m.id: m for m in db.query(Machine).filter(Machine.id.in_(ids)).all()} if ids else {}
+        errors = validate_batch(actions, machines)
+        if errors:
+            return errors, [], []
+        changed, erp_updates = [], []
+        for a in actions:
+            m = machines[int(a.machine_id)]
+            erp_status = apply_machine_status(m, BATCH_STATUSES[a.action])
+            changed.append({"id": m.id, "location": m.location, "status": m.status})
+            if erp_status:
+                erp_updates.append((m.erpnext_work_order_id, erp_status))
+    return [], changed, erp_updates
+
+@app.post("/api/machine/batch")
+async def machine_batch(batch: MachineBatch):
+    if len(batch.actions) > MACHINE_BATCH_MAX:
+        return JSONResponse(
+            status_code=413,
+            content={"ok": False, "error": f"At most {MACHINE_BATCH_MAX} actions per batch"}
+        )
+    # Off the event loop – the transaction may wait for the writer slot
+    errors, changed, erp_updates = await asyncio.to_thread(apply_machine_batch, batch.actions)
+    if errors:
+        return {"ok": False, "errors": errors}
+
+    # One delta for every dashboard instead of a snapshot per machine
+    if changed:
+        await manager.broadcast({"machines": changed})
+    # ERP is told only after the local state is committed, all pushes at once
+    if erp_updates:
+        await asyncio.gather(*(asyncio.to_thread(push_erp_status, wo, status) for wo, status in erp_updates))
+    return {"ok": True, "machines": changed}
+# =====================================================
+# Automatic Meter Counter (monotonic, drift-free)
+# =====================================================
+meter_engine = MeterTickEngine()
+
+def apply_meter_tick(now_mono: float):
+    """One meter tick in one transaction. Returns (log rows, ERP updates to push)."""
+    erp_updates = []
+    log_rows = []
+    with write_session() as db:
+        now = datetime.now(timezone.utc)  # wall clock only for persisted timestamps
+        release_stale_gateways(db, now)
+        # Machines fed by a real counter (ingest.py) are not simulated
+        machines = db.query(Machine).filter(
+            Machine.status == "running", Machine.counter_source != "gateway"
+        ).all()
+        meter_engine.retain_only({m.id for m in machines})
+        meta = None
+
+        for m in machines:
+            if not m.seconds_per_meter or not m.work_order:
+                meter_engine.forget(m.id)
+                continue
+
+            ticks = meter_engine.advance(m.id, m.seconds_per_meter, m.last_tick_time, now_mono)
+            if ticks <= 0 or m.produced_qty >= m.target_qty:
+                continue  # nothing to write – the carry lives in meter_engine
+            m.last_tick_time = now
+
+            if meta is None:  # one metadata query, only on ticks that produce
+                meta = load_metadata(db, (r.work_order for r in machines))
+            log_row, erp_update = record_production(m, ticks, now, meta.get(m.work_order))
+            log_rows.append(log_row)
+            if m.status == "completed":
+                meter_engine.forget(m.id)
+            if erp_update:
+                erp_updates.append(erp_update)
+
+        stage_production_logs(db, log_rows)
+    meter_engine.commit()  # only now – a rolled-back tick is re-counted next time
+    return log_rows, erp_updates
+
+async def meter_tick(now_mono: float):
+    try:
+        # Off the event loop – the transaction may wait for the writer slot
+        log_rows, erp_updates = await asyncio.to_thread(apply_meter_tick, now_mono)
+        await publish_production_logs(log_rows)
+    except Exception as e:
+        meter_engine.rollback()
+        logging.error(f"AUTO METER ERROR: {e}")
+        return
+
+    # After the commit and outside the write queue, all pushes at once
+    if erp_updates:
+        await asyncio.gather(*(asyncio.to_thread(push_erp_status, wo, status) for wo, status in erp_updates))
 
 async def automatic_meter_counter():
-    while True:
-        await asyncio.sleep(0.1)
-        db = SessionLocal()
-        try:
-            machines = db.query(Machine).filter(Machine.status == "running").all()
-            now = datetime.now(timezone.utc)  # always UTC-aware
+    await meter_engine.run(meter_tick)
 
-            for m in machines:
-                if not m.seconds_per_meter or not m.work_order:
-                    continue
+@app.get("/api/meter/tick_stats")
+def meter_tick_stats():
+    return {"interval": meter_engine.interval, **meter_engine.stats.as_dict()}
 
-                # Ensure last_tick_time is set and timezone-aware
-                if m.last_tick_time:
-                    last_tick = m.last_tick_time
-                    if last_tick.tzinfo is None:
-                        last_tick = last_tick.replace(tzinfo=timezone.utc)
-                else:
-                    m.last_tick_time = now
-                    continue
+GaugeFunc("meter_ticks_total", "Meter ticks run", lambda: meter_engine.stats.ticks, kind="counter")
+GaugeFunc("meter_ticks_skipped_total", "Meter ticks skipped after lagging", lambda: meter_engine.stats.skipped, kind="counter")
 
-                # Calculate elapsed ticks
-                diff = (now - last_tick).total_seconds()
-                ticks = int(diff // m.seconds_per_meter)
-
-                if ticks > 0 and m.produced_qty < m.target_qty:
-                    increment = min(ticks, m.target_qty - m.produced_qty)
-                    m.produced_qty += increment
-                    m.last_tick_time = now  # always UTC-aware
-
-                    # Safe values for ProductionLog
-                    location_value = m.location or "Unknown"
-                    remaining_qty = m.target_qty - m.produced_qty
-                    status_value = "running"
-
-                    # Insert production log
-                    db.add(ProductionLog(
-                        machine_id=m.id,
-                        location=location_value,
-                        work_order=m.work_order,
-                        pipe_size=m.pipe_size,
-                        produced_qty=increment,
-                        remaining_qty=remaining_qty,
-                        status=status_value,
-                        timestamp=now
-                    ))
-
-                    # Update ERPNext metadata if exists
-                    meta = db.query(ERPNextMetadata).filter(
-                        ERPNextMetadata.work_order == m.work_order
-                    ).first()
-                    if meta:
-                        meta.erp_status = "In Progress"
-                        meta.last_synced = now
-
-                    # Mark machine as completed if target reached
-                    if m.produced_qty >= m.target_qty:
-                        m.produced_qty = m.target_qty
-                        await update_machine_status(db, m, "completed")
-
-            db.commit()
-        except Exception as e:
-            logging.error(f"AUTO METER ERROR: {e}")
-            db.rollback()
-        finally:
-            db.close()
-
-        await asyncio.sleep(1)
+# =====================================================
+# Prometheus Metrics
+# =====================================================
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 
 # =====================================================
@@ -407,8 +694,10 @@ async def automatic_meter_counter():
 alert_history = {}
 
 async def production_alerts():
+    monitor = LoopMonitor("production_alerts", 5.1)
     while True:
         await asyncio.sleep(0.1)
+        monitor.begin()
         db = SessionLocal()
         try:
             machines = db.query(Machine).filter(Machine.target_qty > 0).all()
@@ -437,6 +726,7 @@ async def production_alerts():
             logging.error(f"ALERT LOOP ERROR: {e}")
         finally:
             db.close()
+        monitor.end()
         await asyncio.sleep(5)
 
 # =====================================================
@@ -444,30 +734,33 @@ async def production_alerts():
 # =====================================================
 async def erpnext_sync_loop(interval: int = 10):
     logging.info("🚀 ERPNext Sync Loop started")
+    monitor = LoopMonitor("erpnext_sync", interval + 0.1)
     while True:
         await asyncio.sleep(0.1)
 
+        monitor.begin()
         try:
             # Safe call: ERP offline will not break loop
             await asyncio.to_thread(auto_assign_work_orders)
         except Exception as e:
             logging.error(f"ERP Sync Loop error: {e}")
+        monitor.end()
         await asyncio.sleep(interval)
 
 # =====================================================
 # Broadcast Dashboard + ERP Queue (Safe)
 # =====================================================
 async def broadcast_dashboard_and_erpnext():
+    monitor = LoopMonitor("broadcast_dashboard", 5.1)
     while True:
         await asyncio.sleep(0.1)
 
+        monitor.begin()
         db = SessionLocal()
         try:
             locations = get_dashboard_data(db)
-            try:
-                work_orders = get_work_orders()
-            except Exception:
-                work_orders = []
+            snapshot = await asyncio.to_thread(work_order_snapshot.get)  # only the first fetch blocks
+            work_orders = snapshot.work_orders
             erp_queue = [{
                 "id": wo.get("name"),
                 "status": wo.get("status"),
@@ -480,43 +773,144 @@ async def broadcast_dashboard_and_erpnext():
 
             await manager.broadcast({
                 "locations": locations,
-                "work_orders": erp_queue
+                "work_orders": erp_queue,
+                "erp": erp_freshness(snapshot)
             })
         except Exception as e:
             logging.error(f"BROADCAST ERROR: {e}")
         finally:
             db.close()
+        monitor.end()
         await asyncio.sleep(5)
 
 # =====================================================
-# Startup Event
+# Background Loops (started from the lifespan startup phase)
 # =====================================================
-@app.on_event("startup")
-async def startup_event():
-    asyncio.create_task(automatic_meter_counter(), name="AutomaticMeterCounter")
-    asyncio.create_task(production_alerts(), name="ProductionAlerts")
-    asyncio.create_task(erpnext_sync_loop(), name="ERPNextSyncLoop")
-    asyncio.create_task(broadcast_dashboard_and_erpnext(), name="BroadcastDashboard")
-    
+leader_election = LeaderElection()
+if CLUSTER_MODE == "multi":
+    # Only the leader polls ERPNext; the other workers read its snapshot from the DB
+    work_order_snapshot.owner = lambda: leader_election.is_leader
+
+def start_singleton_loops() -> list[asyncio.Task]:
+    """Loops that must run exactly once across all workers."""
+    tasks = [
+        asyncio.create_task(automatic_meter_counter(), name="AutomaticMeterCounter"),
+        asyncio.create_task(production_alerts(), name="ProductionAlerts"),
+        asyncio.create_task(erpnext_sync_loop(), name="ERPNextSyncLoop"),
+        asyncio.create_task(broadcast_dashboard_and_erpnext(), name="BroadcastDashboard"),
+        asyncio.create_task(production_log_feed(), name="ProductionLogFeed"),
+    ]
+
     # Start scheduler with WebSocket manager
-    start_scheduler(manager)
+    tasks.extend(start_scheduler(manager))
+    return tasks
+
+@app.get("/api/cluster")
+def cluster_status():
+    return {
+        "mode": CLUSTER_MODE,
+        "instance": leader_election.holder,
+        "is_leader": leader_election.is_leader if CLUSTER_MODE == "multi" else True
+    }
+
+def start_background_loops():
+    # Every worker relays published state to its own WebSocket clients
+    background_tasks.append(asyncio.create_task(relay_broadcasts(), name="BroadcastRelay"))
+    # Every worker folds its own commits into the shared dashboard version
+    background_tasks.append(asyncio.create_task(dashboard_version.flush_loop(), name="StateVersionFlush"))
+
+    # PLC gateway line protocol – every worker binds the port (SO_REUSEPORT)
+    if LISTENER_ENABLED:
+        background_tasks.append(asyncio.create_task(serve_line_listener(), name="LineListener"))
+
+    if CLUSTER_MODE == "multi":
+        # Only the lease holder runs the singleton loops
+        background_tasks.append(
+            asyncio.create_task(leader_election.run(start_singleton_loops), name="LeaderElection")
+        )
+    else:
+        background_tasks.extend(start_singleton_loops())
+
 # =====================================================
 # Production Logs API (FIXED)
 # =====================================================
+PRODUCTION_LOG_PAGE = 200
+PRODUCTION_LOG_CATCHUP_MAX = 1000
+
+def serialize_log(log: ProductionLog) -> dict:
+    return {
+        "id": log.id,
+        "machine_id": log.machine_id,
+        "work_order": log.work_order,
+        "pipe_size": log.pipe_size,
+        "produced_qty": log.produced_qty,
+        "timestamp": log.timestamp.isoformat() if log.timestamp else None
+    }
+
+def logs_after(db: Session, since_id: int, limit: int) -> list[ProductionLog]:
+    """Newest `limit` rows written after since_id, oldest first (PK range scan)."""
+    # After a long disconnect the client wants the latest rows, not the oldest gap
+    logs = db.query(ProductionLog).filter(
+        ProductionLog.id > since_id
+    ).order_by(ProductionLog.id.desc()).limit(limit).all()
+    logs.reverse()
+    return logs
+
 @app.get("/api/production_logs")
-def production_logs(db: Session = Depends(get_db)):
+def production_logs(
+    since_id: int | None = Query(None, ge=0),
+    limit: int = Query(PRODUCTION_LOG_PAGE, ge=1, le=PRODUCTION_LOG_CATCHUP_MAX),
+    db: Session = Depends(get_db)
+):
+    # Cursor mode – catch-up after a reconnect
+    if since_id is not None:
+        return [serialize_log(log) for log in logs_after(db, since_id, limit)]
+
     logs = db.query(ProductionLog).order_by(
         ProductionLog.timestamp.desc()
-    ).limit(200).all()
-
-    return [
-        {
-            "id": log.id,
-            "machine_id": log.machine_id,
-            "work_order": log.work_order,
-            "pipe_size": log.pipe_size,
-            "produced_qty": log.produced_qty,
-            "timestamp": log.timestamp.isoformat() if log.timestamp else None
-        }
-        for log in logs
-    ]
+    ).limit(min(limit, PRODUCTION_LOG_PAGE)).all()
+
+    return [serialize_log(log) for log in logs]
+
+# =====================================================
+# Production Log Feed – pushes new rows over the WebSocket
+# =====================================================
+LOG_FEED_INTERVAL = 1.0  # seconds, fallback poll for writers on other workers
+
+def _latest_log_id() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.max(ProductionLog.id)).scalar() or 0
+    finally:
+        db.close()
+
+def _fetch_new_logs(floor: int) -> list[dict]:
+    """Rows above floor, oldest first – the feed pages through bursts in order."""
+    db = SessionLocal()
+    try:
+        logs = db.query(ProductionLog).filter(
+            ProductionLog.id > floor
+        ).order_by(ProductionLog.id).limit(PRODUCTION_LOG_CATCHUP_MAX).all()
+        return [serialize_log(log) for log in logs]
+    finally:
+        db.close()
+
+async def production_log_feed():
+    # Overlap window + dedupe: on PostgreSQL ids can commit out of order
+    tail = IdTail(await asyncio.to_thread(_latest_log_id))
+    monitor = LoopMonitor("production_log_feed", LOG_FEED_INTERVAL)
+    while True:
+        try:
+            await asyncio.wait_for(log_feed_wakeup.wait(), timeout=LOG_FEED_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        log_feed_wakeup.clear()
+
+        monitor.begin()
+        try:
+            rows = tail.fresh(await asyncio.to_thread(_fetch_new_logs, tail.floor), lambda r: r["id"])
+            if rows:
+                await manager.broadcast({"production_logs": rows})
+        except Exception as e:
+            logging.error(f"LOG FEED ERROR: {e}")
+        monitor.end()
@@ -0,0 +1,138 @@
+# =====================================================
+# meter_engine.py – Drift-Free Meter Tick Engine
+# Monotonic clock + fractional carry + absolute deadlines
+# =====================================================
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import LOOP_DURATION, LOOP_LAG, METER_TICK_LAG
+
+METER_TICK_INTERVAL = float(os.getenv("METER_TICK_INTERVAL", 0.5))  # seconds
+
+
+# =====================================================
+# TICK LAG STATS (exposed as metric)
+# =====================================================
+class TickStats:
+    """Running per-tick lag figures for the meter loop."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.skipped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    def record(self, lag: float):
+        self.ticks += 1
+        self.last_lag = lag
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+    def as_dict(self) -> Dict:
+        return {
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+            "avg_lag_seconds": self.total_lag / self.ticks if self.ticks else 0.0,
+        }
+
+
+# =====================================================
+# METER TICK ENGINE
+# =====================================================
+class MeterTickEngine:
+    """
+    Tracks meter progress per machine on the monotonic clock.
+    Fractional meters are carried forward between ticks instead of
+    being discarded, so nothing is lost at any line speed.
+    advance() and forget() only stage changes – commit() once the tick's
+    transaction committed, rollback() if it failed, so meters from a
+    rolled-back tick are counted again on the next one.
+    """
+
+    def __init__(self, interval: float = METER_TICK_INTERVAL):
+        self.interval = interval
+        self.stats = TickStats()
+        self._last_seen: Dict[int, float] = {}   # machine_id -> monotonic time
+        self._carry: Dict[int, float] = {}       # machine_id -> fractional meters
+        self._pending: Dict[int, Optional[Tuple[float, float]]] = {}  # staged (last_seen, carry), None = forget
+
+    def advance(self, machine_id: int, seconds_per_meter: float,
+                last_tick_time: Optional[datetime], now_mono: float) -> int:
+        """Return the whole meters produced since the previous call."""
+        last = self._last_seen.get(machine_id)
+        if last is None:
+            # First sight (startup or resume) – catch up from the persisted wall-clock tick
+            elapsed = 0.0
+            if last_tick_time:
+                if last_tick_time.tzinfo is None:
+                    last_tick_time = last_tick_time.replace(tzinfo=timezone.utc)
+                elapsed = max(0.0, (datetime.now(timezone.utc) - last_tick_time).total_seconds())
+        else:
+            elapsed = now_mono - last
+
+        progress = self._carry.get(machine_id, 0.0) + elapsed / seconds_per_meter
+        meters = int(progress)
+        self._pending[machine_id] = (now_mono, progress - meters)
+        return meters
+
+    def commit(self):
+        """The tick's transaction committed – keep the staged positions."""
+        for machine_id, staged in self._pending.items():
+            if staged is None:
+                self._last_seen.pop(machine_id, None)
+                self._carry.pop(machine_id, None)
+            else:
+                self._last_seen[machine_id], self._carry[machine_id] = staged
+        self._pending.clear()
+
+    def rollback(self):
+        """The tick's transaction failed – the next tick starts from the old positions."""
+        self._pending.clear()
+
+    def forget(self, machine_id: int):
+        """Drop state for a machine that stopped running (on commit)."""
+        self._pending[machine_id] = None
+
+    def retain_only(self, machine_ids):
+        for machine_id in list(self._last_seen):
+            if machine_id not in machine_ids:
+                self.forget(machine_id)
+
+    async def run(self, step: Callable[[float], Awaitable[None]]):
+        """
+        Call step(now_mono) once per interval against absolute deadlines.
+        Time spent inside step does not push later ticks back.
+        """
+        step_duration = LOOP_DURATION.labels("meter_tick")
+        step_lag = LOOP_LAG.labels("meter_tick")
+        deadline = time.monotonic()
+        while True:
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now_mono = time.monotonic()
+            lag = now_mono - deadline
+            self.stats.record(lag)
+            METER_TICK_LAG.observe(lag)
+            step_lag.set(lag)
+
+            # Fell behind by whole periods – skip them, progress is time-based anyway
+            if lag >= self.interval:
+                missed = int(lag // self.interval)
+                self.stats.skipped += missed
+                deadline += missed * self.interval
+                logging.warning(f"⏱ Meter tick lagging {lag:.3f}s, skipped {missed} tick(s)")
+
+            await step(now_mono)
+            step_duration.observe(time.monotonic() - now_mono)
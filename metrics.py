@@ -0,0 +1,281 @@
+# =====================================================
+# metrics.py – Prometheus Text Exposition (no dependency)
+# Counters / gauges / histograms cheap enough to leave on:
+# one dict lookup + lock per update, rendering only on scrape
+# =====================================================
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REGISTRY: List["_Metric"] = []
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# =====================================================
+# METRIC TYPES
+# =====================================================
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: threading.Lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(c.value)}"
+                for k, c in list(self._children.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class GaugeFunc(_Metric):
+    """Gauge read from a callback at scrape time (no hot-path cost)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, help)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        try:
+            return [f"{self.name} {_fmt_value(self.fn())}"]
+        except Exception:
+            return []
+
+
+class _Buckets:
+    __slots__ = ("counts", "sum", "count", "_bounds", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: threading.Lock):
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value: float):
+        i = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _Buckets(self.buckets, self._lock)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_fmt_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(child.sum)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# =====================================================
+# INSTRUMENTS
+# =====================================================
+LOOP_DURATION = Histogram("loop_iteration_seconds", "Background loop iteration duration", ("loop",))
+LOOP_LAG = Gauge("loop_lag_seconds", "How late the last loop iteration started", ("loop",))
+
+ERP_REQUEST = Histogram("erp_request_seconds", "ERPNext request latency", ("endpoint",))
+ERP_ERRORS = Counter("erp_request_errors_total", "ERPNext requests that failed", ("endpoint",))
+ERP_REJECTED = Counter("erp_circuit_rejected_total", "ERPNext calls refused while the circuit was open", ("endpoint",))
+
+DB_QUERY = Histogram("db_query_seconds", "SQL statement execution time", ("statement",))
+DB_COMMIT = Histogram("db_commit_seconds", "Session flush + commit time")
+
+WS_FANOUT = Histogram("ws_broadcast_fanout_seconds", "Time to send one broadcast to all local sockets")
+WS_PAYLOAD = Histogram("ws_payload_bytes", "Serialized broadcast frame size", ("encoding",), SIZE_BUCKETS)
+
+METER_TICK_LAG = Histogram("meter_tick_lag_seconds", "Meter tick start delay behind its deadline")
+REPORT_CACHE = Counter("report_cache_total", "Report cache lookups (hit / miss / not_modified)", ("result",))
+PRODUCTION_LOG_ROWS = Counter("production_log_rows_total", "ProductionLog rows written")
+INGEST_READINGS = Counter("ingest_readings_total", "Gateway counter readings by outcome", ("result",))
+INGEST_LAG = Histogram("ingest_lag_seconds", "Median reading sample time to commit, per applied batch")
+LINE_PARSE_ERRORS = Counter("ingest_line_parse_errors_total", "Malformed line-protocol readings", ("transport",))
+LINE_DROPPED = Counter("ingest_line_dropped_total", "Line readings dropped while the buffer was full", ("transport",))
+
+
+# =====================================================
+# HELPERS
+# =====================================================
+class LoopMonitor:
+    """begin()/end() around one iteration; lag = start vs previous end + interval."""
+
+    def __init__(self, name: str, interval: float):
+        self.interval = interval
+        self._duration = LOOP_DURATION.labels(name)
+        self._lag = LOOP_LAG.labels(name)
+        self._started = 0.0
+        self._next_due: Optional[float] = None
+
+    def begin(self):
+        self._started = time.perf_counter()
+        if self._next_due is not None:
+            self._lag.set(max(0.0, self._started - self._next_due))
+
+    def end(self):
+        ended = time.perf_counter()
+        self._duration.observe(ended - self._started)
+        self._next_due = ended + self.interval
+
+
+class erp_call:
+    """with erp_call("work_order_list"): ... – latency, and errors on exception."""
+
+    __slots__ = ("endpoint", "_started")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ERP_REQUEST.labels(self.endpoint).observe(time.perf_counter() - self._started)
+        if exc_type is not None:
+            ERP_ERRORS.labels(self.endpoint).inc()
+        return False
+
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+_sessions_instrumented = False
+
+
+def instrument_database(engine: Engine):
+    """Time every cursor execute on engine and every Session commit."""
+    global _sessions_instrumented
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip()[:6].upper()
+        DB_QUERY.labels(verb if verb in _STATEMENTS else "OTHER").observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    if _sessions_instrumented:
+        return
+    _sessions_instrumented = True
+
+    @event.listens_for(Session, "before_commit")
+    def _before_commit(session):
+        session.info["commit_started"] = time.perf_counter()
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("commit_started", None)
+        if started is not None:
+            DB_COMMIT.observe(time.perf_counter() - started)
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop("commit_started", None)
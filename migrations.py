@@ -0,0 +1,227 @@
+# =====================================================
+# migrations.py – Versioned Schema Migrations
+# Alembic-style ordered steps tracked in schema_migrations
+# Usage: python migrations.py [upgrade|current|history]
+# =====================================================
+
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+)
+from sqlalchemy.engine import Connection
+
+from database import engine, IS_POSTGRES, _in_write_txn
+from models import Base
+from rollups import backfill_rollups
+from oee import open_initial_intervals
+from state_versions import seed_state_versions
+
+# =====================================================
+# VERSION TABLE
+# =====================================================
+_version_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _version_meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+PG_MIGRATION_LOCK_ID = 72400431  # pg_advisory_lock key
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    transactional: bool = True  # False → runs in autocommit (e.g. CONCURRENTLY)
+
+
+# =====================================================
+# HELPERS (idempotent – safe on partially migrated DBs)
+# =====================================================
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, server_default: str = None):
+    """ALTER TABLE ADD COLUMN using the type declared in models.py."""
+    if _has_column(conn, table, column):
+        return
+    col = Base.metadata.tables[table].c[column]
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column} {col.type.compile(dialect=conn.dialect)}"
+    if server_default is not None:
+        ddl += f" {'NOT NULL ' if not col.nullable else ''}DEFAULT {server_default}"
+    conn.execute(text(ddl))
+
+
+def _create_index(conn: Connection, index):
+    """CREATE INDEX IF NOT EXISTS; CONCURRENTLY on PostgreSQL so writers keep going."""
+    cols = ", ".join(c.name for c in index.columns)
+    unique = "UNIQUE " if index.unique else ""
+    concurrently = "CONCURRENTLY " if IS_POSTGRES else ""
+    conn.execute(text(
+        f"CREATE {unique}INDEX {concurrently}IF NOT EXISTS {index.name} "
+        f"ON {index.table.name} ({cols})"
+    ))
+
+
+# =====================================================
+# MIGRATION STEPS
+# =====================================================
+def _m0001_baseline(conn: Connection):
+    # Fresh databases get every table; existing ones keep theirs untouched
+    Base.metadata.create_all(bind=conn, checkfirst=True)
+
+
+def _m0002_machine_is_locked(conn: Connection):
+    _add_column(conn, "machines", "is_locked", server_default="FALSE")
+
+
+def _m0003_scheduled_job_timestamp(conn: Connection):
+    _add_column(conn, "scheduled_jobs", "timestamp")
+
+
+def _m0004_performance_indexes(conn: Connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            _create_index(conn, index)
+
+
+def _m0005_cluster_tables(conn: Connection):
+    for name in ("leader_leases", "pubsub_messages"):
+        Base.metadata.tables[name].create(bind=conn, checkfirst=True)
+
+
+def _m0006_machine_counter_source(conn: Connection):
+    _add_column(conn, "machines", "counter_source", server_default="'simulated'")
+    _add_column(conn, "machines", "counter_seq")
+    _add_column(conn, "machines", "counter_value")
+
+
+def _m0007_production_rollups(conn: Connection):
+    Base.metadata.tables["production_rollups"].create(bind=conn, checkfirst=True)  # + its index
+    backfill_rollups(conn)
+
+
+def _m0008_production_log_machine_timestamp(conn: Connection):
+    _create_index(conn, next(
+        i for i in Base.metadata.tables["production_logs"].indexes
+        if i.name == "idx_production_log_machine_timestamp"
+    ))
+
+
+def _m0009_oee_tables(conn: Connection):
+    for name in ("machine_state_intervals", "shift_stats"):
+        Base.metadata.tables[name].create(bind=conn, checkfirst=True)
+    open_initial_intervals(conn)
+
+
+def _m0010_state_versions(conn: Connection):
+    Base.metadata.tables["state_versions"].create(bind=conn, checkfirst=True)
+    seed_state_versions(conn)
+
+
+def _m0011_erp_snapshots(conn: Connection):
+    Base.metadata.tables["erp_snapshots"].create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _m0001_baseline),
+    Migration(2, "machine_is_locked", _m0002_machine_is_locked),
+    Migration(3, "scheduled_job_timestamp", _m0003_scheduled_job_timestamp),
+    Migration(4, "performance_indexes", _m0004_performance_indexes, transactional=not IS_POSTGRES),
+    Migration(5, "cluster_tables", _m0005_cluster_tables),
+    Migration(6, "machine_counter_source", _m0006_machine_counter_source),
+    Migration(7, "production_rollups", _m0007_production_rollups),
+    Migration(8, "production_log_machine_timestamp", _m0008_production_log_machine_timestamp,
+              transactional=not IS_POSTGRES),
+    Migration(9, "oee_tables", _m0009_oee_tables),
+    Migration(10, "state_versions", _m0010_state_versions),
+    Migration(11, "erp_snapshots", _m0011_erp_snapshots),
+]
+
+
+# =====================================================
+# RUNNER
+# =====================================================
+def _applied_versions(conn: Connection) -> set:
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def _record(conn: Connection, m: Migration):
+    conn.execute(schema_migrations.insert().values(
+        version=m.version, name=m.name, applied_at=datetime.now(timezone.utc)
+    ))
+
+
+def _run_step(m: Migration):
+    if m.transactional:
+        token = _in_write_txn.set(True)  # BEGIN IMMEDIATE on SQLite
+        try:
+            with engine.begin() as conn:
+                if m.version in _applied_versions(conn):
+                    return False  # another worker got here first
+                m.apply(conn)
+                _record(conn, m)
+        finally:
+            _in_write_txn.reset(token)
+    else:
+        with engine.connect() as conn:
+            m.apply(conn.execution_options(isolation_level="AUTOCOMMIT"))
+        with engine.begin() as conn:
+            if m.version in _applied_versions(conn):
+                return False
+            _record(conn, m)
+    return True
+
+
+def upgrade():
+    """Apply all pending migrations in order."""
+    _version_meta.create_all(bind=engine, checkfirst=True)
+
+    lock_conn = None
+    if IS_POSTGRES:
+        # One migrator across workers/nodes
+        lock_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": PG_MIGRATION_LOCK_ID})
+
+    try:
+        with engine.connect() as conn:
+            applied = _applied_versions(conn)
+        for m in MIGRATIONS:
+            if m.version in applied:
+                continue
+            if _run_step(m):
+                logging.info(f"🗄 Migration {m.version:04d}_{m.name} applied")
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": PG_MIGRATION_LOCK_ID})
+            lock_conn.close()
+
+
+def current_version() -> int:
+    _version_meta.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return max(_applied_versions(conn), default=0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if cmd == "upgrade":
+        upgrade()
+        print(f"✅ Schema at version {current_version()}")
+    elif cmd == "current":
+        print(current_version())
+    elif cmd == "history":
+        head = current_version()
+        for m in MIGRATIONS:
+            print(f"{'✔' if m.version <= head else ' '} {m.version:04d}_{m.name}")
+    else:
+        print("Usage: python migrations.py [upgrade|current|history]")
+        sys.exit(1)
@@ -0,0 +1,288 @@
+# =====================================================
+# mock_erpnext.py – Offline ERPNext Stand-In
+# In-memory Work Orders behind the Frappe REST API the
+# dashboard calls: list (fields / filters / paging /
+# order_by), get, put – with injectable latency & errors
+# Usage: python mock_erpnext.py [--port 8001] [--work-orders 500]
+#        [--latency-ms 50 --jitter-ms 20 --error-rate 0.02 --seed 7]
+# =====================================================
+
+import argparse
+import asyncio
+import json
+import operator
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LOCATIONS = ["Modan", "Baldeya", "Al-Khraj"]
+PIPE_SIZES = ['2"', "110mm", "160mm", "250mm"]
+STATUSES = ["Not Started"] * 5 + ["In Process"] * 3 + ["Completed"] * 2 + ["Stopped"]
+DEFAULT_PAGE_LENGTH = 20            # Frappe default when limit_page_length is omitted
+BASE_MODIFIED = datetime(2026, 1, 1)
+_COMPARE = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le}
+
+app = FastAPI(title="Mock ERPNext")
+WORK_ORDERS: Dict[str, Dict] = {}
+
+
+class MockSettings:
+    """Knobs for latency / failure injection (also settable at runtime)."""
+
+    def __init__(self):
+        self.latency_ms = 0.0
+        self.jitter_ms = 0.0
+        self.error_rate = 0.0
+        self.api_key: Optional[str] = None  # None → accept any Authorization
+        self.api_secret: Optional[str] = None
+        self.rng = random.Random(0)
+        self.requests = 0
+        self.injected_errors = 0
+
+    def configure(self, seed: Optional[int] = None, **knobs):
+        for key, value in knobs.items():
+            if value is not None and hasattr(self, key):
+                setattr(self, key, value)
+        if seed is not None:
+            self.rng = random.Random(seed)
+
+    def as_dict(self) -> Dict:
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "error_rate": self.error_rate,
+            "work_orders": len(WORK_ORDERS),
+            "requests": self.requests,
+            "injected_errors": self.injected_errors,
+        }
+
+
+settings = MockSettings()
+
+
+# =====================================================
+# DATASET
+# =====================================================
+def _modified(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def seed_work_orders(count: int, assign_machines: bool = False,
+                     missing_every: int = 0, seed: int = 0) -> List[Dict]:
+    """
+    Deterministic dataset. With assign_machines, work order i is
+    "Not Started" on machine id i; otherwise statuses are mixed and
+    custom_machine_id is unset. missing_every=n blanks the location /
+    pipe size on every n-th order (exercises fix_missing_fields).
+    """
+    rng = random.Random(seed)
+    WORK_ORDERS.clear()
+    for i in range(1, count + 1):
+        name = f"MFG-WO-{i:05d}"
+        qty = 1000 + (i % 5) * 250
+        status = "Not Started" if assign_machines else rng.choice(STATUSES)
+        missing = missing_every and i % missing_every == 0
+        WORK_ORDERS[name] = {
+            "name": name,
+            "doctype": "Work Order",
+            "docstatus": 1,
+            "production_item": f"PIPE-{PIPE_SIZES[i % len(PIPE_SIZES)]}",
+            "status": status,
+            "qty": qty,
+            "produced_qty": qty if status == "Completed" else (rng.randint(0, qty // 2) if status != "Not Started" else 0),
+            "custom_machine_id": i if assign_machines else None,
+            "custom_pipe_size": None if missing else PIPE_SIZES[i % len(PIPE_SIZES)],
+            "custom_location": None if missing else LOCATIONS[i % len(LOCATIONS)],
+            "creation": _modified(BASE_MODIFIED + timedelta(minutes=i)),
+            "modified": _modified(BASE_MODIFIED + timedelta(minutes=i)),
+        }
+    return list(WORK_ORDERS.values())
+
+
+# =====================================================
+# FRAPPE QUERY SEMANTICS (filters / fields / order_by)
+# =====================================================
+def _like(pattern: str) -> re.Pattern:
+    return re.compile("^" + ".*".join(re.escape(p) for p in str(pattern).split("%")) + "$", re.IGNORECASE)
+
+
+def _match(value: Any, op: str, target: Any) -> bool:
+    op = op.lower()
+    if op == "=":
+        return value == target or str(value) == str(target)
+    if op == "!=":
+        return not _match(value, "=", target)
+    if op == "in":
+        targets = target if isinstance(target, list) else str(target).split(",")
+        return any(_match(value, "=", t) for t in targets)
+    if op == "not in":
+        return not _match(value, "in", target)
+    if op == "like":
+        return value is not None and bool(_like(target).match(str(value)))
+    if op == "not like":
+        return not _match(value, "like", target)
+    if op == "is":
+        is_set = value not in (None, "")
+        return is_set if target == "set" else not is_set
+    if op == "between":
+        return value is not None and target[0] <= value <= target[1]
+    if op not in _COMPARE:
+        raise ValueError(f"Unsupported operator {op}")
+    return value is not None and _COMPARE[op](value, type(value)(target))
+
+
+def _parse_filters(raw: Optional[str]) -> List[tuple]:
+    """[[field, op, value]], [[doctype, field, op, value]] or {field: value | [op, value]}."""
+    if not raw:
+        return []
+    parsed = json.loads(raw)
+    if isinstance(parsed, dict):
+        return [
+            (field, cond[0], cond[1]) if isinstance(cond, list) else (field, "=", cond)
+            for field, cond in parsed.items()
+        ]
+    return [tuple(f[-3:]) for f in parsed]
+
+
+def _order(rows: List[Dict], order_by: str) -> List[Dict]:
+    for clause in reversed([c.strip() for c in order_by.split(",") if c.strip()]):
+        field, _, direction = clause.replace("`", "").partition(" ")
+        field = field.split(".")[-1]
+        rows.sort(key=lambda r: (r.get(field) is None, r.get(field) if r.get(field) is not None else 0),
+                  reverse=direction.strip().lower() == "desc")
+    return rows
+
+
+def _error(status: int, exc_type: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"exc_type": exc_type, "message": message})
+
+
+# =====================================================
+# LATENCY / ERROR INJECTION + AUTH
+# =====================================================
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    if not request.url.path.startswith("/api/resource/"):
+        return await call_next(request)
+    settings.requests += 1
+
+    if settings.api_key is not None:
+        expected = f"token {settings.api_key}:{settings.api_secret}"
+        if request.headers.get("authorization") != expected:
+            return _error(401, "AuthenticationError", "Invalid API key / secret")
+
+    delay = settings.latency_ms + settings.rng.uniform(-settings.jitter_ms, settings.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if settings.error_rate and settings.rng.random() < settings.error_rate:
+        settings.injected_errors += 1
+        return _error(500, "ServerError", "Injected failure (mock_erpnext)")
+    return await call_next(request)
+
+
+# =====================================================
+# /api/resource/Work Order
+# =====================================================
+@app.get("/api/resource/Work Order")
+def list_work_orders(
+    fields: Optional[str] = None,
+    filters: Optional[str] = None,
+    or_filters: Optional[str] = None,
+    order_by: str = "modified desc",
+    limit_start: int = 0,
+    limit_page_length: Optional[int] = None,
+    limit: Optional[int] = None,
+):
+    try:
+        wanted = json.loads(fields) if fields else ["name"]
+        conditions = _parse_filters(filters)
+        any_conditions = _parse_filters(or_filters)
+        rows = [
+            wo for wo in WORK_ORDERS.values()
+            if all(_match(wo.get(f), op, v) for f, op, v in conditions)
+            and (not any_conditions or any(_match(wo.get(f), op, v) for f, op, v in any_conditions))
+        ]
+    except (ValueError, TypeError, IndexError) as e:
+        return _error(417, "ValidationError", str(e))
+
+    rows = _order(rows, order_by)
+    page = limit if limit is not None else limit_page_length
+    page = DEFAULT_PAGE_LENGTH if page is None else page
+    rows = rows[limit_start:limit_start + page] if page else rows[limit_start:]  # 0 → everything
+
+    if "*" in wanted:
+        return {"data": [dict(wo) for wo in rows]}
+    return {"data": [{f: wo.get(f) for f in wanted} for wo in rows]}
+
+
+@app.get("/api/resource/Work Order/{name}")
+def get_work_order(name: str):
+    wo = WORK_ORDERS.get(name)
+    if wo is None:
+        return _error(404, "DoesNotExistError", f"Work Order {name} not found")
+    return {"data": wo}
+
+
+@app.put("/api/resource/Work Order/{name}")
+async def update_work_order(name: str, request: Request):
+    wo = WORK_ORDERS.get(name)
+    if wo is None:
+        return _error(404, "DoesNotExistError", f"Work Order {name} not found")
+    try:
+        updates = await request.json()
+    except ValueError:
+        return _error(417, "ValidationError", "Request body must be JSON")
+    updates.pop("name", None)
+    wo.update(updates)
+    wo["modified"] = _modified(datetime.now())
+    return {"data": wo}
+
+
+# =====================================================
+# MOCK CONTROL (not part of ERPNext)
+# =====================================================
+@app.get("/__mock__/config")
+def get_config():
+    return settings.as_dict()
+
+
+@app.post("/__mock__/config")
+async def set_config(request: Request):
+    body = await request.json()
+    if "work_orders" in body:
+        seed_work_orders(int(body["work_orders"]), bool(body.get("assign_machines")),
+                         int(body.get("missing_every", 0)), int(body.get("seed", 0)))
+    settings.configure(
+        seed=body.get("seed"),
+        latency_ms=body.get("latency_ms"),
+        jitter_ms=body.get("jitter_ms"),
+        error_rate=body.get("error_rate"),
+    )
+    return settings.as_dict()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline ERPNext stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--work-orders", type=int, default=50, help="dataset size")
+    parser.add_argument("--assign-machines", action="store_true", help="work order i → machine id i")
+    parser.add_argument("--missing-every", type=int, default=0, help="blank custom fields on every n-th order")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the dataset and the fault injector")
+    parser.add_argument("--api-key", help="require 'Authorization: token KEY:SECRET'")
+    parser.add_argument("--api-secret")
+    args = parser.parse_args()
+
+    seed_work_orders(args.work_orders, args.assign_machines, args.missing_every, args.seed)
+    settings.configure(seed=args.seed, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, api_key=args.api_key, api_secret=args.api_secret)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,9 +1,11 @@
 # =====================================================
 # models.py – Taco Group Live Production Dashboard
 # Steps 1 → 43 FULLY UPDATED & ERPNext Ready
+# Single source of truth for all tables – schema changes
+# must ship with a matching step in migrations.py
 # =====================================================
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Index, Text
 from database import Base
 from datetime import datetime, timezone
 
@@ -25,6 +27,12 @@ class Machine(Base):
     work_order = Column(String, nullable=True, default="")
     pipe_size = Column(String, nullable=True, default="")
     erpnext_work_order_id = Column(String, nullable=True, default="")
+    is_locked = Column(Boolean, nullable=False, default=False)
+
+    # Meter source: "simulated" (seconds_per_meter) or "gateway" (ingest.py)
+    counter_source = Column(String, nullable=False, default="simulated")
+    counter_seq = Column(BigInteger, nullable=True)    # last applied gateway sequence
+    counter_value = Column(BigInteger, nullable=True)  # last applied cumulative counter
 
     # -------------------------------
     # HELPER METHODS
@@ -77,6 +85,50 @@ class ProductionLog(Base):
     timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 
+# =====================================================
+# PRODUCTION ROLLUPS (meters per machine per minute – rollups.py)
+# =====================================================
+class ProductionRollup(Base):
+    __tablename__ = "production_rollups"
+
+    machine_id = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)  # minute start, epoch seconds (UTC)
+    location = Column(String, nullable=False)
+    produced_qty = Column(Integer, nullable=False, default=0)
+
+
+# =====================================================
+# MACHINE STATE INTERVALS (one row per status period – oee.py)
+# =====================================================
+class MachineStateInterval(Base):
+    __tablename__ = "machine_state_intervals"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False)
+    location = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    work_order = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=True)  # NULL → current state
+
+
+# =====================================================
+# SHIFT STATS (per machine per shift, accrued as intervals close)
+# =====================================================
+class ShiftStat(Base):
+    __tablename__ = "shift_stats"
+
+    machine_id = Column(Integer, primary_key=True)
+    shift_start = Column(BigInteger, primary_key=True)  # epoch seconds (UTC)
+    location = Column(String, nullable=False)
+    running_seconds = Column(Float, nullable=False, default=0)
+    paused_seconds = Column(Float, nullable=False, default=0)
+    stopped_seconds = Column(Float, nullable=False, default=0)
+    idle_seconds = Column(Float, nullable=False, default=0)
+    produced_qty = Column(Integer, nullable=False, default=0)
+    ideal_seconds = Column(Float, nullable=False, default=0)  # produced × nominal seconds_per_meter
+
+
 # =====================================================
 # ERPNEXT METADATA
 # =====================================================
@@ -111,9 +163,62 @@ class ScheduledJob(Base):
     timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 
+# =====================================================
+# LEADER LEASE (multi-worker – one holder runs the singleton loops)
+# =====================================================
+class LeaderLease(Base):
+    __tablename__ = "leader_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# =====================================================
+# STATE VERSIONS (shared ETag versions, bumped by state_versions.py)
+# =====================================================
+class StateVersion(Base):
+    __tablename__ = "state_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+# =====================================================
+# ERP SNAPSHOTS (multi-worker – the leader's last ERPNext fetch)
+# =====================================================
+class ErpSnapshot(Base):
+    __tablename__ = "erp_snapshots"
+
+    name = Column(String, primary_key=True)
+    version = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    fetched_at = Column(DateTime(timezone=True), nullable=False)
+    refresh_failed = Column(Boolean, nullable=False, default=False)
+
+
+# =====================================================
+# PUB/SUB MESSAGES (DB-backed channel between workers)
+# =====================================================
+class PubSubMessage(Base):
+    __tablename__ = "pubsub_messages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    channel = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
 # =====================================================
 # INDEXING FOR PERFORMANCE
 # =====================================================
 Index("idx_machine_work_order", Machine.work_order)
+Index("idx_machine_erpnext_work_order_id", Machine.erpnext_work_order_id)
 Index("idx_erp_metadata_work_order", ERPNextMetadata.work_order)
-Index("idx_production_log_location", ProductionLog.location)
\ No newline at end of file
+Index("idx_production_log_location", ProductionLog.location)
+Index("idx_production_log_timestamp", ProductionLog.timestamp)
+Index("idx_production_log_machine_timestamp", ProductionLog.machine_id, ProductionLog.timestamp)
+Index("idx_state_interval_machine", MachineStateInterval.machine_id, MachineStateInterval.ended_at)
+Index("idx_shift_stats_shift", ShiftStat.shift_start)
+Index("idx_production_rollup_location", ProductionRollup.location, ProductionRollup.bucket, ProductionRollup.produced_qty)
+Index("idx_scheduled_job_unassigned", ScheduledJob.assigned_machine_id)
@@ -0,0 +1,217 @@
+# =====================================================
+# oee.py – Incremental OEE / Utilization
+# Every Machine status change closes the machine's open
+# state interval and opens the next one; closed time and
+# produced meters are accrued per shift in shift_stats,
+# so reports only read precomputed rows
+# =====================================================
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import IS_POSTGRES, SessionLocal
+from models import Machine, MachineStateInterval, ShiftStat
+
+SHIFT_HOURS = float(os.getenv("SHIFT_HOURS", 8))
+SHIFT_START_HOUR = float(os.getenv("SHIFT_START_HOUR", 6))  # UTC hour a shift starts on
+SHIFT_SECONDS = int(SHIFT_HOURS * 3600)
+_SHIFT_ANCHOR = int(SHIFT_START_HOUR * 3600)
+
+# Machine.status → shift_stats column (anything else, e.g. free / completed, is idle)
+STATE_COLUMNS = {"running": "running_seconds", "paused": "paused_seconds", "stopped": "stopped_seconds"}
+_COUNTERS = ("running_seconds", "paused_seconds", "stopped_seconds", "idle_seconds", "produced_qty", "ideal_seconds")
+
+
+# =====================================================
+# SHIFTS
+# =====================================================
+def shift_start(ts: float) -> int:
+    return int((ts - _SHIFT_ANCHOR) // SHIFT_SECONDS * SHIFT_SECONDS + _SHIFT_ANCHOR)
+
+
+def split_by_shift(start: float, end: float) -> Iterator[Tuple[int, float]]:
+    """(shift_start, seconds) pieces of [start, end)."""
+    while start < end:
+        shift = shift_start(start)
+        boundary = min(end, shift + SHIFT_SECONDS)
+        yield shift, boundary - start
+        start = boundary
+
+
+def _state_column(status: Optional[str]) -> str:
+    return STATE_COLUMNS.get(status, "idle_seconds")
+
+
+# =====================================================
+# WRITE PATH (before_flush – catches every status change)
+# =====================================================
+class _Accruals:
+    def __init__(self):
+        self.rows: Dict[Tuple[int, int], Dict] = {}
+
+    def add(self, machine_id: int, shift: int, location: str, column: str, amount: float):
+        row = self.rows.get((machine_id, shift))
+        if row is None:
+            row = dict.fromkeys(_COUNTERS, 0)
+            row.update(machine_id=machine_id, shift_start=shift, location=location or "Unknown")
+            self.rows[(machine_id, shift)] = row
+        row[column] += amount
+
+    def flush(self, session: Session):
+        if not self.rows:
+            return
+        insert = pg_insert if IS_POSTGRES else sqlite_insert
+        stmt = insert(ShiftStat)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ShiftStat.machine_id, ShiftStat.shift_start],
+            set_={c: getattr(ShiftStat, c) + getattr(stmt.excluded, c) for c in _COUNTERS},
+        )
+        session.execute(stmt, list(self.rows.values()))
+
+
+def _close_and_open(session: Session, transitions: List[Machine], now: datetime, acc: _Accruals):
+    ids = [m.id for m in transitions]
+    open_intervals = {
+        iv.machine_id: iv for iv in session.query(MachineStateInterval).filter(
+            MachineStateInterval.machine_id.in_(ids), MachineStateInterval.ended_at.is_(None)
+        )
+    }
+    now_ts = now.timestamp()
+    for m in transitions:
+        iv = open_intervals.get(m.id)
+        if iv is not None:
+            iv.ended_at = now
+            started = iv.started_at if iv.started_at.tzinfo else iv.started_at.replace(tzinfo=timezone.utc)
+            for shift, seconds in split_by_shift(started.timestamp(), now_ts):
+                acc.add(m.id, shift, iv.location, _state_column(iv.status), seconds)
+        session.add(MachineStateInterval(
+            machine_id=m.id, location=m.location or "Unknown", status=m.status,
+            work_order=m.work_order, started_at=now,
+        ))
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_machine_state(session: Session, flush_context, instances):
+    transitions: List[Machine] = []
+    produced: List[Tuple[Machine, int]] = []
+    for obj in session.dirty:
+        if not isinstance(obj, Machine) or obj.id is None:
+            continue
+        attrs = inspect(obj).attrs
+        status = attrs.status.history
+        if status.deleted and status.added and status.deleted[0] != status.added[0]:
+            transitions.append(obj)
+        qty = attrs.produced_qty.history
+        if qty.deleted and qty.added and not attrs.work_order.history.has_changes():  # assignment ≠ production
+            delta = (qty.added[0] or 0) - (qty.deleted[0] or 0)
+            if delta > 0:
+                produced.append((obj, delta))
+    if not transitions and not produced:
+        return
+
+    now = datetime.now(timezone.utc)
+    acc = _Accruals()
+    if transitions:
+        _close_and_open(session, transitions, now, acc)
+    shift = shift_start(now.timestamp())
+    for m, delta in produced:
+        acc.add(m.id, shift, m.location, "produced_qty", delta)
+        acc.add(m.id, shift, m.location, "ideal_seconds", delta * (m.seconds_per_meter or 0))
+    acc.flush(session)
+
+
+@event.listens_for(Machine, "after_insert")
+def _open_first_interval(mapper, connection, target: Machine):
+    """A new machine is not in session.dirty – open its first interval with the INSERT."""
+    connection.execute(MachineStateInterval.__table__.insert().values(
+        machine_id=target.id, location=target.location or "Unknown", status=target.status or "free",
+        work_order=target.work_order, started_at=datetime.now(timezone.utc),
+    ))
+
+
+def open_initial_intervals(conn):
+    """Migration 0009: every machine without an open interval starts one now."""
+    now = datetime.now(timezone.utc)
+    intervals = MachineStateInterval.__table__
+    already_open = select(intervals.c.machine_id).where(intervals.c.ended_at.is_(None))
+    rows = conn.execute(
+        Machine.__table__.select().where(Machine.__table__.c.id.not_in(already_open))
+    ).mappings().all()
+    if rows:
+        conn.execute(MachineStateInterval.__table__.insert(), [
+            {"machine_id": r["id"], "location": r["location"] or "Unknown", "status": r["status"] or "free",
+             "work_order": r["work_order"], "started_at": now}
+            for r in rows
+        ])
+
+
+# =====================================================
+# READ PATH
+# =====================================================
+def _ratios(row: Dict) -> Dict:
+    planned = row["running_seconds"] + row["paused_seconds"] + row["stopped_seconds"]
+    tracked = planned + row["idle_seconds"]
+    availability = row["running_seconds"] / planned if planned else None
+    performance = row["ideal_seconds"] / row["running_seconds"] if row["running_seconds"] else None
+    return {
+        "availability": _round(availability),
+        "performance": _round(performance),
+        "utilization": _round(row["running_seconds"] / tracked if tracked else None),
+        # No scrap data yet – quality is taken as 1
+        "oee": _round(availability * performance if availability is not None and performance is not None else None),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+def oee_report(db: Session, start_ts: float, end_ts: float,
+               machine_id: Optional[int] = None, location: Optional[str] = None) -> Dict:
+    """Per machine-shift rows plus totals; open intervals count up to now."""
+    first_shift = shift_start(start_ts)
+    query = db.query(ShiftStat).filter(ShiftStat.shift_start >= first_shift, ShiftStat.shift_start < end_ts)
+    intervals = db.query(MachineStateInterval).filter(MachineStateInterval.ended_at.is_(None))
+    if machine_id is not None:
+        query = query.filter(ShiftStat.machine_id == machine_id)
+        intervals = intervals.filter(MachineStateInterval.machine_id == machine_id)
+    if location:
+        query = query.filter(ShiftStat.location == location)
+        intervals = intervals.filter(MachineStateInterval.location == location)
+
+    acc = _Accruals()
+    for s in query:
+        for column in _COUNTERS:
+            acc.add(s.machine_id, s.shift_start, s.location, column, getattr(s, column) or 0)
+
+    # Current state is not in shift_stats until it ends
+    now = min(time.time(), end_ts)
+    for iv in intervals:
+        started = iv.started_at if iv.started_at.tzinfo else iv.started_at.replace(tzinfo=timezone.utc)
+        for shift, seconds in split_by_shift(max(started.timestamp(), first_shift), now):
+            acc.add(iv.machine_id, shift, iv.location, _state_column(iv.status), seconds)
+
+    shifts, total = [], dict.fromkeys(_COUNTERS, 0)
+    for (mid, shift), row in sorted(acc.rows.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+        for column in _COUNTERS:
+            total[column] += row[column]
+        shifts.append({
+            "shift_start": datetime.fromtimestamp(shift, timezone.utc).isoformat(),
+            "machine_id": mid,
+            "location": row["location"],
+            **{c: round(row[c], 1) for c in _COUNTERS},
+            **_ratios(row),
+        })
+
+    return {
+        "shift_hours": SHIFT_HOURS,
+        "shifts": shifts,
+        "total": {**{c: round(v, 1) for c, v in total.items()}, **_ratios(total)},
+    }
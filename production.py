@@ -0,0 +1,129 @@
+# =====================================================
+# production.py – Shared Production Accounting
+# One code path turns "n meters produced" into Machine
+# updates, ProductionLog rows and ERP completion – used by
+# the simulated meter (main.py) and real counters (ingest.py)
+# =====================================================
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from bulk_io import copy_production_logs, insert_production_logs
+from config import ERP_API_KEY, ERP_API_SECRET, ERP_URL
+from database import IS_POSTGRES
+from erpnext_sync import update_work_order_status
+from metrics import PRODUCTION_LOG_ROWS
+from models import ERPNextMetadata, Machine
+from rollups import upsert_rollups
+from report_cache import log_watermark
+
+# Set whenever rows are written so the log feed pushes them right away
+log_feed_wakeup = asyncio.Event()
+
+
+# =====================================================
+# MACHINE STATUS
+# =====================================================
+def apply_machine_status(m: Machine, new_status: str) -> str | None:
+    """Set the new status locally; return the ERP status to push, if any."""
+    m.status = new_status
+    erp_status = None
+
+    if new_status == "running":
+        m.is_locked = True
+        m.last_tick_time = datetime.now(timezone.utc)
+        erp_status = "In Process"
+
+    elif new_status == "completed":
+        m.is_locked = False
+        erp_status = "Completed"
+
+    # Safe ERP update
+    if erp_status and ERP_URL and ERP_API_KEY and ERP_API_SECRET and m.erpnext_work_order_id:
+        return erp_status
+    return None
+
+
+def push_erp_status(erp_work_order_id: str, erp_status: str):
+    try:
+        update_work_order_status(erp_work_order_id, erp_status)
+    except Exception as e:
+        logging.error(f"ERPNext status update failed: {e}")
+
+
+# =====================================================
+# PRODUCTION
+# =====================================================
+def load_metadata(db: Session, work_orders: Iterable[str]) -> Dict[str, ERPNextMetadata]:
+    """ERPNext metadata rows for the given work orders, one query."""
+    wanted = {wo for wo in work_orders if wo}
+    if not wanted:
+        return {}
+    rows = db.query(ERPNextMetadata).filter(ERPNextMetadata.work_order.in_(wanted)).all()
+    meta: Dict[str, ERPNextMetadata] = {}
+    for row in rows:
+        meta.setdefault(row.work_order, row)  # first row wins, like .first()
+    return meta
+
+
+def record_production(m: Machine, meters: int, when: datetime,
+                      meta: Optional[ERPNextMetadata] = None) -> Tuple[Optional[Dict], Optional[Tuple[str, str]]]:
+    """
+    Add up to `meters` to the machine's work order (capped at target).
+    Returns (production log row or None, ERP update or None).
+    """
+    if meters <= 0 or not m.work_order or m.produced_qty >= m.target_qty:
+        return None, None
+
+    increment = min(meters, m.target_qty - m.produced_qty)
+    m.produced_qty += increment
+    log_row = {
+        "machine_id": m.id,
+        "location": m.location or "Unknown",
+        "work_order": m.work_order,
+        "pipe_size": m.pipe_size,
+        "produced_qty": increment,
+        "remaining_qty": m.target_qty - m.produced_qty,
+        "status": "running",
+        "timestamp": when,
+    }
+
+    if meta is not None:
+        meta.erp_status = "In Progress"
+        meta.last_synced = when
+
+    erp_update = None
+    if m.produced_qty >= m.target_qty:
+        m.produced_qty = m.target_qty
+        erp_status = apply_machine_status(m, "completed")
+        if erp_status:
+            erp_update = (m.erpnext_work_order_id, erp_status)
+    return log_row, erp_update
+
+
+# =====================================================
+# PRODUCTION LOG WRITER
+# =====================================================
+def stage_production_logs(db: Session, rows: List[Dict]):
+    """
+    In the caller's write transaction: minute rollups and the rows
+    themselves (COPY on PostgreSQL, one executemany on SQLite), so logs,
+    rollups and produced_qty always commit together.
+    """
+    upsert_rollups(db, rows)
+    if IS_POSTGRES:
+        copy_production_logs(db, rows)
+    else:
+        insert_production_logs(db, rows)
+
+
+async def publish_production_logs(rows: List[Dict]):
+    """After commit: metrics, report cache watermark and the log feed."""
+    if rows:
+        PRODUCTION_LOG_ROWS.inc(len(rows))
+        log_watermark.invalidate()
+        log_feed_wakeup.set()
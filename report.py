@@ -2,14 +2,22 @@
 # production_report.py
 # Step 35 – Production Report Module (Updated & ERPNext Metadata)
 # =====================================================
-from fastapi import APIRouter, Depends, Query
+import json
+from fastapi import APIRouter, Depends, Header, Query
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import ProductionLog, Machine, ERPNextMetadata
-from datetime import datetime
+from database import SessionLocal, IS_POSTGRES
+from models import ProductionLog, ProductionRollup, Machine, ERPNextMetadata
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
 import csv
 from io import StringIO
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from bulk_io import stream_export_csv
+from rollups import ROLLUP_SECONDS, epoch_seconds
+from oee import oee_report
+from metrics import REPORT_CACHE
+from report_cache import etag_for, etag_matches, log_watermark, report_cache
+from state_versions import dashboard_version
 
 router = APIRouter(prefix="/api/report", tags=["Production Report"])
 
@@ -23,6 +31,49 @@ def get_db():
     finally:
         db.close()
 
+def _parse_date(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        return None
+
+# =====================================================
+# RESULT CACHE (key = report + normalized filters + log watermark
+# + dashboard state version; both cached in process, so a 304 or a
+# cache hit never opens a session)
+# =====================================================
+def _report_key(report: str, start_date: str, end_date: str, location: str) -> tuple:
+    # Invalid dates are ignored by the query, so they share the unfiltered key.
+    # Rows carry machine name / location and ERP status too – a rename or an
+    # ERP sync moves the dashboard version without adding a log row
+    return (report, _parse_date(start_date), _parse_date(end_date), location or None,
+            log_watermark.current(), dashboard_version.current())
+
+def _read_logs(start_date: str, end_date: str, location: str) -> dict:
+    db = SessionLocal()
+    try:
+        return query_production_logs(start_date, end_date, location, db)
+    finally:
+        db.close()
+
+def _cached_response(key: tuple, if_none_match: str, media_type: str, render, headers: dict = None) -> Response:
+    """
+    304 if the client has this version; else the cached body, rendering
+    it on a miss. render() may return a non-bytes reply (sent uncached).
+    """
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if etag_matches(if_none_match, etag):
+        REPORT_CACHE.labels("not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    body = report_cache.get(key)
+    if body is None:
+        body = render()
+        if not isinstance(body, bytes):
+            return body
+        report_cache.put(key, body)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 # =====================================================
 # FETCH PRODUCTION LOGS
 # =====================================================
@@ -31,8 +82,14 @@ def get_production_logs(
     start_date: str = Query(None, description="YYYY-MM-DD"),
     end_date: str = Query(None, description="YYYY-MM-DD"),
     location: str = Query(None, description="Filter by location"),
-    db: Session = Depends(get_db)
+    if_none_match: str = Header(None)
 ):
+    return _cached_response(
+        _report_key("logs", start_date, end_date, location), if_none_match, "application/json",
+        lambda: json.dumps(_read_logs(start_date, end_date, location), separators=(",", ":")).encode()
+    )
+
+def query_production_logs(start_date: str, end_date: str, location: str, db: Session) -> dict:
     query = db.query(ProductionLog, Machine).join(Machine, Machine.id == ProductionLog.machine_id)
 
     # FILTER BY START DATE
@@ -83,26 +140,138 @@ def export_production_csv(
     start_date: str = Query(None, description="YYYY-MM-DD"),
     end_date: str = Query(None, description="YYYY-MM-DD"),
     location: str = Query(None, description="Filter by location"),
+    if_none_match: str = Header(None)
+):
+    # FILENAME WITH TIMESTAMP
+    filename = f"production_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    key = _report_key("export", start_date, end_date, location)
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+    # PostgreSQL: stream straight out of COPY ... TO STDOUT (too large to cache, ETag only)
+    if IS_POSTGRES:
+        etag = etag_for(key)
+        if etag_matches(if_none_match, etag):
+            REPORT_CACHE.labels("not_modified").inc()
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        return StreamingResponse(
+            stream_export_csv(_parse_date(start_date), _parse_date(end_date), location),
+            media_type="text/csv",
+            headers={**headers, "ETag": etag, "Cache-Control": "no-cache"}
+        )
+
+    def render_csv():
+        data = _read_logs(start_date, end_date, location).get("logs", [])
+        if not data:
+            return {"error": "No data found"}
+
+        # CREATE CSV OUTPUT
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(data[0].keys()))
+        writer.writeheader()
+        for row in data:
+            writer.writerow(row)
+        return output.getvalue().encode()
+
+    return _cached_response(key, if_none_match, "text/csv", render_csv, headers)
+
+# =====================================================
+# TIME SERIES (bucketed meters, compact column arrays)
+# =====================================================
+BUCKETS = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}
+TIMESERIES_DEFAULT_DAYS = 7
+TIMESERIES_MAX_POINTS = 50000
+
+def _parse_instant(value: str):
+    """YYYY-MM-DD or ISO datetime → aware UTC datetime (None if invalid)."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+@router.get("/timeseries")
+def production_timeseries(
+    machine_id: int = Query(None, description="Filter by machine"),
+    location: str = Query(None, description="Filter by location"),
+    bucket: str = Query("1h", description="1m | 15m | 1h | 1d (UTC)"),
+    start: str = Query(None, description="YYYY-MM-DD or ISO datetime, default end - 7 days"),
+    end: str = Query(None, description="YYYY-MM-DD or ISO datetime, default now"),
+    fill: bool = Query(False, description="Include empty buckets as 0"),
+    source: str = Query("rollup", description="rollup | logs (raw rows, slower)"),
     db: Session = Depends(get_db)
 ):
-    data = get_production_logs(start_date, end_date, location, db).get("logs", [])
+    """
+    Meters produced per bucket, aggregated in SQL. Reads the minute
+    rollups unless source=logs. Returns parallel arrays:
+    timestamps[] (bucket start, epoch seconds) and values[].
+    """
+    seconds = BUCKETS.get(bucket)
+    if seconds is None:
+        return {"error": f"bucket must be one of {', '.join(BUCKETS)}"}
+    end_dt = _parse_instant(end) or datetime.now(timezone.utc)
+    start_dt = _parse_instant(start) or end_dt - timedelta(days=TIMESERIES_DEFAULT_DAYS)
+    if start_dt >= end_dt:
+        return {"error": "start must be before end"}
+    if (end_dt - start_dt).total_seconds() / seconds > TIMESERIES_MAX_POINTS:
+        return {"error": f"Too many points – use a larger bucket (max {TIMESERIES_MAX_POINTS})"}
+    start_ts, end_ts = int(start_dt.timestamp()), int(end_dt.timestamp())
 
-    if not data:
-        return {"error": "No data found"}
+    if source == "logs":
+        key = epoch_seconds(ProductionLog.timestamp) // seconds * seconds
+        query = db.query(key, func.sum(ProductionLog.produced_qty)).filter(
+            ProductionLog.timestamp >= start_dt, ProductionLog.timestamp < end_dt
+        )
+        if machine_id is not None:
+            query = query.filter(ProductionLog.machine_id == machine_id)
+        if location:
+            query = query.filter(ProductionLog.location == location)
+    else:
+        # Minute buckets: the first/last partial minute of the range counts whole
+        key = ProductionRollup.bucket // seconds * seconds
+        query = db.query(key, func.sum(ProductionRollup.produced_qty)).filter(
+            ProductionRollup.bucket >= start_ts // ROLLUP_SECONDS * ROLLUP_SECONDS,
+            ProductionRollup.bucket < end_ts
+        )
+        if machine_id is not None:
+            query = query.filter(ProductionRollup.machine_id == machine_id)
+        if location:
+            query = query.filter(ProductionRollup.location == location)
 
-    # CREATE CSV OUTPUT
-    output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=list(data[0].keys()))
-    writer.writeheader()
-    for row in data:
-        writer.writerow(row)
-    output.seek(0)
+    rows = query.group_by(key).order_by(key).all()
+    timestamps = [int(ts) for ts, _ in rows]
+    values = [int(v or 0) for _, v in rows]
 
-    # FILENAME WITH TIMESTAMP
-    filename = f"production_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if fill:
+        by_ts = dict(zip(timestamps, values))
+        timestamps = list(range(start_ts // seconds * seconds, end_ts, seconds))
+        values = [by_ts.get(ts, 0) for ts in timestamps]
 
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return {
+        "bucket": bucket,
+        "bucket_seconds": seconds,
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "source": "logs" if source == "logs" else "rollup",
+        "timestamps": timestamps,
+        "values": values
+    }
+
+# =====================================================
+# OEE / UTILIZATION (precomputed state intervals per shift)
+# =====================================================
+@router.get("/oee")
+def production_oee(
+    start: str = Query(None, description="YYYY-MM-DD or ISO datetime, default end - 24 hours"),
+    end: str = Query(None, description="YYYY-MM-DD or ISO datetime, default now"),
+    machine_id: int = Query(None, description="Filter by machine"),
+    location: str = Query(None, description="Filter by location"),
+    db: Session = Depends(get_db)
+):
+    """Availability, performance, utilization and OEE per machine and shift."""
+    end_dt = _parse_instant(end) or datetime.now(timezone.utc)
+    start_dt = _parse_instant(start) or end_dt - timedelta(hours=24)
+    if start_dt >= end_dt:
+        return {"error": "start must be before end"}
+    return oee_report(db, start_dt.timestamp(), end_dt.timestamp(), machine_id, location)
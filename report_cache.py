@@ -0,0 +1,112 @@
+# =====================================================
+# report_cache.py – Report Result Cache + ETags
+# Rendered report bodies are kept in an LRU keyed by the
+# normalized filters and the production log watermark
+# (max ProductionLog.id): new logs → new key, so entries
+# never need explicit invalidation
+# =====================================================
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from sqlalchemy import func
+
+from database import SessionLocal
+from metrics import REPORT_CACHE
+from models import ProductionLog
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 64))                    # entries
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+WATERMARK_TTL = float(os.getenv("REPORT_WATERMARK_TTL", 1.0))                  # seconds
+
+
+# =====================================================
+# WATERMARK
+# =====================================================
+class LogWatermark:
+    """
+    Max ProductionLog.id, re-read at most every WATERMARK_TTL seconds –
+    sooner after this worker writes logs (invalidate()). Writers on other
+    workers show up within the TTL.
+    """
+
+    def __init__(self, ttl: float = WATERMARK_TTL):
+        self.ttl = ttl
+        self._value = 0
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._checked = float("-inf")
+
+    def current(self) -> int:
+        if time.monotonic() - self._checked < self.ttl:
+            return self._value
+        with self._lock:
+            if time.monotonic() - self._checked >= self.ttl:  # another thread may have refreshed
+                db = SessionLocal()
+                try:
+                    self._value = db.query(func.max(ProductionLog.id)).scalar() or 0
+                finally:
+                    db.close()
+                self._checked = time.monotonic()
+        return self._value
+
+
+# =====================================================
+# LRU
+# =====================================================
+class ReportCache:
+    """Thread-safe LRU of rendered bodies, bounded by entries and bytes."""
+
+    def __init__(self, size: int = REPORT_CACHE_SIZE, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.size = size
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+        REPORT_CACHE.labels("hit" if body is not None else "miss").inc()
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def put(self, key: Hashable, body: bytes):
+        if len(body) > self.max_bytes // 4:  # one huge report must not flush everything else
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._entries and (len(self._entries) > self.size or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+def etag_for(key: Tuple) -> str:
+    return 'W/"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag[2:] in tags  # weak comparison
+
+
+log_watermark = LogWatermark()
+report_cache = ReportCache()
@@ -0,0 +1,74 @@
+# =====================================================
+# rollups.py – Minute Rollups of Production Logs
+# production_rollups holds meters per machine per minute,
+# upserted in the same transaction as the log rows, so
+# time-series reports scan minutes instead of raw logs
+# =====================================================
+
+from typing import Dict, List, Tuple
+
+from sqlalchemy import BigInteger, Integer, cast, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from database import IS_POSTGRES
+from models import ProductionRollup
+
+ROLLUP_SECONDS = 60
+
+
+def epoch_seconds(column):
+    """SQL expression: timestamp column → integer epoch seconds (UTC)."""
+    if IS_POSTGRES:
+        return cast(func.floor(func.extract("epoch", column)), BigInteger)
+    return cast(func.strftime("%s", column), Integer)
+
+
+# =====================================================
+# WRITE PATH
+# =====================================================
+def upsert_rollups(db: Session, rows: List[Dict]):
+    """Add log rows into their minute buckets (one executemany upsert)."""
+    if not rows:
+        return
+    buckets: Dict[Tuple[int, int], List] = {}
+    for row in rows:
+        key = (row["machine_id"], int(row["timestamp"].timestamp()) // ROLLUP_SECONDS * ROLLUP_SECONDS)
+        entry = buckets.get(key)
+        if entry is None:
+            buckets[key] = [row["location"], row["produced_qty"]]
+        else:
+            entry[1] += row["produced_qty"]
+
+    insert = pg_insert if IS_POSTGRES else sqlite_insert
+    stmt = insert(ProductionRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductionRollup.machine_id, ProductionRollup.bucket],
+        set_={"produced_qty": ProductionRollup.produced_qty + stmt.excluded.produced_qty},
+    )
+    db.execute(stmt, [
+        {"machine_id": machine_id, "bucket": bucket, "location": location, "produced_qty": qty}
+        for (machine_id, bucket), (location, qty) in buckets.items()
+    ])
+
+
+# =====================================================
+# BACKFILL (migration 0007)
+# =====================================================
+def backfill_rollups(conn: Connection):
+    """Rebuild every minute bucket from production_logs."""
+    bucket = (
+        f"CAST(floor(extract(epoch FROM timestamp)) AS BIGINT) / {ROLLUP_SECONDS} * {ROLLUP_SECONDS}"
+        if IS_POSTGRES else
+        f"CAST(strftime('%s', timestamp) AS INTEGER) / {ROLLUP_SECONDS} * {ROLLUP_SECONDS}"
+    )
+    conn.execute(text("DELETE FROM production_rollups"))
+    conn.execute(text(f"""
+        INSERT INTO production_rollups (machine_id, bucket, location, produced_qty)
+        SELECT machine_id, {bucket} AS b, MIN(location), SUM(produced_qty)
+        FROM production_logs
+        WHERE timestamp IS NOT NULL
+        GROUP BY machine_id, b
+    """))
@@ -3,9 +3,11 @@
 # =====================================================
 
 import asyncio
+import logging
 from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import write_session
+from metrics import LoopMonitor
 from models import Machine, ProductionHistory, ScheduledJob
 from erpnext_sync import get_work_orders, auto_assign_work_orders  # Correct import
 # from main import manager → circular import avoid, pass manager from main.py
@@ -65,39 +67,46 @@ def get_dashboard_data(db: Session):
 # =====================================================
 # STEP 20 → ERPNext SYNC LOOP
 # =====================================================
+def sync_machine_work_orders():
+    """Apply ERP machine assignments; returns the dashboard when anything changed."""
+    work_orders = get_work_orders()  # before the write slot – ERP latency must not hold it
+    with write_session() as db:
+        updated = False
+        for wo in work_orders:
+            machine_id = wo.get("custom_machine_id")
+            location = wo.get("custom_location")
+            if not machine_id or not location:
+                continue
+            m = db.query(Machine).filter(
+                Machine.id == int(machine_id),
+                Machine.location == location
+            ).first()
+            if not m:
+                continue
+
+            if m.work_order != wo.get("name") or m.pipe_size != wo.get("custom_pipe_size"):
+                m.work_order = wo.get("name")
+                m.pipe_size = wo.get("custom_pipe_size")
+                m.erpnext_work_order_id = wo.get("name")
+                updated = True
+
+        if not updated:
+            return None
+        db.flush()
+        return get_dashboard_data(db)
+
 async def erpnext_sync_loop(manager):
+    monitor = LoopMonitor("scheduler_erpnext_sync", SYNC_INTERVAL)
     while True:
-        db = SessionLocal()
+        monitor.begin()
         try:
-            work_orders = get_work_orders()
-            updated = False
-
-            for wo in work_orders:
-                machine_id = wo.get("custom_machine_id")
-                location = wo.get("custom_location")
-                if not machine_id or not location:
-                    continue
-                m = db.query(Machine).filter(
-                    Machine.id == int(machine_id),
-                    Machine.location == location
-                ).first()
-                if not m:
-                    continue
-
-                if m.work_order != wo.get("name") or m.pipe_size != wo.get("custom_pipe_size"):
-                    m.work_order = wo.get("name")
-                    m.pipe_size = wo.get("custom_pipe_size")
-                    m.erpnext_work_order_id = wo.get("name")
-                    updated = True
-
-            if updated:
-                db.commit()
-                await manager.broadcast({"locations": get_dashboard_data(db)})
-
+            # Off the event loop – ERP fetch + writer slot wait
+            locations = await asyncio.to_thread(sync_machine_work_orders)
+            if locations is not None:
+                await manager.broadcast({"locations": locations})
         except Exception as e:
-            print(f"ERP SYNC ERROR: {e}")
-        finally:
-            db.close()
+            logging.error(f"ERP SYNC ERROR: {e}")
+        monitor.end()
 
         await asyncio.sleep(SYNC_INTERVAL)
 
@@ -105,76 +114,95 @@ async def erpnext_sync_loop(manager):
 # STEP 23 → AUTO-ASSIGN LOOP (ERPNext Work Orders)
 # =====================================================
 async def auto_assign_loop():
+    monitor = LoopMonitor("scheduler_auto_assign", AUTO_ASSIGN_INTERVAL)
     while True:
+        monitor.begin()
         try:
             await asyncio.to_thread(auto_assign_work_orders)
         except Exception as e:
-            print(f"Auto-assign loop error: {e}")
+            logging.error(f"Auto-assign loop error: {e}")
+        monitor.end()
         await asyncio.sleep(AUTO_ASSIGN_INTERVAL)
 
 # =====================================================
 # STEP 24 → PRODUCTION HISTORY LOGGING
 # =====================================================
+def record_production_history():
+    with write_session() as db:
+        machines = db.query(Machine).all()
+        timestamp = datetime.now(timezone.utc)
+        for m in machines:
+            remaining_qty = (m.target_qty - m.produced_qty) if m.target_qty else 0
+            history = ProductionHistory(
+                machine_id=m.id,
+                location=m.location,
+                work_order=m.work_order,
+                pipe_size=m.pipe_size,
+                target_qty=m.target_qty,
+                produced_qty=m.produced_qty,
+                remaining_qty=remaining_qty,
+                status=m.status,
+                timestamp=timestamp
+            )
+            db.add(history)
+
 async def production_history_loop():
+    monitor = LoopMonitor("production_history", HISTORY_INTERVAL)
     while True:
-        db = SessionLocal()
+        monitor.begin()
         try:
-            machines = db.query(Machine).all()
-            timestamp = datetime.now(timezone.utc)
-            for m in machines:
-                remaining_qty = (m.target_qty - m.produced_qty) if m.target_qty else 0
-                history = ProductionHistory(
-                    machine_id=m.id,
-                    location=m.location,
-                    work_order=m.work_order,
-                    pipe_size=m.pipe_size,
-                    target_qty=m.target_qty,
-                    produced_qty=m.produced_qty,
-                    remaining_qty=remaining_qty,
-                    status=m.status,
-                    timestamp=timestamp
-                )
-                db.add(history)
-            db.commit()
+            # Off the event loop – the transaction may wait for the writer slot
+            await asyncio.to_thread(record_production_history)
         except Exception as e:
-            print(f"Production history loop error: {e}")
-        finally:
-            db.close()
+            logging.error(f"Production history loop error: {e}")
+        monitor.end()
         await asyncio.sleep(HISTORY_INTERVAL)
 
 # =====================================================
 # STEP 43 → SCHEDULED JOB AUTO-ASSIGN LOOP
 # =====================================================
+def assign_scheduled_jobs():
+    """One write transaction; returns (dashboard, [(job id, machine id)])."""
+    with write_session() as db:
+        jobs = db.query(ScheduledJob).filter(ScheduledJob.assigned_machine_id == None).all()
+        free_machines = db.query(Machine).filter(Machine.status.in_(["free", "paused", "stopped"])).all()
+        assigned = []
+
+        for job in jobs:
+            location_machines = [m for m in free_machines if m.location == job.location]
+            if not location_machines:
+                continue
+            machine = location_machines[0]
+
+            machine.work_order = job.work_order
+            machine.pipe_size = job.pipe_size
+            machine.target_qty = job.qty
+            machine.produced_qty = job.produced_qty
+            machine.status = "paused"
+            machine.erpnext_work_order_id = job.work_order
+            job.assigned_machine_id = machine.id
+            assigned.append((job.id, machine.id))
+
+        if not assigned:
+            return None, []
+        db.flush()
+        return get_dashboard_data(db), assigned
+
 async def scheduled_job_auto_assign_loop(manager):
+    monitor = LoopMonitor("scheduled_job_auto_assign", SCHEDULED_JOB_INTERVAL)
     while True:
-        db = SessionLocal()
+        monitor.begin()
         try:
-            jobs = db.query(ScheduledJob).filter(ScheduledJob.assigned_machine_id == None).all()
-            free_machines = db.query(Machine).filter(Machine.status.in_(["free", "paused", "stopped"])).all()
-
-            for job in jobs:
-                location_machines = [m for m in free_machines if m.location == job.location]
-                if not location_machines:
-                    continue
-                machine = location_machines[0]
-
-                machine.work_order = job.work_order
-                machine.pipe_size = job.pipe_size
-                machine.target_qty = job.qty
-                machine.produced_qty = job.produced_qty
-                machine.status = "paused"
-                machine.erpnext_work_order_id = job.work_order
-                job.assigned_machine_id = machine.id
-
-                db.commit()
+            # Off the event loop – the transaction may wait for the writer slot
+            locations, assigned = await asyncio.to_thread(assign_scheduled_jobs)
+            for job_id, machine_id in assigned:
                 await manager.broadcast({
-                    "locations": get_dashboard_data(db),
-                    "scheduled_job_assigned": {"job_id": job.id, "machine_id": machine.id}
+                    "locations": locations,
+                    "scheduled_job_assigned": {"job_id": job_id, "machine_id": machine_id}
                 })
         except Exception as e:
-            print(f"Scheduled Job Auto-Assign Error: {e}")
-        finally:
-            db.close()
+            logging.error(f"Scheduled Job Auto-Assign Error: {e}")
+        monitor.end()
         await asyncio.sleep(SCHEDULED_JOB_INTERVAL)
 
 # =====================================================
@@ -182,10 +210,13 @@ async def scheduled_job_auto_assign_loop(manager):
 # =====================================================
 def start_scheduler(manager):
     """
-    Call this from main.py startup_event
+    Call this from main.py startup phase
     Pass WebSocket manager as argument
+    Returns the created tasks so shutdown can cancel them
     """
-    asyncio.create_task(erpnext_sync_loop(manager))
-    asyncio.create_task(auto_assign_loop())
-    asyncio.create_task(production_history_loop())
-    asyncio.create_task(scheduled_job_auto_assign_loop(manager))
+    return [
+        asyncio.create_task(erpnext_sync_loop(manager)),
+        asyncio.create_task(auto_assign_loop()),
+        asyncio.create_task(production_history_loop()),
+        asyncio.create_task(scheduled_job_auto_assign_loop(manager)),
+    ]
@@ -9,6 +9,7 @@
  * ✅ ERPNext Work Orders rendered in dashboard (admin only)
  * ✅ Machine rename persists across refresh
  * ✅ New jobs assigned and updated correctly
+ * ✅ Keyed diff rendering + shared ETA clock + virtualized tables
  *************************************************/
 
 const API_BASE = "http://127.0.0.1:3333/api";
@@ -26,12 +27,30 @@ const users = [
 
 let currentUser = null;
 let socket = null;
-let etaIntervals = {};
-let nextJobIntervals = {};
 let suppressNextWSRender = false;
 let dashboardCache = {};
 const renamedMachines = {}; // 🔹 Preserve renamed names
 
+const LOG_BUFFER_SIZE = 200;  // ring buffer of recent production log rows
+let logBuffer = [];
+let lastLogId = 0;
+
+const locationSections = new Map(); // location name -> { wrap, grid }
+const cardSignatures = new Map();   // machine id -> last rendered markup
+const etaDeadlines = new Map();     // machine id -> { endsAt, shown }
+let etaClockRunning = false;
+let logsTable = null;               // VirtualTable instances
+let erpTable = null;
+
+let lastSeq = 0;                    // last dashboard event applied (resume point)
+let streamEpoch = null;             // server sequence space lastSeq belongs to
+let reconnectDelay = 250;           // ms, doubles up to RECONNECT_MAX
+const RECONNECT_MAX = 5000;
+
+// Wire format: plain "json" unless opted in with ?ws_encoding=compact (schema-indexed rows)
+const WS_ENCODING = new URLSearchParams(window.location.search).get("ws_encoding") === "compact" ? "compact" : "json";
+let wireSchema = null;              // field lists from the server hello (compact only)
+
 /************************
  * LOGIN PERSISTENCE
  ************************/
@@ -93,15 +112,33 @@ function initWebSocket() {
     socket = new WebSocket(WS_URL);
 
     socket.onopen = () => { 
-        socket.send("ready"); 
+        // Ask for only the events missed since lastSeq
+        socket.send(JSON.stringify({ resume: lastSeq, epoch: streamEpoch, encoding: WS_ENCODING })); 
+        reconnectDelay = 250;
         console.log("✅ WebSocket Connected"); 
         createAlert("WebSocket connected", 0); 
     };
 
     socket.onmessage = e => {
         try {
-            const data = JSON.parse(e.data);
-            dashboardCache = data;
+            let data = JSON.parse(e.data);
+
+            if(data.type === "hello"){
+                wireSchema = data.encoding === "compact" ? data.schema : null;
+                if(!data.resumed){
+                    // Too far behind (or server restarted) – server sends the latest snapshot
+                    lastSeq = 0;
+                    loadProductionLogs(); // cursor catch-up
+                }
+                streamEpoch = data.epoch;
+                return;
+            }
+            if(wireSchema) data = decodeCompact(data);
+            if(data.seq != null){
+                if(data.seq <= lastSeq) return; // already applied
+                lastSeq = data.seq;
+            }
+            if(data.locations) dashboardCache = data;
 
             if(suppressNextWSRender) { suppressNextWSRender = false; return; }
 
@@ -110,9 +147,10 @@ function initWebSocket() {
             if(data.locations) renderDashboard({ locations: data.locations });
             if(data.locations) updateMetricsModal({ locations: data.locations });
             if(data.work_orders) renderERPWorkOrders(data.work_orders);
+            if(data.production_logs) appendProductionLogs(data.production_logs);
+            if(data.machines) applyMachineDelta(data.machines);
 
-            handleAlerts(data);
-            loadProductionLogs();
+            if(data.locations) handleAlerts(data);
         } catch(err) {
             console.error("WS parse error", err);
             createAlert("WebSocket data error", 2);
@@ -122,12 +160,38 @@ function initWebSocket() {
     socket.onclose = () => {
         socket = null;
         createAlert("WebSocket disconnected. Reconnecting...", 2);
-        setTimeout(initWebSocket, 3000);
+        setTimeout(initWebSocket, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, RECONNECT_MAX);
     };
 
     socket.onerror = () => socket.close();
 }
 
+// Inverse of wire_format.encode_compact on the server
+function decodeCompact(data){
+    const s = wireSchema;
+    const obj = (row, fields) => {
+        if(!row) return null;
+        const o = {};
+        for(let i = 0; i < fields.length; i++) o[fields[i]] = row[i];
+        return o;
+    };
+    if(data.locations){
+        data.locations = data.locations.map(([name, machines]) => ({
+            name,
+            machines: machines.map(row => {
+                const m = obj(row, s.machine);
+                m.job = obj(m.job, s.job);
+                m.next_job = obj(m.next_job, s.next_job);
+                return m;
+            })
+        }));
+    }
+    if(data.work_orders) data.work_orders = data.work_orders.map(r => obj(r, s.work_order));
+    if(data.production_logs) data.production_logs = data.production_logs.map(r => obj(r, s.production_log));
+    return data;
+}
+
 /************************
  * DASHBOARD LOAD (HTTP)
  ************************/
@@ -150,36 +214,104 @@ async function loadDashboard() {
 
 /************************
  * PRODUCTION LOGS
+ * Rows arrive over the WebSocket; HTTP is only used for the
+ * initial load and for catch-up (since_id) after a reconnect
  ************************/
 async function loadProductionLogs() {
     if(!currentUser) return;
     try {
-        const res = await fetch(`${API_BASE}/production_logs`);
-        const data = await res.json();
-        const tbody = document.getElementById("logs-table");
-        if (!tbody) return;
-        tbody.innerHTML = "";
-        data.logs.slice(0,20).forEach(l => {
-            const tr = document.createElement("tr");
-            tr.innerHTML = `
-                <td>${l.machine_id}</td>
-                <td>${l.work_order || "N/A"}</td>
-                <td>${l.pipe_size || "N/A"}</td>
-                <td>${l.produced_qty}</td>
-                <td>${new Date(l.timestamp).toLocaleString()}</td>
-            `;
-            tbody.appendChild(tr);
-        });
+        const url = lastLogId
+            ? `${API_BASE}/production_logs?since_id=${lastLogId}&limit=${LOG_BUFFER_SIZE}`
+            : `${API_BASE}/production_logs`;
+        const res = await fetch(url);
+        const rows = await res.json();
+        // Initial page comes newest first; cursor pages oldest first
+        appendProductionLogs(lastLogId ? rows : rows.slice().reverse());
     } catch (err) { console.error(err); createAlert("Failed to fetch production logs",2);}
 }
 
+function appendProductionLogs(rows){
+    // Ids may arrive out of order (late commits) – dedupe by id, not by cursor
+    const known = new Set(logBuffer.map(l => l.id));
+    const fresh = rows.filter(l => !known.has(l.id));
+    if(!fresh.length) return;
+    logBuffer.push(...fresh);
+    logBuffer.sort((x, y) => x.id - y.id);
+    if(logBuffer.length > LOG_BUFFER_SIZE) logBuffer.splice(0, logBuffer.length - LOG_BUFFER_SIZE);
+    lastLogId = Math.max(lastLogId, logBuffer[logBuffer.length - 1].id);
+    renderProductionLogs();
+}
+
+function renderProductionLogs(){
+    const tbody = document.getElementById("logs-table");
+    if (!tbody) return;
+    logsTable = logsTable || new VirtualTable(tbody, 5, l => `<tr>
+            <td>${l.machine_id}</td>
+            <td>${l.work_order || "N/A"}</td>
+            <td>${l.pipe_size || "N/A"}</td>
+            <td>${l.produced_qty}</td>
+            <td>${new Date(l.timestamp).toLocaleString()}</td>
+        </tr>`);
+    logsTable.setRows(logBuffer.slice().reverse()); // newest first
+}
+
+/************************
+ * VIRTUALIZED TABLE
+ * Only the rows inside the scroll viewport (plus overscan) exist
+ * in the DOM, so frame time does not grow with row count
+ ************************/
+class VirtualTable {
+    constructor(tbody, columns, renderRow, rowHeight = 36, overscan = 8){
+        this.tbody = tbody;
+        this.columns = columns;
+        this.renderRow = renderRow;
+        this.rowHeight = rowHeight;
+        this.overscan = overscan;
+        this.rows = [];
+        this.range = null;
+        this.pending = false;
+        this.viewport = tbody.closest(".table-wrapper") || tbody.parentElement;
+        this.viewport.classList.add("virtual");
+        this.viewport.addEventListener("scroll", () => this.schedule(), { passive: true });
+    }
+
+    setRows(rows){
+        this.rows = rows;
+        this.range = null; // data changed – force a repaint of the window
+        this.schedule();
+    }
+
+    schedule(){
+        if(this.pending) return;
+        this.pending = true;
+        requestAnimationFrame(() => { this.pending = false; this.render(); });
+    }
+
+    spacer(height){
+        return height > 0 ? `<tr class="spacer" style="height:${height}px"><td colspan="${this.columns}"></td></tr>` : "";
+    }
+
+    render(){
+        const top = this.viewport.scrollTop;
+        const height = this.viewport.clientHeight || 400;
+        const start = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+        const end = Math.min(this.rows.length, Math.ceil((top + height) / this.rowHeight) + this.overscan);
+        if(this.range && this.range[0] === start && this.range[1] === end) return;
+        this.range = [start, end];
+
+        this.tbody.innerHTML =
+            this.spacer(start * this.rowHeight) +
+            this.rows.slice(start, end).map(this.renderRow).join("") +
+            this.spacer((this.rows.length - end) * this.rowHeight);
+    }
+}
+
 /************************
  * RENDER DASHBOARD
  ************************/
 function renderDashboard(data){
     if(!currentUser) return;
     const container = document.getElementById("locations");
-    container.innerHTML = "";
     if(!data?.locations) return;
 
     let visibleLocations = currentUser.location==="all"?data.locations:data.locations.filter(l=>l.name===currentUser.location);
@@ -189,22 +321,55 @@ function renderDashboard(data){
 
     if(locFilter!=="all") visibleLocations = visibleLocations.filter(l=>l.name===locFilter);
 
-    visibleLocations.forEach(loc=>{
+    const shown = new Set();
+    visibleLocations.forEach((loc, i)=>{
         let machines = loc.machines;
         if(statusFilter!=="all") machines = machines.filter(m=>m.status===statusFilter);
         if(searchFilter) machines = machines.filter(m=>m.name.toLowerCase().includes(searchFilter) || (m.job?.work_order||"").toLowerCase().includes(searchFilter));
-        renderLocation(loc.name, machines);
+        const section = renderLocation(loc.name, machines);
+        placeAt(container, section.wrap, i);
+        shown.add(loc.name);
     });
+
+    // Drop locations that are filtered out / gone
+    locationSections.forEach((section, name) => {
+        if(shown.has(name)) return;
+        Array.from(section.grid.children).forEach(removeMachineCard);
+        section.wrap.remove();
+        locationSections.delete(name);
+    });
+}
+
+// Keyed diff – existing nodes are reused and only moved when out of order
+function placeAt(parent, node, index){
+    if(parent.children[index] !== node) parent.insertBefore(node, parent.children[index] || null);
 }
 
 function renderLocation(location, machines){
-    const wrap = document.createElement("div");
-    wrap.className = "location";
-    wrap.innerHTML = `<h2>${location}</h2><div class="machines-grid"></div>`;
-    document.getElementById("locations").appendChild(wrap);
-    const grid = wrap.querySelector(".machines-grid");
+    let section = locationSections.get(location);
+    if(!section){
+        const wrap = document.createElement("div");
+        wrap.className = "location";
+        wrap.innerHTML = `<h2>${location}</h2><div class="machines-grid"></div>`;
+        section = { wrap, grid: wrap.querySelector(".machines-grid") };
+        locationSections.set(location, section);
+    }
+
+    const keep = new Set();
+    machines.forEach((m, i) => {
+        const card = createOrUpdateMachineCard(m, location, section.grid);
+        placeAt(section.grid, card, i);
+        keep.add(card);
+    });
+    Array.from(section.grid.children).forEach(card => { if(!keep.has(card)) removeMachineCard(card); });
+    return section;
+}
 
-    machines.forEach(m => createOrUpdateMachineCard(m, location, grid));
+function removeMachineCard(card){
+    const id = card.id.replace("machine-", "");
+    cardSignatures.delete(id);
+    clearETACountdown(id);
+    card.remove();
 }
 
 /************************
@@ -237,17 +402,23 @@ function createOrUpdateMachineCard(machine, location, parentGrid){
                 <button type="button" class="btn stop" data-location="${location}" data-id="${machine.id}">⛔</button>
             </div>`:""}`;
 
-    if(card){
-        card.innerHTML = cardHTML;
-    } else {
+    const className = `machine status-${machine.status}`;
+    if(!card){
         card = document.createElement("div");
-        card.className = `machine status-${machine.status}`;
         card.id = `machine-${machine.id}`;
-        card.innerHTML = cardHTML;
         parentGrid.appendChild(card);
     }
+    if(card.className !== className) card.className = className;
+
+    // Unchanged machine → no DOM work at all
+    const key = String(machine.id);
+    if(cardSignatures.get(key) === cardHTML) return card;
+    cardSignatures.set(key, cardHTML);
+    card.innerHTML = cardHTML;
 
     if(machine.job?.remaining_time != null) setupETACountdown(machine.id, machine.job.remaining_time);
+    else clearETACountdown(machine.id);
+    return card;
 }
 
 /************************
@@ -293,9 +464,10 @@ async function machineAction(e, action, location, id){
         if (!data.ok) { alert(`❌ ${action} failed`); return; }
 
         const card = document.getElementById(`machine-${id}`);
-        if(card && data.machine){
-            const grid = card.parentElement;
-            createOrUpdateMachineCard(data.machine, location, grid);
+        const cached = findCachedMachine(id);
+        if(card && cached && data.machine){
+            cached.status = data.machine.status;
+            createOrUpdateMachineCard(cached, location, card.parentElement);
         }
 
     } catch (err) {
@@ -314,18 +486,49 @@ function formatTime(sec){
     return `${m}:${s.toString().padStart(2,'0')}`;
 }
 
+// One requestAnimationFrame clock drives every countdown; the DOM is
+// written only when a displayed second actually changes
 function setupETACountdown(id, sec){
-    clearInterval(etaIntervals[id]);
-    let t = sec;
-    const el = document.getElementById(`eta-${id}`);
-    if(!el) return;
-
-    el.textContent = formatTime(t);
-    etaIntervals[id] = setInterval(() => {
-        if(!el) { clearInterval(etaIntervals[id]); return; }
-        el.textContent = formatTime(t--);
-        if(t < 0) clearInterval(etaIntervals[id]);
-    }, 1000);
+    etaDeadlines.set(String(id), { endsAt: performance.now() + sec * 1000, shown: null });
+    if(!etaClockRunning){
+        etaClockRunning = true;
+        requestAnimationFrame(tickETAClock);
+    }
+}
+
+function clearETACountdown(id){
+    etaDeadlines.delete(String(id));
+}
+
+function tickETAClock(now){
+    etaDeadlines.forEach((eta, id) => {
+        const left = Math.max(0, Math.ceil((eta.endsAt - now) / 1000));
+        if(left === eta.shown) return;
+        const el = document.getElementById(`eta-${id}`);
+        if(!el) { etaDeadlines.delete(id); return; }
+        el.textContent = formatTime(left);
+        eta.shown = left;
+        if(left === 0) etaDeadlines.delete(id);
+    });
+    if(etaDeadlines.size) requestAnimationFrame(tickETAClock);
+    else etaClockRunning = false;
+}
+
+function applyMachineDelta(changes){
+    // Batch actions broadcast only the changed statuses
+    for(const change of changes){
+        const machine = findCachedMachine(change.id);
+        if(machine) machine.status = change.status;
+    }
+    if(dashboardCache.locations) renderDashboard(dashboardCache);
+}
+
+function findCachedMachine(id){
+    for(const loc of dashboardCache.locations || []){
+        const machine = loc.machines.find(m => String(m.id) === String(id));
+        if(machine) return machine;
+    }
+    return null;
 }
 
 /************************
@@ -363,7 +566,7 @@ function createAlert(message,level){
  ************************/
 function updateMetricsModal(data){
     const modal = document.getElementById("metrics-modal");
-    if(!modal) return;
+    if(!modal || modal.classList.contains("hidden")) return; // rendered on open
     const tbody = modal.querySelector("tbody"); tbody.innerHTML="";
     data.locations.forEach(loc=>{loc.machines.forEach(m=>{
         const tr=document.createElement("tr");
@@ -372,7 +575,7 @@ function updateMetricsModal(data){
         tbody.appendChild(tr);
     })});
 }
-function openMetricsModal(){document.getElementById("metrics-modal")?.classList.remove("hidden");}
+function openMetricsModal(){document.getElementById("metrics-modal")?.classList.remove("hidden"); if(dashboardCache.locations) updateMetricsModal(dashboardCache);}
 function closeMetricsModal(){document.getElementById("metrics-modal")?.classList.add("hidden");}
 function exportTableToCSV(tableId, filename='export.csv'){const table=document.getElementById(tableId); const rows=Array.from(table.querySelectorAll('tr')); const csv=rows.map(r=>Array.from(r.querySelectorAll('th,td')).map(c=>`"${c.textContent}"`).join(',')).join('\n'); const blob=new Blob([csv],{type:'text/csv'}); const link=document.createElement('a'); link.href=URL.createObjectURL(blob); link.download=filename; link.click();}
 
@@ -386,9 +589,11 @@ function initFilters(){
     users.filter(u=>u.location!=="all").forEach(u=>{
         if(!Array.from(locSelect.options).some(o=>o.value===u.location)) locSelect.innerHTML+=`<option value="${u.location}">${u.location}</option>`;
     });
-    locSelect.addEventListener("change",loadDashboard);
-    document.getElementById("filter-status").addEventListener("change",loadDashboard);
-    document.getElementById("search-machine").addEventListener("input",loadDashboard);
+    // Filters re-render from the cached snapshot – no HTTP round-trip
+    const rerender = () => renderDashboard(dashboardCache);
+    locSelect.addEventListener("change",rerender);
+    document.getElementById("filter-status").addEventListener("change",rerender);
+    document.getElementById("search-machine").addEventListener("input",rerender);
 }
 
 /************************
@@ -469,19 +674,19 @@ async function loadERPNextWorkOrders(){
 }
 
 function renderERPWorkOrders(orders){
+    if(!currentUser || currentUser.role !== "admin") return;
+    const section = document.getElementById("admin-erp-section");
+    if(section && section.style.display !== "block") section.style.display = "block";
     const container = document.getElementById("erp-workorders-table")?.querySelector("tbody");
     if(!container) return;
-    container.innerHTML = "";
-    orders.forEach(o => {
-        const tr = document.createElement("tr");
-        tr.innerHTML = `
-            <td>${o.work_order}</td>
-            <td>${o.item_name}</td>
-            <td>${o.qty}</td>
-            <td>${o.status}</td>
-            <td>${o.machine_name || "N/A"}</td>
-            <td>${o.eta || "-"}</td>
-        `;
-        container.appendChild(tr);
-    });
+    erpTable = erpTable || new VirtualTable(container, 7, wo => `<tr>
+            <td>${wo.id || "-"}</td>
+            <td>${wo.status || "-"}</td>
+            <td>${wo.pipe_size || "-"}</td>
+            <td>${wo.qty || 0}</td>
+            <td>${wo.produced_qty || 0}</td>
+            <td>${wo.location || "-"}</td>
+            <td>${wo.machine_id || "-"}</td>
+        </tr>`);
+    erpTable.setRows(orders);
 }
@@ -0,0 +1,177 @@
+# =====================================================
+# sse.py – Server-Sent Events for Read-Only Displays
+# TV dashboards only listen, so they get a one-way text
+# stream instead of a WebSocket: the same broadcasts,
+# minus admin ERP data, optionally filtered to one
+# location, resumable via Last-Event-ID
+# =====================================================
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+SSE_QUEUE_MAX = int(os.getenv("SSE_QUEUE_MAX", 32))          # frames buffered per connection
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))         # seconds between idle comments
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))           # browser reconnect delay
+
+Message = Tuple[int, Dict]  # (seq, payload) as kept by cluster.ReplayLog
+
+
+# =====================================================
+# EVENT IDS + FRAMES
+# =====================================================
+def event_id(epoch: str, seq: int) -> str:
+    return f"{epoch}/{seq}"
+
+
+def parse_event_id(value: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """Last-Event-ID → (epoch, seq); (None, None) when absent or malformed."""
+    if not value or "/" not in value:
+        return None, None
+    epoch, _, seq = value.rpartition("/")
+    try:
+        return epoch, int(seq)
+    except ValueError:
+        return None, None
+
+
+def event_name(data: Dict) -> str:
+    if "locations" in data:
+        return "snapshot"
+    if "alert" in data:
+        return "alert"
+    if "production_logs" in data:
+        return "production_logs"
+    if "machines" in data:
+        return "machines"
+    return "message"
+
+
+def frame(epoch: str, seq: int, data: Dict) -> bytes:
+    body = json.dumps(data, separators=(",", ":"), default=str)
+    return f"id: {event_id(epoch, seq)}\nevent: {event_name(data)}\ndata: {body}\n\n".encode()
+
+
+# =====================================================
+# VIEWER PROJECTION
+# =====================================================
+def project(data: Dict, location: Optional[str], machine_locations: Dict[int, str]) -> Optional[Dict]:
+    """
+    What a display may see of one broadcast: never the ERP work order
+    queue, and only `location` when given. None → nothing to send.
+    """
+    if "locations" in data:
+        locations = data["locations"]
+        if location:
+            locations = [loc for loc in locations if loc.get("name") == location]
+        return {"locations": locations, "ts": data.get("ts")}
+    if "alert" in data:
+        if location and machine_locations.get(data.get("machine_id")) != location:
+            return None
+        return data
+    if "production_logs" in data:
+        rows = data["production_logs"]
+        if location:
+            rows = [r for r in rows if machine_locations.get(r.get("machine_id")) == location]
+        return {"production_logs": rows, "ts": data.get("ts")} if rows else None
+    if "machines" in data:  # status delta from a batch action
+        changes = data["machines"]
+        if location:
+            changes = [c for c in changes if c.get("location") == location]
+        return {"machines": changes, "ts": data.get("ts")} if changes else None
+    return None  # unknown (admin) messages stay on the WebSocket
+
+
+# =====================================================
+# CONNECTIONS
+# =====================================================
+class SSEClient:
+    """One open stream: a bounded queue of encoded frames (None = closed)."""
+
+    __slots__ = ("location", "queue")
+
+    def __init__(self, location: Optional[str]):
+        self.location = location
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(SSE_QUEUE_MAX)
+
+    def queued_bytes(self) -> int:
+        return sum(len(f) for f in self.queue._queue if f)  # noqa: SLF001 – no public view
+
+
+class SSEHub:
+    """
+    Registry of this worker's SSE streams. send_local() encodes each
+    broadcast once per location filter and only enqueues it – a slow
+    display never blocks the relay. A display whose queue is full is
+    closed and reconnects with Last-Event-ID (replay log or snapshot).
+    """
+
+    def __init__(self):
+        self.clients: Set[SSEClient] = set()
+        self.machine_locations: Dict[int, str] = {}  # from the latest snapshot
+        self.overflows = 0
+
+    def register(self, client: SSEClient):
+        self.clients.add(client)
+
+    def unregister(self, client: SSEClient):
+        self.clients.discard(client)
+
+    def queued_bytes(self) -> int:
+        return sum(c.queued_bytes() for c in self.clients)
+
+    def remember_locations(self, data: Dict):
+        if "locations" in data:
+            self.machine_locations = {
+                m["id"]: loc.get("name") for loc in data["locations"] for m in loc.get("machines", ())
+            }
+
+    def frames_for(self, epoch: str, messages: List[Message], location: Optional[str]) -> List[bytes]:
+        """Replay backlog for one new stream."""
+        out = []
+        for seq, data in messages:
+            view = project(data, location, self.machine_locations)
+            if view is not None:
+                out.append(frame(epoch, seq, view))
+        return out
+
+    def send_local(self, epoch: str, seq: int, data: Dict):
+        self.remember_locations(data)
+        frames: Dict[Optional[str], Optional[bytes]] = {}  # one encode per location filter
+        for client in list(self.clients):
+            if client.location not in frames:
+                view = project(data, client.location, self.machine_locations)
+                frames[client.location] = frame(epoch, seq, view) if view is not None else None
+            encoded = frames[client.location]
+            if encoded is None:
+                continue
+            try:
+                client.queue.put_nowait(encoded)
+            except asyncio.QueueFull:
+                self.overflow(client)
+
+    def overflow(self, client: SSEClient):
+        self.overflows += 1
+        self.unregister(client)
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+
+    async def stream(self, client: SSEClient, backlog: List[bytes]) -> AsyncIterator[bytes]:
+        """Response body: retry hint, backlog, then live frames until closed."""
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+            for encoded in backlog:
+                yield encoded
+            while True:
+                try:
+                    encoded = await asyncio.wait_for(client.queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"  # keeps proxies from timing out idle displays
+                    continue
+                if encoded is None:
+                    return
+                yield encoded
+        finally:
+            self.unregister(client)
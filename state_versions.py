@@ -0,0 +1,161 @@
+# =====================================================
+# state_versions.py – Change Counters for Conditional GETs
+# A commit that changes a dashboard-visible machine /
+# ERP metadata column moves the dashboard version, so
+# pollers get an ETag without rebuilding or hashing the
+# payload. Each worker keeps it in memory
+# (dashboard_version) – a 304 needs no database round
+# trip, and data transactions never touch the shared
+# "dashboard" row in state_versions: it is bumped at
+# most once per STATE_VERSION_INTERVAL from flush_loop()
+# =====================================================
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from cluster import INSTANCE_ID
+from database import SessionLocal, write_session
+from models import ERPNextMetadata, Machine, StateVersion
+
+DASHBOARD = "dashboard"
+# Columns get_dashboard_data() renders – tick bookkeeping (last_tick_time,
+# counter_*) changes every few hundred ms and must not move the ETag
+VISIBLE_COLUMNS = {
+    Machine: ("name", "location", "status", "work_order", "pipe_size",
+              "target_qty", "produced_qty", "seconds_per_meter"),
+    ERPNextMetadata: ("work_order", "erp_status", "erp_comments"),
+}
+TRACKED = tuple(VISIBLE_COLUMNS)
+STATE_NAMES = (DASHBOARD,)
+STATE_VERSION_TTL = float(os.getenv("STATE_VERSION_TTL", 1.0))            # seconds a read of the row is reused
+STATE_VERSION_INTERVAL = float(os.getenv("STATE_VERSION_INTERVAL", 1.0))  # seconds between shared bumps
+
+
+def current_version(db: Session, name: str = DASHBOARD) -> int:
+    return db.query(StateVersion.version).filter(StateVersion.name == name).scalar() or 0
+
+
+class StateVersionCache:
+    """
+    ETag version of one state. Local commits only count as pending
+    (changed()); flush() folds them into the shared row with one UPDATE.
+    The row is re-read at most every STATE_VERSION_TTL seconds, so changes
+    made on other workers show up within STATE_VERSION_INTERVAL + TTL.
+    While this worker has pending changes its version carries a local
+    suffix – its own writes never get a 304.
+    """
+
+    def __init__(self, name: str = DASHBOARD, ttl: float = STATE_VERSION_TTL):
+        self.name = name
+        self.ttl = ttl
+        self._value = 0
+        self._checked = float("-inf")
+        # Start pending: the first flush moves the row past anything a
+        # previous run committed without flushing (crash, kill -9)
+        self._pending = 1
+        self._lock = threading.Lock()
+
+    def changed(self):
+        with self._lock:
+            self._pending += 1
+
+    def _shared(self) -> int:
+        if time.monotonic() - self._checked < self.ttl:
+            return self._value
+        with self._lock:
+            if time.monotonic() - self._checked >= self.ttl:  # another thread may have refreshed
+                db = SessionLocal()
+                try:
+                    # max(): a flush may have landed while this read was in flight
+                    self._value = max(self._value, current_version(db, self.name))
+                finally:
+                    db.close()
+                self._checked = time.monotonic()
+        return self._value
+
+    def current(self) -> str:
+        shared = self._shared()
+        pending = self._pending
+        return f"{shared}-{INSTANCE_ID}-{pending}" if pending else str(shared)
+
+    def flush(self) -> bool:
+        """One UPDATE for everything committed since the last flush (write_session – call via to_thread)."""
+        pending = self._pending
+        if not pending:
+            return False
+        with write_session() as db:
+            value = db.execute(
+                update(StateVersion).where(StateVersion.name == self.name)
+                .values(version=StateVersion.version + 1).returning(StateVersion.version)
+            ).scalar()
+        with self._lock:
+            self._pending -= pending
+            self._value = max(self._value, value or 0)
+            self._checked = time.monotonic()
+        return True
+
+    async def flush_loop(self, interval: float = STATE_VERSION_INTERVAL):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logging.error(f"STATE VERSION FLUSH ERROR: {e}")
+        finally:
+            if self._pending:
+                try:
+                    await asyncio.to_thread(self.flush)  # shutdown – hand the last changes on
+                except Exception as e:
+                    logging.error(f"STATE VERSION FLUSH ERROR: {e}")
+
+
+dashboard_version = StateVersionCache()
+
+
+def _touches_state(session: Session) -> bool:
+    for obj in session.new:
+        if isinstance(obj, TRACKED):
+            return True
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, TRACKED):
+            attrs = inspect(obj).attrs
+            if any(attrs[c].history.has_changes() for c in VISIBLE_COLUMNS[type(obj)]):
+                return True
+    return False
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_dashboard_change(session: Session, flush_context):
+    if _touches_state(session):
+        session.info["dashboard_changed"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_dashboard_version(session: Session):
+    # After commit – a reader that sees the new version also sees the data
+    if session.info.pop("dashboard_changed", False):
+        dashboard_version.changed()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_dashboard_change(session: Session):
+    session.info.pop("dashboard_changed", None)
+
+
+def seed_state_versions(conn):
+    """Migration 0010: one row per tracked state."""
+    table = StateVersion.__table__
+    existing = set(conn.execute(table.select().with_only_columns(table.c.name)).scalars())
+    missing = [{"name": n, "version": 0} for n in STATE_NAMES if n not in existing]
+    if missing:
+        conn.execute(table.insert(), missing)
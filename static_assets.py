@@ -0,0 +1,121 @@
+# =====================================================
+# static_assets.py – In-Memory Frontend Asset Cache
+# Loaded once at startup, content-hashed names,
+# precompressed (gzip / brotli), ETag + Last-Modified
+# =====================================================
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli  # optional – gzip only when missing
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"  # hashed names never change
+REVALIDATE_CACHE = "no-cache"                            # index.html / unhashed names
+MAX_ASSET_BYTES = 5 * 1024 * 1024
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+FRONTEND_FILES = ("index.html", "script.js", "style.css")  # all that is served from the app folder
+
+
+class Asset:
+    def __init__(self, name: str, body: bytes, mtime: float):
+        self.name = name
+        self.body = body
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type == "application/javascript":
+            self.content_type += "; charset=utf-8"
+        digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{digest[:16]}"'
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f"{stem}.{digest[:10]}{ext}"
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.encodings: Dict[str, bytes] = {}
+        if self.content_type.startswith(COMPRESSIBLE) and len(body) > 256:
+            self.encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings["br"] = brotli.compress(body, quality=11)
+
+
+class AssetCache:
+    """Frontend files served from memory; index.html points at hashed names."""
+
+    def __init__(self):
+        self.assets: Dict[str, Asset] = {}   # plain and hashed name -> Asset
+        self.index: Optional[Asset] = None
+
+    def load(self, frontend_dir: str, only: Optional[Iterable[str]] = None):
+        """Cache frontend_dir's files – just `only` when given; dotfiles never."""
+        self.assets.clear()
+        self.index = None
+        if not os.path.isdir(frontend_dir):
+            logging.warning(f"⚠️ Frontend folder not found: {frontend_dir}")
+            return
+
+        html = None
+        allowed = set(only) if only is not None else None
+        for entry in os.scandir(frontend_dir):
+            if entry.name.startswith(".") or (allowed is not None and entry.name not in allowed):
+                continue
+            if not entry.is_file() or entry.stat().st_size > MAX_ASSET_BYTES:
+                continue
+            with open(entry.path, "rb") as f:
+                body = f.read()
+            if entry.name == "index.html":
+                html = (body, entry.stat().st_mtime)
+                continue
+            asset = Asset(entry.name, body, entry.stat().st_mtime)
+            self.assets[asset.name] = asset
+            self.assets[asset.hashed_name] = asset
+
+        if html:
+            self.index = Asset("index.html", self._rewrite_index(html[0].decode("utf-8")).encode("utf-8"), html[1])
+        logging.info(f"📦 Frontend assets cached: {len({id(a) for a in self.assets.values()})} file(s)")
+
+    def _rewrite_index(self, html: str) -> str:
+        # /static/<name> → /static/<content-hashed name>
+        def swap(match):
+            asset = self.assets.get(match.group(2))
+            return f"{match.group(1)}/static/{asset.hashed_name if asset else match.group(2)}"
+        return re.sub(r'((?:src|href)=")/static/([^"/?#]+)', swap, html)
+
+    def response(self, asset: Optional[Asset], request: Request, immutable: bool = False) -> Response:
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        headers = {
+            "ETag": asset.etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        inm = request.headers.get("if-none-match")
+        if inm is not None:
+            if asset.etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+                return Response(status_code=304, headers=headers)
+        elif request.headers.get("if-modified-since") == asset.last_modified:
+            return Response(status_code=304, headers=headers)
+
+        accepted = request.headers.get("accept-encoding", "")
+        for encoding in ("br", "gzip"):
+            if encoding in asset.encodings and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                return Response(asset.encodings[encoding], media_type=asset.content_type, headers=headers)
+        return Response(asset.body, media_type=asset.content_type, headers=headers)
+
+    def serve(self, name: str, request: Request) -> Response:
+        asset = self.assets.get(name)
+        return self.response(asset, request, immutable=bool(asset) and name == asset.hashed_name)
+
+    def serve_index(self, request: Request) -> Response:
+        return self.response(self.index, request)
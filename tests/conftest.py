@@ -0,0 +1,42 @@
+# =====================================================
+# conftest.py – Shared Test Setup
+# Points the app at a throwaway SQLite file (or at
+# TEST_DATABASE_URL, e.g. a disposable PostgreSQL) and
+# blanks the ERP settings before any app module is
+# imported (config.py reads the environment once)
+# =====================================================
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="dashboard-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+for _name in ("ERP_URL", "ERP_API_KEY", "ERP_API_SECRET", "API_KEY", "API_SECRET", "INGEST_TOKEN"):
+    os.environ[_name] = ""  # blank beats .env – nothing under test talks to ERPNext
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Migrated schema with the default machines."""
+    from database import init_db, seed_default_machines
+    init_db()
+    seed_default_machines()
+
+
+@pytest.fixture
+def machine(database):
+    """Machine 1 reset to a known, running state."""
+    from database import write_session
+    from models import Machine
+    with write_session() as db:
+        m = db.get(Machine, 1)
+        m.work_order, m.pipe_size, m.target_qty, m.produced_qty = "WO-TEST", "2\"", 1000, 0
+        m.status, m.counter_source, m.counter_seq, m.counter_value = "running", "simulated", None, None
+        m.seconds_per_meter = 1.0
+    return 1
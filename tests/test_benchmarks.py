@@ -0,0 +1,46 @@
+# =====================================================
+# Benchmark regression check under pytest. The compare()
+# tests always run; the hot-path run seeds real plants,
+# so it only runs when BENCH_PLANTS is set:
+#   BENCH_PLANTS=10,100 BENCH_LOG_ROWS=100000 pytest tests/test_benchmarks.py
+# Record the baseline first: python benchmarks.py --save-baseline
+# =====================================================
+
+import os
+
+import pytest
+
+import benchmarks
+
+BASE = {"x[10]": {"runs": 5, "p50_ms": 10.0, "p99_ms": 12.0, "peak_kb": 100.0}}
+
+
+def test_within_threshold_is_not_a_regression():
+    current = {"x[10]": dict(BASE["x[10]"], p50_ms=12.0, peak_kb=120.0)}
+    assert benchmarks.compare(current, BASE, 0.25) == []
+
+
+def test_slower_or_bigger_is_a_regression():
+    current = {"x[10]": dict(BASE["x[10]"], p50_ms=13.0, peak_kb=130.0)}
+    regressions = benchmarks.compare(current, BASE, 0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("x[10] p50_ms")
+
+
+def test_paths_missing_from_the_baseline_are_skipped():
+    assert benchmarks.compare({"new[10]": BASE["x[10]"]}, BASE, 0.25) == []
+
+
+@pytest.mark.skipif(not os.getenv("BENCH_PLANTS"), reason="set BENCH_PLANTS to run the hot-path benchmarks")
+def test_hot_paths_against_baseline():
+    baseline_path = os.getenv("BENCH_BASELINE", os.path.join(benchmarks.BASE_DIR, "bench_baseline.json"))
+    baseline = benchmarks.load_baseline(baseline_path)
+    if baseline is None:
+        pytest.skip(f"no baseline at {baseline_path} – python benchmarks.py --save-baseline")
+    results = benchmarks.collect(
+        [int(p) for p in os.environ["BENCH_PLANTS"].split(",") if p],
+        int(os.getenv("BENCH_LOG_ROWS", 1_000_000)),
+        int(os.getenv("BENCH_REPEAT", 20)),
+    )
+    regressions = benchmarks.compare(results, baseline, float(os.getenv("BENCH_THRESHOLD", 0.25)))
+    assert not regressions, "\n".join(regressions)
@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def _response(status):
+    r = requests.Response()
+    r.status_code = status
+    return r
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("test", failures=3, reset_after=30)
+
+
+def _fail(breaker, exc=None):
+    with pytest.raises(type(exc) if exc else requests.ConnectionError):
+        with breaker.call("work_order_list"):
+            raise exc or requests.ConnectionError("down")
+
+
+def _expire(breaker):
+    breaker.opened_at -= breaker.reset_after  # as if reset_after seconds had passed
+
+
+def test_opens_after_consecutive_failures(breaker):
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.state == CLOSED
+    _fail(breaker)
+    assert breaker.state == OPEN and breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        with breaker.call("work_order_list"):
+            pytest.fail("an open circuit must not call ERPNext")
+
+
+def test_success_resets_the_failure_count(breaker):
+    _fail(breaker)
+    _fail(breaker)
+    with breaker.call("work_order_list"):
+        pass
+    _fail(breaker)
+    assert breaker.state == CLOSED and breaker.failures == 1
+
+
+def test_client_errors_do_not_count(breaker):
+    for _ in range(5):
+        _fail(breaker, requests.HTTPError(response=_response(404)))
+    assert breaker.state == CLOSED
+    _fail(breaker, requests.HTTPError(response=_response(502)))
+    assert breaker.failures == 1
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(breaker):
+    for _ in range(3):
+        _fail(breaker)
+    _expire(breaker)
+    assert not breaker.is_open
+    with breaker.call("work_order_list"):
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):  # a second caller while the probe is out
+            breaker.before_call("work_order_list")
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_failed_probe_reopens_for_another_period(breaker):
+    for _ in range(3):
+        _fail(breaker)
+    _expire(breaker)
+    _fail(breaker)
+    assert breaker.state == OPEN and breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("work_order_list")
+    _expire(breaker)
+    with breaker.call("work_order_list"):  # next probe is allowed again
+        pass
+    assert breaker.state == CLOSED
+
+
+def test_late_failure_does_not_extend_an_open_circuit(breaker):
+    for _ in range(3):
+        _fail(breaker)
+    opened_at = breaker.opened_at
+    breaker.record_failure()  # a call that started before the circuit opened
+    assert breaker.opened_at == opened_at
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import report
+from database import write_session
+from models import Machine
+from production import stage_production_logs
+
+
+@pytest.fixture(scope="module")
+def client(database):
+    return TestClient(main.app)  # no lifespan – background loops stay off
+
+
+@pytest.fixture(scope="module")
+def logged(database):
+    """One production log row, so the export has a body to cache."""
+    with write_session() as db:
+        stage_production_logs(db, [{
+            "machine_id": 1, "location": "Modan", "work_order": "WO-ETAG", "pipe_size": "2\"",
+            "target_qty": 100, "produced_qty": 1, "remaining_qty": 99, "status": "running",
+            "timestamp": datetime.now(timezone.utc),
+        }])
+
+
+@pytest.fixture
+def no_sessions(monkeypatch):
+    """Fail the request if the handler opens a session."""
+    def refuse():
+        raise AssertionError("a 304 must not open a database session")
+    monkeypatch.setattr(main, "SessionLocal", refuse)
+    monkeypatch.setattr(report, "SessionLocal", refuse)
+
+
+@pytest.mark.parametrize("path", ["/api/dashboard", "/api/report/logs", "/api/report/export"])
+def test_not_modified_without_a_session(client, logged, path, request):
+    etag = client.get(path).headers["ETag"]
+    request.getfixturevalue("no_sessions")
+    reply = client.get(path, headers={"If-None-Match": etag})
+    assert reply.status_code == 304 and reply.headers["ETag"] == etag
+
+
+def test_local_change_moves_the_etag_at_once(client, machine):
+    etag = client.get("/api/dashboard").headers["ETag"]
+    with write_session() as db:
+        m = db.get(Machine, machine)
+        name, m.name = m.name, "Renamed"
+    try:
+        reply = client.get("/api/dashboard", headers={"If-None-Match": etag})
+        assert reply.status_code == 200 and reply.headers["ETag"] != etag
+    finally:
+        with write_session() as db:
+            db.get(Machine, machine).name = name
+
+
+def test_rolled_back_change_keeps_the_etag(client, machine):
+    etag = client.get("/api/dashboard").headers["ETag"]
+    with pytest.raises(RuntimeError):
+        with write_session() as db:
+            db.get(Machine, machine).name = "Never committed"
+            db.flush()
+            raise RuntimeError
+    assert client.get("/api/dashboard", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import ingest
+from database import SessionLocal, write_session
+from ingest import CounterReading, Reading, apply_readings, release_stale_gateways
+from models import Machine
+
+
+def _machine(machine_id):
+    db = SessionLocal()
+    try:
+        return db.get(Machine, machine_id)
+    finally:
+        db.close()
+
+
+def test_first_reading_sets_the_baseline(machine):
+    summary, log_rows, _ = apply_readings([Reading(machine, 1, 500)])
+    assert summary["accepted"] == 1 and summary["meters"] == 0 and log_rows == []
+    m = _machine(machine)
+    assert (m.counter_source, m.counter_value) == ("gateway", 500)
+
+
+def test_retried_batch_is_counted_once(machine):
+    apply_readings([Reading(machine, 1, 100)])
+    batch = [Reading(machine, 2, 103), Reading(machine, 3, 110)]
+    first, _, _ = apply_readings(batch)
+    retry, _, _ = apply_readings(batch)
+    assert first["meters"] == 10
+    assert retry == {"accepted": 0, "duplicates": 2, "meters": 0, "unknown_machines": []}
+    assert _machine(machine).produced_qty == 10
+
+
+def test_counter_reset_counts_from_zero(machine):
+    apply_readings([Reading(machine, 1, 900)])
+    summary, _, _ = apply_readings([Reading(machine, 2, 4)])  # PLC restarted
+    assert summary["meters"] == 4
+
+
+def test_unknown_machines_are_reported(database):
+    summary, _, _ = apply_readings([Reading(99999, 1, 1)])
+    assert summary["unknown_machines"] == [99999]
+
+
+def test_offset_timestamps_are_stored_in_utc(machine):
+    riyadh = timezone(timedelta(hours=3))
+    sampled = datetime(2026, 3, 1, 12, 0, tzinfo=riyadh)
+    apply_readings([CounterReading(machine_id=machine, seq=1, counter=0, ts=sampled)])
+    _, log_rows, _ = apply_readings([CounterReading(machine_id=machine, seq=2, counter=5, ts=sampled)])
+    assert log_rows[0]["timestamp"] == datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)
+    assert log_rows[0]["timestamp"].utcoffset() == timedelta(0)
+
+
+def test_silent_gateway_falls_back_to_the_simulated_meter(machine):
+    apply_readings([Reading(machine, 1, 100)])
+    with write_session() as db:
+        db.get(Machine, machine).last_tick_time = datetime.now(timezone.utc) - timedelta(hours=1)
+    with write_session() as db:
+        assert release_stale_gateways(db, datetime.now(timezone.utc)) >= 1
+    m = _machine(machine)
+    assert (m.counter_source, m.counter_value) == ("simulated", None)
+
+    # The gateway comes back: baseline only, nothing counted twice
+    summary, _, _ = apply_readings([Reading(machine, 2, 180)])
+    assert summary["meters"] == 0 and _machine(machine).counter_source == "gateway"
+
+
+def test_fresh_gateway_is_kept(machine):
+    apply_readings([Reading(machine, 1, 100)])
+    with write_session() as db:
+        assert release_stale_gateways(db, datetime.now(timezone.utc)) == 0
+    assert _machine(machine).counter_source == "gateway"
+
+
+def test_release_endpoint(machine):
+    apply_readings([Reading(machine, 1, 100)])
+    assert ingest.release_gateway(ingest.GatewayRelease(machine_ids=[machine]), None) == {"ok": True, "released": 1}
+    assert _machine(machine).counter_source == "simulated"
@@ -0,0 +1,51 @@
+import main
+from database import SessionLocal, write_queue
+from models import Machine
+
+
+def _status(machine_id):
+    db = SessionLocal()
+    try:
+        return db.get(Machine, machine_id).status
+    finally:
+        db.close()
+
+
+def test_controls_write_through_the_write_queue(machine):
+    location = "Modan"
+    before = write_queue._next_ticket
+    assert main.pause_machine(main.MachineAction(location=location, machine_id=str(machine)))["ok"]
+    assert _status(machine) == "paused"
+    assert main.start_machine(main.MachineAction(location=location, machine_id=str(machine)))["ok"]
+    assert _status(machine) == "running"
+    assert write_queue._next_ticket == before + 2
+
+
+def test_erp_push_runs_after_commit(machine, monkeypatch):
+    seen = []
+    monkeypatch.setattr(main, "apply_machine_status", lambda m, status: setattr(m, "status", status) or "In Process")
+    monkeypatch.setattr(main, "push_erp_status", lambda wo, status: seen.append((_status(machine), status)))
+    main.start_machine(main.MachineAction(location="Modan", machine_id=str(machine)))
+    assert seen == [("running", "In Process")]  # the push sees the committed row
+
+
+def test_unknown_machine_is_rejected(database):
+    reply = main.stop_machine(main.MachineAction(location="Nowhere", machine_id="1"))
+    assert reply == {"ok": False, "error": "Machine not found"}
+
+
+def test_auto_assign_one_transaction_one_machine_per_order(database, monkeypatch):
+    import erpnext_sync
+    pushed = []
+    orders = [{"name": f"WO-AA-{i}", "status": "Not Started", "custom_location": "Baldeya",
+               "custom_pipe_size": "4\"", "qty": 50} for i in range(3)]
+    monkeypatch.setattr(erpnext_sync, "get_work_orders", lambda: orders)
+    monkeypatch.setattr(erpnext_sync, "update_work_order_fields", lambda wo, fields: pushed.append(wo))
+    erpnext_sync.auto_assign_work_orders()
+    assert pushed == ["WO-AA-0", "WO-AA-1"]  # Baldeya has two machines
+    db = SessionLocal()
+    try:
+        machines = db.query(Machine).filter(Machine.location == "Baldeya").all()
+        assert sorted(m.work_order for m in machines) == ["WO-AA-0", "WO-AA-1"]
+    finally:
+        db.close()
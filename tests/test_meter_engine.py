@@ -0,0 +1,45 @@
+from meter_engine import MeterTickEngine
+
+
+def test_carry_survives_between_ticks():
+    engine = MeterTickEngine()
+    engine.advance(1, 2.0, None, 0.0)
+    engine.commit()
+    assert engine.advance(1, 2.0, None, 3.0) == 1   # 1.5 m → 1 whole, 0.5 carried
+    engine.commit()
+    assert engine.advance(1, 2.0, None, 4.0) == 1   # 0.5 carried + 0.5
+    engine.commit()
+
+
+def test_rollback_recounts_the_failed_tick():
+    engine = MeterTickEngine()
+    engine.advance(1, 1.0, None, 0.0)
+    engine.commit()
+    assert engine.advance(1, 1.0, None, 2.5) == 2
+    engine.rollback()
+    assert engine.advance(1, 1.0, None, 4.0) == 4   # nothing lost
+    engine.commit()
+
+
+def test_rollback_after_forget_keeps_carry_and_baseline():
+    engine = MeterTickEngine()
+    engine.advance(1, 2.0, None, 0.0)
+    engine.commit()
+    engine.advance(1, 2.0, None, 3.0)
+    engine.commit()                                  # last seen 3.0, carry 0.5
+    engine.forget(1)
+    engine.rollback()
+    assert engine.advance(1, 2.0, None, 4.0) == 1    # 0.5 carry + 1.0 s / 2.0
+
+
+def test_retain_only_is_staged_until_commit():
+    engine = MeterTickEngine()
+    for machine_id in (1, 2):
+        engine.advance(machine_id, 1.0, None, 0.0)
+    engine.commit()
+    engine.retain_only({1})
+    engine.rollback()
+    assert engine.advance(2, 1.0, None, 3.0) == 3
+    engine.retain_only({1})
+    engine.commit()
+    assert engine.advance(2, 1.0, None, 5.0) == 0    # first sight again, no persisted tick
@@ -0,0 +1,56 @@
+from sqlalchemy import func, select
+
+import migrations
+from database import _in_write_txn, engine
+from models import MachineStateInterval, ProductionLog, ProductionRollup, StateVersion
+
+
+def _snapshot():
+    with engine.connect() as conn:
+        return {
+            "applied": conn.execute(select(func.count()).select_from(migrations.schema_migrations)).scalar(),
+            "state_versions": conn.execute(select(func.count()).select_from(StateVersion)).scalar(),
+            "open_intervals": conn.execute(
+                select(MachineStateInterval.machine_id, func.count())
+                .where(MachineStateInterval.ended_at.is_(None))
+                .group_by(MachineStateInterval.machine_id)
+            ).all(),
+            "rollup_total": conn.execute(select(func.coalesce(func.sum(ProductionRollup.produced_qty), 0))).scalar(),
+            "log_total": conn.execute(select(func.coalesce(func.sum(ProductionLog.produced_qty), 0))).scalar(),
+        }
+
+
+def test_upgrade_reaches_head_and_reruns_as_noop(database):
+    head = migrations.MIGRATIONS[-1].version
+    assert migrations.current_version() == head
+    before = _snapshot()
+    migrations.upgrade()
+    assert migrations.current_version() == head
+    assert _snapshot() == before
+
+
+def test_versions_are_ordered_and_unique():
+    versions = [m.version for m in migrations.MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_every_step_is_safe_to_apply_again(database):
+    """A worker killed between apply and record re-runs the step on the next start."""
+    before = _snapshot()
+    for m in migrations.MIGRATIONS:
+        if m.transactional:
+            token = _in_write_txn.set(True)
+            try:
+                with engine.begin() as conn:
+                    m.apply(conn)
+            finally:
+                _in_write_txn.reset(token)
+        else:
+            with engine.connect() as conn:
+                m.apply(conn.execution_options(isolation_level="AUTOCOMMIT"))
+    after = _snapshot()
+    assert after["state_versions"] == before["state_versions"]
+    assert all(count == 1 for _, count in after["open_intervals"])  # no duplicate open intervals
+    assert after["open_intervals"] == before["open_intervals"]
+    assert after["rollup_total"] == after["log_total"]             # backfill rebuilds, never doubles
+
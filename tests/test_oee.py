@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import SessionLocal, write_session
+from models import Machine, MachineStateInterval, ShiftStat
+from oee import SHIFT_SECONDS, oee_report, shift_start, split_by_shift
+
+
+@pytest.fixture
+def new_machine(database):
+    """A fresh running machine, so shift_stats start empty."""
+    with write_session() as db:
+        m = Machine(location="OEE-Test", name="OEE", status="running", work_order="WO-OEE",
+                    target_qty=1000, produced_qty=0, seconds_per_meter=2.0)
+        db.add(m)
+        db.flush()
+        return m.id
+
+
+def _backdate_open_interval(machine_id, seconds):
+    with write_session() as db:
+        iv = db.query(MachineStateInterval).filter_by(machine_id=machine_id, ended_at=None).one()
+        iv.started_at = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+
+def _totals(machine_id):
+    db = SessionLocal()
+    try:
+        rows = db.query(ShiftStat).filter_by(machine_id=machine_id).all()
+        return {c: sum(getattr(r, c) for r in rows)
+                for c in ("running_seconds", "paused_seconds", "produced_qty", "ideal_seconds")}
+    finally:
+        db.close()
+
+
+def test_split_by_shift_cuts_at_boundaries():
+    start = shift_start(time.time()) + SHIFT_SECONDS - 60
+    pieces = list(split_by_shift(start, start + 180))
+    assert [seconds for _, seconds in pieces] == [60, 120]
+    assert pieces[1][0] == pieces[0][0] + SHIFT_SECONDS
+
+
+def test_insert_opens_the_first_interval(new_machine):
+    db = SessionLocal()
+    try:
+        intervals = db.query(MachineStateInterval).filter_by(machine_id=new_machine).all()
+    finally:
+        db.close()
+    assert [(iv.status, iv.ended_at) for iv in intervals] == [("running", None)]
+
+
+def test_status_change_accrues_the_closed_interval(new_machine):
+    _backdate_open_interval(new_machine, 600)
+    with write_session() as db:
+        db.get(Machine, new_machine).status = "paused"
+
+    assert _totals(new_machine)["running_seconds"] == pytest.approx(600, abs=5)
+    db = SessionLocal()
+    try:
+        intervals = db.query(MachineStateInterval).filter_by(machine_id=new_machine) \
+            .order_by(MachineStateInterval.id).all()
+    finally:
+        db.close()
+    assert [iv.status for iv in intervals] == ["running", "paused"]
+    assert intervals[0].ended_at is not None and intervals[1].ended_at is None
+
+
+def test_same_status_write_is_not_a_transition(new_machine):
+    with write_session() as db:
+        db.get(Machine, new_machine).status = "running"
+    db = SessionLocal()
+    try:
+        assert db.query(MachineStateInterval).filter_by(machine_id=new_machine).count() == 1
+    finally:
+        db.close()
+
+
+def test_production_accrues_but_assignment_does_not(new_machine):
+    with write_session() as db:
+        db.get(Machine, new_machine).produced_qty = 10
+    with write_session() as db:  # new work order resets the counter – not production
+        m = db.get(Machine, new_machine)
+        m.work_order, m.produced_qty = "WO-OEE-2", 50
+    totals = _totals(new_machine)
+    assert totals["produced_qty"] == 10
+    assert totals["ideal_seconds"] == pytest.approx(20)
+
+
+def test_report_counts_the_open_interval_up_to_now(new_machine):
+    _backdate_open_interval(new_machine, 1000)
+    with write_session() as db:
+        db.get(Machine, new_machine).produced_qty = 250  # 500 ideal seconds
+    now = time.time()
+    db = SessionLocal()
+    try:
+        report = oee_report(db, now - 2 * SHIFT_SECONDS, now + 60, machine_id=new_machine)
+    finally:
+        db.close()
+    total = report["total"]
+    assert total["running_seconds"] == pytest.approx(1000, abs=5)
+    assert total["availability"] == 1.0
+    assert total["performance"] == pytest.approx(0.5, abs=0.01)
+    assert total["oee"] == pytest.approx(0.5, abs=0.01)
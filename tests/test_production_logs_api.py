@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import write_session
+from production import stage_production_logs
+
+
+@pytest.fixture(scope="module")
+def client(database):
+    return TestClient(main.app)  # no lifespan – background loops stay off
+
+
+@pytest.fixture(scope="module")
+def log_ids(database):
+    with write_session() as db:
+        stage_production_logs(db, [{
+            "machine_id": 1, "location": "Modan", "work_order": "WO-API", "pipe_size": "2\"",
+            "target_qty": 100, "produced_qty": 1, "remaining_qty": 99, "status": "running",
+            "timestamp": datetime.now(timezone.utc),
+        } for _ in range(30)])
+    rows = TestClient(main.app).get("/api/production_logs", params={"since_id": 0, "limit": 1000}).json()
+    return [r["id"] for r in rows]
+
+
+@pytest.mark.parametrize("limit", [-1, 0, main.PRODUCTION_LOG_CATCHUP_MAX + 1])
+def test_limit_out_of_range_is_rejected(client, limit):
+    assert client.get("/api/production_logs", params={"since_id": 0, "limit": limit}).status_code == 422
+
+
+def test_catch_up_returns_the_newest_rows_oldest_first(client, log_ids):
+    cursor = log_ids[-30]
+    rows = client.get("/api/production_logs", params={"since_id": cursor, "limit": 10}).json()
+    assert [r["id"] for r in rows] == log_ids[-10:]
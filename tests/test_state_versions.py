@@ -0,0 +1,55 @@
+from database import SessionLocal, write_session
+from models import Machine
+from state_versions import StateVersionCache, current_version, dashboard_version
+
+
+def _row():
+    db = SessionLocal()
+    try:
+        return current_version(db)
+    finally:
+        db.close()
+
+
+def test_commits_do_not_write_the_shared_row(machine):
+    dashboard_version.flush()
+    before = _row()
+    for qty in (1, 2, 3):
+        with write_session() as db:
+            db.get(Machine, machine).produced_qty = qty
+    assert _row() == before
+
+
+def test_flush_bumps_the_row_once_for_all_pending_commits(machine):
+    dashboard_version.flush()
+    before = _row()
+    seen = {dashboard_version.current()}
+    for qty in (1, 2, 3):
+        with write_session() as db:
+            db.get(Machine, machine).produced_qty = qty
+        seen.add(dashboard_version.current())
+    assert len(seen) == 4  # every local commit moves this worker's version
+
+    assert dashboard_version.flush()
+    assert _row() == before + 1
+    assert dashboard_version.current() == str(before + 1)
+    assert not dashboard_version.flush()  # nothing pending – no write
+
+
+def test_other_workers_pick_up_the_flush(machine):
+    other = StateVersionCache(ttl=0)
+    other.flush()  # its own start-up bump
+    seen = other.current()
+    with write_session() as db:
+        db.get(Machine, machine).status = "paused"
+    assert other.current() == seen  # not flushed yet
+    dashboard_version.flush()
+    assert other.current() != seen
+
+
+def test_tick_bookkeeping_is_not_a_change(machine):
+    dashboard_version.flush()
+    version = dashboard_version.current()
+    with write_session() as db:
+        db.get(Machine, machine).counter_seq = 42
+    assert dashboard_version.current() == version
@@ -0,0 +1,44 @@
+import erpnext_sync
+from erpnext_sync import WorkOrderSnapshot
+
+ORDERS = [{"name": "WO-S1", "status": "Not Started", "qty": 10}]
+
+
+def _follower():
+    follower = WorkOrderSnapshot()
+    follower.owner = lambda: False
+    return follower
+
+
+def test_follower_reads_the_leaders_snapshot_without_calling_erp(database, monkeypatch):
+    calls = []
+    monkeypatch.setattr(erpnext_sync, "get_work_orders", lambda: calls.append(1) or [])
+    leader = WorkOrderSnapshot()
+    leader.owner = lambda: True
+    leader.update(ORDERS)
+
+    view = _follower().get()
+    assert calls == []
+    assert view.work_orders == ORDERS
+    assert view.version == leader.version  # same ETag on every worker
+    assert not view.stale
+
+
+def test_follower_sees_the_leaders_failures_once_old(database, monkeypatch):
+    monkeypatch.setattr(erpnext_sync, "get_work_orders", lambda: [])
+    leader = WorkOrderSnapshot()
+    leader.owner = lambda: True
+    leader.update(ORDERS)
+    leader.refresh_failed = True
+    leader._share()
+
+    follower = _follower()
+    assert follower.get(max_age=0).stale
+    assert not follower.view(max_age=60).stale
+
+
+def test_single_worker_shares_nothing(database, monkeypatch):
+    shared = []
+    monkeypatch.setattr(WorkOrderSnapshot, "_share", lambda self, payload=None: shared.append(payload))
+    WorkOrderSnapshot().update(ORDERS)
+    assert shared == []
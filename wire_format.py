@@ -0,0 +1,94 @@
+# =====================================================
+# wire_format.py – Compact WebSocket Payload Encoding
+# Schema-indexed arrays: field names are sent once in
+# the hello frame, rows carry values positionally
+# =====================================================
+
+import json
+from typing import Dict, List, Optional
+
+ENCODINGS = ("json", "compact")
+
+MACHINE_FIELDS = ["id", "name", "status", "job", "next_job"]
+JOB_FIELDS = [
+    "work_order", "size", "total_qty", "completed_qty", "remaining_qty",
+    "remaining_time", "progress_percent", "erp_status", "erp_comments"
+]
+NEXT_JOB_FIELDS = ["machine_id", "work_order", "pipe_size", "total_qty", "produced_qty", "remaining_time"]
+WORK_ORDER_FIELDS = ["id", "status", "pipe_size", "qty", "produced_qty", "location", "machine_id"]
+LOG_FIELDS = ["id", "machine_id", "work_order", "pipe_size", "produced_qty", "timestamp"]
+
+SCHEMA = {
+    "version": 1,
+    "machine": MACHINE_FIELDS,
+    "job": JOB_FIELDS,
+    "next_job": NEXT_JOB_FIELDS,
+    "work_order": WORK_ORDER_FIELDS,
+    "production_log": LOG_FIELDS,
+}
+
+
+def _row(obj: Optional[Dict], fields: List[str]) -> Optional[List]:
+    return None if obj is None else [obj.get(f) for f in fields]
+
+
+def _obj(row: Optional[List], fields: List[str]) -> Optional[Dict]:
+    return None if row is None else dict(zip(fields, row))
+
+
+_JOB_AT = MACHINE_FIELDS.index("job")
+_NEXT_JOB_AT = MACHINE_FIELDS.index("next_job")
+
+
+def _encode_machine(m: Dict) -> List:
+    row = _row(m, MACHINE_FIELDS)
+    row[_JOB_AT] = _row(row[_JOB_AT], JOB_FIELDS)
+    row[_NEXT_JOB_AT] = _row(row[_NEXT_JOB_AT], NEXT_JOB_FIELDS)
+    return row
+
+
+def _decode_machine(row: List) -> Dict:
+    m = _obj(row, MACHINE_FIELDS)
+    m["job"] = _obj(m["job"], JOB_FIELDS)
+    m["next_job"] = _obj(m["next_job"], NEXT_JOB_FIELDS)
+    return m
+
+
+# =====================================================
+# ENCODE / DECODE
+# =====================================================
+def encode_compact(data: Dict) -> Dict:
+    """Positional rows for the repeated lists; other keys pass through."""
+    out = dict(data)
+    if "locations" in data:
+        out["locations"] = [
+            [loc["name"], [_encode_machine(m) for m in loc["machines"]]]
+            for loc in data["locations"]
+        ]
+    if "work_orders" in data:
+        out["work_orders"] = [_row(wo, WORK_ORDER_FIELDS) for wo in data["work_orders"]]
+    if "production_logs" in data:
+        out["production_logs"] = [_row(log, LOG_FIELDS) for log in data["production_logs"]]
+    return out
+
+
+def decode_compact(data: Dict) -> Dict:
+    """Inverse of encode_compact (mirrors decodeCompact in script.js)."""
+    out = dict(data)
+    if "locations" in data:
+        out["locations"] = [
+            {"name": name, "machines": [_decode_machine(m) for m in machines]}
+            for name, machines in data["locations"]
+        ]
+    if "work_orders" in data:
+        out["work_orders"] = [_obj(wo, WORK_ORDER_FIELDS) for wo in data["work_orders"]]
+    if "production_logs" in data:
+        out["production_logs"] = [_obj(log, LOG_FIELDS) for log in data["production_logs"]]
+    return out
+
+
+def dumps(data: Dict, encoding: str = "json") -> str:
+    """Serialize one message for the wire in the negotiated encoding."""
+    if encoding == "compact":
+        data = encode_compact(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)